@@ -0,0 +1,260 @@
+'''
+Acquisition benchmarks, run against an emulated Prologix controller.
+
+    python benchmark.py --output bench.json [--compare previous.json]
+
+Measures the round trip of queries, one_port/two_port sweeps per
+second, parser throughput for each values format, the memory
+allocated per sweep (Python 3 only, with tracemalloc) and the import
+time of the package modules. Results are saved as JSON so that
+versions can be compared.
+
+The transport modules must not load numpy, scikit-rf or pyserial on
+import: the benchmark exits with an error if they do.
+'''
+from __future__ import print_function, division
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as npy
+
+try:
+    import tracemalloc
+except ImportError: # Python 2
+    tracemalloc = None
+
+from instruments import HP4195
+from instruments.emulator import PrologixEmulator, HP4195Personality
+from instruments.util import parse_ascii, _parse_ascii_re, parse_binary
+
+
+def ascii_trace(points=401):
+    '''
+    FMT1 style transfer of one trace: comma separated, CRLF terminated.
+    '''
+    values = npy.random.uniform(-1e6, 1e6, points)
+    return b",".join([("%+.5E" % v).encode('ascii') for v in values]) + b"\r\n"
+
+
+def binary_trace(points=401, dtype='>f4'):
+    '''
+    FMT3 (or FMT2 for 64 bits) style #A block of one trace.
+    '''
+    data = npy.random.uniform(-1e6, 1e6, points).astype(dtype).tobytes()
+    return b"#A" + npy.array([len(data)], '>u2').tobytes() + data
+
+
+def throughput(func, data, repeat=5, number=20):
+    '''
+    Best of `repeat` runs of func(data), in MB/s.
+    '''
+    best = min(timeit.repeat(lambda: func(data), repeat=repeat, number=number))
+    return len(data) * number / best / 1e6
+
+
+def timings(func, count):
+    '''
+    Statistics of the duration of `count` calls of func, in seconds.
+    '''
+    durations = []
+    for _ in range(count):
+        start = time.time()
+        func()
+        durations.append(time.time() - start)
+    durations = npy.array(durations)
+    return {'mean': durations.mean(), 'min': durations.min(),
+            'p50': npy.percentile(durations, 50), 'p95': npy.percentile(durations, 95)}
+
+
+def allocations(func, count):
+    '''
+    Peak memory allocated while running func, in bytes per call.
+    None when tracemalloc is not available.
+    '''
+    if tracemalloc is None:
+        return None
+    func() # warm up caches
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(count):
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return int(npy.median(peaks))
+
+
+def bench_parsers(points=401):
+    '''
+    Parser throughput in MB/s for each values format.
+    '''
+    ascii_data = ascii_trace(points)
+    single_data = binary_trace(points, '>f4')
+    double_data = binary_trace(points, '>f8')
+    return {'ascii_regex': throughput(_parse_ascii_re, ascii_data),
+            'ascii': throughput(parse_ascii, ascii_data),
+            'single_big_endian': throughput(lambda d: parse_binary(d, True, True, b"#A"), single_data),
+            'double_big_endian': throughput(lambda d: parse_binary(d, True, False, b"#A"), double_data)}
+
+
+def bench_acquisition(vna, count):
+    '''
+    Query round trips and sweep rates against the instrument.
+    '''
+    results = {'ask_idn': timings(lambda: vna.inst.ask('ID?'), count),
+               'ask_register': timings(lambda: vna.read_register('A'), count)}
+    one_port = timings(lambda: vna.s11, count)
+    two_port = timings(lambda: vna.two_port, max(1, count // 4))
+    results['one_port_sweeps_per_s'] = 1 / one_port['mean']
+    results['two_port_sweeps_per_s'] = 1 / two_port['mean']
+    results['one_port_bytes_per_sweep'] = allocations(lambda: vna.s11, min(count, 10))
+    return results
+
+
+#: modules that the package modules must not load on import
+HEAVY = ('numpy', 'skrf', 'scipy', 'matplotlib', 'serial')
+
+#: modules timed on import, and the heavy modules each may load
+IMPORTS = (('instruments.util', ()),
+           ('instruments.prologix', ()),
+           ('instruments', ()),
+           ('instruments.hp4195', ()),
+           ('skrf', HEAVY)) # reference
+if sys.version_info >= (3, 5): # asyncio
+    IMPORTS = IMPORTS[:-1] + (('instruments.aprologix', ()),) + IMPORTS[-1:]
+
+_IMPORT_SCRIPT = '''
+import sys, time
+start = time.time()
+import %s
+print(time.time() - start)
+print(' '.join(name for name in %r if name in sys.modules))
+'''
+
+
+def import_time(module, repeat=5):
+    '''
+    Best time of `repeat` imports of module, each in a fresh
+    interpreter, and the heavy modules it loaded.
+    '''
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT % (module, HEAVY)], cwd=here)
+        lines = output.decode('ascii').splitlines()
+        seconds = float(lines[0])
+        best = seconds if best is None else min(best, seconds)
+        loaded = lines[1].split() if len(lines) > 1 else []
+    return best, loaded
+
+
+def bench_imports(repeat=5):
+    '''
+    Import times in seconds, and the heavy modules loaded against
+    those allowed by IMPORTS.
+    '''
+    seconds = {}
+    unexpected = {}
+    for module, allowed in IMPORTS:
+        seconds[module], loaded = import_time(module, repeat)
+        extra = [name for name in loaded if name not in allowed]
+        if extra:
+            unexpected[module] = extra
+    return seconds, unexpected
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(points=401, count=50, latency=0.0):
+    '''
+    Run the benchmarks against a local emulator, return the results.
+    '''
+    imports, unexpected = bench_imports()
+    server = PrologixEmulator(('127.0.0.1', 0), {17: HP4195Personality(default_latency=latency)}).start()
+    try:
+        vna = HP4195('127.0.0.1', 17, port=server.port)
+        with vna.batch():
+            vna.start_freq = 1e3
+            vna.stop_freq = 1e8
+            vna.numpoints = points
+        vna.set_log_freq()
+        acquisition = bench_acquisition(vna, count)
+        vna.plx.close()
+    finally:
+        server.stop()
+    return {'commit': _commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'config': {'points': points, 'count': count, 'latency': latency},
+            'parsers_mb_per_s': bench_parsers(points),
+            'acquisition': acquisition,
+            'import_s': imports,
+            'heavy_imports': unexpected}
+
+
+def _flatten(results, prefix=''):
+    for key in sorted(results):
+        value = results[key]
+        if isinstance(value, dict):
+            for item in _flatten(value, prefix + key + '.'):
+                yield item
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + key, value
+
+
+def report(results, previous=None):
+    '''
+    Print the measurements, with the ratio to a previous run if given.
+    '''
+    old = dict(_flatten(previous)) if previous else {}
+    for name, value in _flatten(results):
+        if name.startswith('config.'):
+            continue
+        line = '%-45s %12.6g' % (name, value)
+        if old.get(name):
+            line += '   x%.2f' % (value / old[name])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--points', type=int, default=401)
+    parser.add_argument('--count', type=int, default=50, help='repetitions per measurement')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='emulated seconds spent on each instrument command')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    results = run(args.points, args.count, args.latency)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(results, previous)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    for module, loaded in sorted(results['heavy_imports'].items()):
+        print('%s imports %s' % (module, ', '.join(loaded)), file=sys.stderr)
+    return 1 if results['heavy_imports'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
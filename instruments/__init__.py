@@ -1,3 +1,17 @@
 __author__ = 'dp'
 
-from hp4195 import HP4195
\ No newline at end of file
+import sys
+
+__all__ = ['HP4195']
+
+# the driver is imported on first use of instruments.HP4195 (PEP 562),
+# so that the transport (instruments.prologix) starts on its own
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name == 'HP4195':
+            from .hp4195 import HP4195
+            globals()['HP4195'] = HP4195
+            return HP4195
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+else:
+    from .hp4195 import HP4195
@@ -0,0 +1,374 @@
+"""
+asyncio transport for Prologix GPIB-Ethernet controllers.
+
+Each controller is driven by a single connection, so one event loop can
+run acquisitions on several controllers concurrently:
+
+>>> async def main():
+...     vnas = [await AsyncHP4195.connect(ip) for ip in ('10.0.0.1', '10.0.0.2')]
+...     return await asyncio.gather(*[vna.s11() for vna in vnas])
+
+Requires Python 3.5 or later.
+
+"""
+
+import asyncio
+from time import monotonic
+
+from . import errors
+from .hp4195 import dbdeg_network
+from .prologix import ascii, single, double, big_endian
+from .util import parse_ascii, parse_binary, parse_binary_frames, frame_end
+
+
+class AsyncPrologixEthernet(object):
+    """
+    asyncio interface to a Prologix GPIB-Ethernet controller.
+
+    Use the :meth:`connect` coroutine to instantiate:
+
+    >>> plx = await AsyncPrologixEthernet.connect('128.223.xxx.xxx')
+
+    Instruments on the same controller share the bus; a lock keeps
+    their transactions (address switch, query, read) from interleaving.
+
+    """
+
+    framed_reads = True
+
+    def __init__(self, reader, writer, timeout=5):
+        self._reader = reader
+        self._writer = writer
+        self._pending = b''
+        self._timeout = timeout
+        self._addr = None
+        self._auto = None
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, ip, port=1234, timeout=5):
+        """ Open the connection and put the controller in controller mode. """
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        plx = cls(reader, writer, timeout)
+        await plx.write('++mode 1')
+        plx._addr = int(await plx.ask('++addr'))
+        plx._auto = bool(int(await plx.ask('++auto')))
+        return plx
+
+    @property
+    def timeout(self):
+        """The timeout in seconds for all resource I/O operations.
+        """
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        if not(1 <= value <= 30):
+            raise ValueError("timeout value is invalid")
+        self._timeout=int(value)
+
+    async def set_addr(self, new_addr):
+        """ Select the instrument the controller talks to. """
+        self._addr = new_addr
+        await self.write("++addr %d" % new_addr)
+
+    async def set_auto(self, val):
+        """ Change the read-after-write setting. """
+        self._auto = bool(val)
+        await self.write("++auto %d" % self._auto)
+
+    async def version(self):
+        """ Check the Prologix firmware version. """
+        return await self.ask("++ver")
+
+    async def write(self, command, lag=0.0):
+        """
+        Send a command line to the controller.
+
+        `lag` -- optional settle time in seconds after the command
+                 is sent. Not needed before reading a response.
+        """
+        self._writer.write(("%s\n" % command).encode('ascii'))
+        await self._writer.drain()
+        if lag > 0.0:
+            await asyncio.sleep(lag)
+
+    async def readall(self, chunk_size=4096, timeout=None, header=b"#A", frames=1):
+        """
+        Read one complete response from the controller, see
+        :meth:`PrologixEthernet.readall`.
+        """
+        if timeout is None:
+            timeout = self._timeout
+        deadline = monotonic() + timeout
+
+        data = self._pending
+        start = len(data) - len(data.lstrip(b"\r\n"))
+        end = frame_end(data, header, start, frames)
+        while end is None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise errors.Timeout("%d bytes received, frame incomplete" % (len(data) - start))
+            try:
+                chunk = await asyncio.wait_for(self._reader.read(chunk_size), remaining)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                raise errors.Error("connection closed by the controller")
+            data += chunk
+            start = len(data) - len(data.lstrip(b"\r\n"))
+            end = frame_end(data, header, start, frames)
+
+        self._pending = data[end:]
+        resp = data[start:end]
+        if header and resp.find(header) != -1:
+            return resp
+        return resp.rstrip()
+
+    async def ask(self, query, *args, **kwargs):
+        """ Write to the bus, then read response. """
+        await self.write(query, *args, **kwargs)
+        return (await self.readall()).decode('ascii')
+
+    def instrument(self, addr, **kwargs):
+        """
+        Factory function for :class:`AsyncInstrument` objects.
+        """
+        return AsyncInstrument(self, addr, **kwargs)
+
+    async def close(self):
+        """ Close the connection to the controller. """
+        self._writer.close()
+        if hasattr(self._writer, 'wait_closed'):
+            await self._writer.wait_closed()
+
+
+class AsyncInstrument(object):
+    """
+    Represents an instrument attached to an :class:`AsyncPrologixEthernet`
+    controller. Same interface as :class:`prologix.Instrument`, with
+    coroutines:
+
+    >>> inst = plx.instrument(17, values_format=single|big_endian)
+    >>> await inst.ask('ID?')
+    >>> await inst.ask_for_values('FMT3;A?')
+
+    """
+
+    DEFAULT_KWARGS = {#: floating point data value format
+                      'values_format': ascii,
+                      # header for binary format
+                      'header': b"#A",
+                      #: How many bytes are read per low-level call.
+                      'chunk_size': 20 * 1024,
+                      #: Seconds to wait for a complete response (None: controller timeout).
+                      'timeout': None
+                      }
+
+    def __init__(self, controller, addr, **kwargs):
+        self.addr = addr
+        self.auto = False
+        self.controller = controller
+
+        for key, value in AsyncInstrument.DEFAULT_KWARGS.items():
+            setattr(self, key, kwargs.get(key, value))
+
+    async def _get_priority(self):
+        # configure the controller to address this instrument,
+        # to be called with the controller lock held
+        if self.auto != self.controller._auto:
+            await self.controller.set_auto(self.auto)
+        if self.addr != self.controller._addr:
+            await self.controller.set_addr(self.addr)
+
+    async def _read_raw(self, frames=1):
+        await self._get_priority()
+        if not self.auto:
+            # explicitly tell instrument to talk.
+            await self.controller.write('++read eoi')
+        return await self.controller.readall(self.chunk_size, timeout=self.timeout, frames=frames)
+
+    def _decode_values(self, data, fmt, frames):
+        if not fmt:
+            fmt = self.values_format
+
+        if fmt & 0x01 == ascii:
+            if frames is None:
+                return parse_ascii(data)
+            return [parse_ascii(line) for line in data.split(b'\n') if line.strip()]
+
+        try:
+            if fmt & 0x01 == single:
+                is_single = True
+            elif fmt & 0x03 == double:
+                is_single = False
+            else:
+                raise ValueError("unknown data values fmt requested")
+            if frames is not None:
+                return parse_binary_frames(data, frames, fmt & 0x04 == big_endian, is_single, self.header)
+            return parse_binary(data, fmt & 0x04 == big_endian, is_single, self.header)
+        except ValueError as e:
+            raise errors.InvalidBinaryFormat(str(e))
+
+    async def write(self, command):
+        """
+        Write a command to the instrument.
+
+        """
+        async with self.controller.lock:
+            await self._get_priority()
+            await self.controller.write(command)
+
+    async def read_raw(self, frames=1):
+        """Read the unmodified response of the instrument.
+
+        :rtype: bytes
+        """
+        async with self.controller.lock:
+            return await self._read_raw(frames)
+
+    async def read(self):
+        """
+        Read a response from an instrument.
+
+        """
+        return (await self.read_raw()).decode('ascii')
+
+    async def read_values(self, fmt=None, frames=None):
+        """Read floating point values from the device, see
+        :meth:`prologix.Instrument.read_values`.
+
+        :rtype: numpy.ndarray
+        """
+        return self._decode_values(await self.read_raw(frames or 1), fmt, frames)
+
+    async def _query(self, message, frames=1):
+        # write and read as one transaction on the controller
+        async with self.controller.lock:
+            await self._get_priority()
+            await self.controller.write(message)
+            return await self._read_raw(frames)
+
+    async def ask(self, message):
+        """A combination of write(message) and read()
+
+        :rtype: str
+        """
+        return (await self._query(message)).decode('ascii')
+
+    async def ask_for_values(self, message, format=None, frames=None):
+        """A combination of write(message) and read_values()
+
+        :rtype: numpy.ndarray
+        """
+        return self._decode_values(await self._query(message, frames or 1), format, frames)
+
+
+class AsyncHP4195(object):
+    '''
+    asyncio facade of the HP4195A driver, for acquisitions running
+    concurrently on several controllers.
+
+    >>> vna = await AsyncHP4195.connect('137.138.62.172')
+    >>> await vna.configure(start=1e3, stop=1e6, nop=401)
+    >>> s11 = await vna.s11()
+    '''
+
+    # settings accepted by configure and their command
+    _commands = {'start': 'START=%f', 'stop': 'STOP=%f',
+                 'center': 'CENTER=%f', 'span': 'SPAN=%f',
+                 'nop': 'NOP=%f', 'rbw': 'RBW=%f', 'power': 'OSC1=%f',
+                 'att_r1': 'ATR1=%f', 'att_t1': 'ATT1=%f'}
+
+    # S-parameters and the measurement function selecting them
+    _functions = {'S11': 'FNC4', 'S21': 'FNC5', 'S12': 'FNC6', 'S22': 'FNC7'}
+
+    def __init__(self, inst):
+        self.inst = inst
+        self._axis = None # cached X register
+
+    @classmethod
+    async def connect(cls, ip_prologix='137.138.62.172', gpib_address=17, port=1234):
+        '''
+        Connect to the controller and return the driver.
+        '''
+        plx = await AsyncPrologixEthernet.connect(ip_prologix, port)
+        inst = plx.instrument(gpib_address, values_format=single|big_endian)
+        inst.timeout = 30
+        return cls(inst)
+
+    async def idn(self):
+        '''
+        Identifying string for the instrument
+        '''
+        return await self.inst.ask('ID?')
+
+    async def configure(self, **settings):
+        '''
+        Send several settings (start, stop, center, span, nop, rbw,
+        power, att_r1, att_t1) in one program message.
+        '''
+        commands = [self._commands[name] % value for name, value in sorted(settings.items())]
+        await self.inst.write(';'.join(commands))
+        self._axis = None
+
+    async def set_log_freq(self, log=True):
+        '''
+        Set the frequency to log (or linear) scale.
+        '''
+        await self.inst.write('SWT2' if log else 'SWT1')
+        self._axis = None
+
+    async def read_registers(self, *registers):
+        '''
+        Read several data registers in a single transaction.
+        '''
+        command = "FMT3;" + ";".join(["%s?" % register for register in registers])
+        return await self.inst.ask_for_values(command, frames=len(registers))
+
+    async def read_register(self, register='A'):
+        '''
+        Read a data register using binary single format.
+        '''
+        return await self.inst.ask_for_values("FMT3;%s?" % register)
+
+    async def frequency(self, unit='hz'):
+        '''
+        Frequency points of the sweep, from the X register.
+        '''
+        import numpy as npy
+        from skrf.frequency import Frequency
+
+        if self._axis is None:
+            self._axis = npy.array(await self.read_register('X'), dtype=float)
+        freq = Frequency.from_f(self._axis, unit='hz')
+        freq.unit = unit
+        return freq
+
+    async def one_port(self):
+        '''
+        Read the current trace as a one port Network.
+        '''
+        db_data, deg_data = await self.read_registers('A', 'B')
+        return dbdeg_network(db_data, deg_data, await self.frequency())
+
+    async def measure(self, parameter):
+        '''
+        Select an S-parameter ('S11', 'S21', 'S12', 'S22') and read it.
+        '''
+        await self.inst.write(self._functions[parameter])
+        ntwk = await self.one_port()
+        ntwk.name = parameter
+        return ntwk
+
+    async def s11(self):
+        return await self.measure('S11')
+
+    async def s22(self):
+        return await self.measure('S22')
+
+    async def s12(self):
+        return await self.measure('S12')
+
+    async def s21(self):
+        return await self.measure('S21')
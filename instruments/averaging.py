@@ -0,0 +1,217 @@
+"""
+Host-side averaging of sweeps.
+
+:class:`SweepAverager` keeps the running mean and variance of every
+frequency point (Welford's update, or exponentially weighted moments),
+so noise can be traded for sweeps instead of instrument RBW and the
+uncertainty is known without storing the raw sweeps:
+
+>>> avg = SweepAverager(vna.numpoints)
+>>> for db_data, deg_data in vna.single_sweeps(64, lambda *data: data):
+...     avg.update_dbdeg(db_data, deg_data)
+>>> avg.mean, avg.stderr
+
+The averaging is done on the real and imaginary parts (domain
+'complex', unbiased for the vector average) or on the magnitude in dB
+and the phase in degrees (domain 'dbdeg', the phase differences being
+wrapped to +/-180 degrees).
+
+"""
+
+from __future__ import division
+
+import numpy as npy
+from skrf.network import Network
+
+DOMAINS = ('complex', 'dbdeg')
+
+
+class SweepAverager(object):
+    """
+    Running mean and variance per frequency point.
+
+    :param points: number of points of the sweeps.
+    :param domain: 'complex' or 'dbdeg'.
+    :param alpha: weight of the latest sweep for exponential weighting
+                  (0 < alpha <= 1), None for the plain average.
+
+    :ivar count: number of sweeps averaged.
+    """
+
+    def __init__(self, points, domain='complex', alpha=None):
+        if domain not in DOMAINS:
+            raise ValueError("domain must be one of %s" % ', '.join(DOMAINS))
+        if alpha is not None and not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.points = int(points)
+        self.domain = domain
+        self.alpha = alpha
+        # two real channels: (re, im) or (dB, deg)
+        self._mean = npy.zeros((2, self.points))
+        self._m2 = npy.zeros((2, self.points)) # sum of squares, or EW variance
+        self._x = npy.empty((2, self.points))
+        self._delta = npy.empty((2, self.points))
+        self.count = 0
+
+    def reset(self):
+        """Start a new average."""
+        self._mean[:] = 0
+        self._m2[:] = 0
+        self.count = 0
+
+    def _check(self, values):
+        if npy.shape(values)[-1] != self.points:
+            raise ValueError("sweep of %d points, averager of %d" % (npy.shape(values)[-1], self.points))
+
+    def _add(self, x):
+        # fold the channels in x into the moments
+        delta = npy.subtract(x, self._mean, out=self._delta)
+        if self.domain == 'dbdeg':
+            phase = delta[1]
+            phase += 180
+            npy.mod(phase, 360, out=phase)
+            phase -= 180
+        self.count += 1
+        if self.count == 1:
+            self._mean[:] = x
+            self._m2[:] = 0
+        elif self.alpha is None:
+            # Welford: M2 += (x - old mean) * (x - new mean)
+            self._mean += delta / self.count
+            delta *= delta
+            delta *= (self.count - 1) / self.count
+            self._m2 += delta
+        else:
+            # var = (1 - alpha) * (var + alpha * delta**2)
+            self._mean += self.alpha * delta
+            delta *= delta
+            delta *= self.alpha
+            self._m2 += delta
+            self._m2 *= 1 - self.alpha
+        if self.domain == 'dbdeg':
+            phase = self._mean[1]
+            phase += 180
+            npy.mod(phase, 360, out=phase)
+            phase -= 180
+
+    def update(self, values):
+        """Add a complex sweep."""
+        self._check(values)
+        x = self._x
+        if self.domain == 'complex':
+            x[0] = npy.real(values)
+            x[1] = npy.imag(values)
+        else:
+            npy.abs(values, out=x[0])
+            npy.log10(x[0], out=x[0])
+            x[0] *= 20
+            x[1] = npy.angle(values, deg=True)
+        self._add(x)
+
+    def update_dbdeg(self, db_data, deg_data):
+        """Add a sweep given as magnitude (dB) and phase (deg) registers."""
+        self._check(db_data)
+        self._check(deg_data)
+        x = self._x
+        if self.domain == 'dbdeg':
+            x[0] = db_data
+            x[1] = deg_data
+        else:
+            magnitude, phase = self._delta # scratch, _add overwrites it
+            npy.multiply(db_data, 1 / 20, out=magnitude)
+            npy.power(10., magnitude, out=magnitude)
+            npy.multiply(deg_data, npy.pi / 180, out=phase)
+            npy.cos(phase, out=x[0])
+            npy.sin(phase, out=x[1])
+            x *= magnitude
+        self._add(x)
+
+    def update_many(self, sweeps):
+        """
+        Add a (sweeps, points) complex array, e.g. SweepBuffer.ordered()[1].
+        The plain complex average merges the whole block at once.
+        """
+        sweeps = npy.asarray(sweeps)
+        self._check(sweeps)
+        if self.domain != 'complex' or self.alpha is not None or len(sweeps) < 2:
+            for values in sweeps:
+                self.update(values)
+            return
+        # merge the moments of the block (Chan et al.)
+        block = npy.array([sweeps.real, sweeps.imag]) # (2, n, points)
+        n = block.shape[1]
+        mean = block.mean(axis=1)
+        m2 = ((block - mean[:, None, :]) ** 2).sum(axis=1)
+        total = self.count + n
+        delta = mean - self._mean
+        self._mean += delta * (n / total)
+        self._m2 += m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+    def _variance(self):
+        # variance of each channel
+        if self.count < 2:
+            return npy.zeros_like(self._m2)
+        if self.alpha is None:
+            return self._m2 / (self.count - 1)
+        return self._m2.copy()
+
+    @property
+    def effective_count(self):
+        """Number of sweeps the average is equivalent to."""
+        if self.alpha is None:
+            return self.count
+        return min(self.count, (2 - self.alpha) / self.alpha)
+
+    @property
+    def mean(self):
+        """Complex mean of the sweeps."""
+        if self.domain == 'complex':
+            return self._mean[0] + 1j * self._mean[1]
+        magnitude = 10 ** (self._mean[0] / 20)
+        return magnitude * npy.exp(1j * npy.radians(self._mean[1]))
+
+    @property
+    def mean_dbdeg(self):
+        """Mean as (dB, deg) arrays."""
+        if self.domain == 'dbdeg':
+            return self._mean[0].copy(), self._mean[1].copy()
+        mean = self.mean
+        return 20 * npy.log10(npy.abs(mean)), npy.angle(mean, deg=True)
+
+    @property
+    def variance(self):
+        """
+        Sample variance per point: E|x - mean|**2 in the complex domain,
+        (dB**2, deg**2) arrays in the dbdeg domain.
+        """
+        variance = self._variance()
+        if self.domain == 'complex':
+            return variance.sum(axis=0)
+        return variance[0], variance[1]
+
+    @property
+    def std(self):
+        """Standard deviation of the sweeps, see variance."""
+        variance = self.variance
+        if self.domain == 'complex':
+            return npy.sqrt(variance)
+        return npy.sqrt(variance[0]), npy.sqrt(variance[1])
+
+    @property
+    def stderr(self):
+        """Standard error of the mean, see variance."""
+        scale = 1 / npy.sqrt(max(self.effective_count, 1))
+        std = self.std
+        if self.domain == 'complex':
+            return std * scale
+        return std[0] * scale, std[1] * scale
+
+    def network(self, frequency, name=None):
+        """One port :class:`skrf.Network` of the mean."""
+        ntwk = Network()
+        ntwk.s = self.mean.reshape(-1, 1, 1)
+        ntwk.frequency = frequency
+        if name is not None:
+            ntwk.name = name
+        return ntwk
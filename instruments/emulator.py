@@ -0,0 +1,500 @@
+"""
+Prologix GPIB-Ethernet controller emulator with an HP4195A attached.
+
+Serves the Prologix ``++`` command set on a TCP port and forwards the
+other lines to instrument personalities, selected by GPIB address, so
+the drivers can be developed and benchmarked without the hardware:
+
+>>> server = PrologixEmulator(('127.0.0.1', 0), {17: HP4195Personality()})
+>>> server.start()
+>>> vna = HP4195('127.0.0.1', 17, port=server.port)
+
+or from a shell:
+
+    python -m instruments.emulator --port 1234 --touchstone results/t520_10uF.s1p
+
+"""
+
+from __future__ import division, print_function
+
+import struct
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError: # Python 2
+    import SocketServer as socketserver
+
+import numpy as npy
+
+
+# status byte bits of the HP4195A, as in hp4195
+STB_SWEEP_END = 0x01
+STB_ERROR = 0x04
+STB_RQS = 0x40
+
+
+def _format_ascii(values):
+    return (",".join(["%+.6E" % value for value in values]) + "\r\n").encode('ascii')
+
+
+def _format_binary(values, dtype):
+    data = npy.asarray(values, dtype=dtype).tobytes()
+    return b"#A" + struct.pack(">H", len(data)) + data
+
+
+def series_rlc(f, c=47e-6, esr=35e-3, esl=1e-9):
+    '''
+    Impedance of a capacitor modelled as a series RLC.
+    '''
+    w = 2 * npy.pi * npy.asarray(f, dtype=float)
+    w = npy.where(w > 0, w, 1e-12)
+    return esr + 1j * w * esl + 1 / (1j * w * c)
+
+
+class HP4195Personality(object):
+    '''
+    Emulated HP4195A network/impedance analyzer.
+
+    The device under test is read from a Touchstone file, or defaults
+    to a 47uF capacitor (series RLC) measured shunt-through. Traces
+    are interpolated on the sweep points, converted according to the
+    measurement function, and returned as ASCII (FMT1) or #A binary
+    blocks (FMT2: 64 bits, FMT3: 32 bits float).
+    Rejected commands, e.g. a two port function (FNC5 to FNC7) for a
+    one port DUT, are counted by ERR? and set the error bit of the
+    status byte.
+
+    Input:
+        touchstone (string) : DUT file, None for the built-in capacitor
+        latency (dict) : seconds spent on a command, by mnemonic
+                         (e.g. {'A?': 0.05, 'NOP': 0.01})
+        default_latency (float) : seconds spent on other commands
+        time_scale (float) : factor applied to the emulated sweep time
+        noise (float) : standard deviation of the trace noise in dB
+    '''
+
+    idn = 'HP4195A'
+
+    # parameters settable with MNEMONIC=value and their query
+    _parameters = {'START': 'start', 'STOP': 'stop', 'CENTER': 'center',
+                   'SPAN': 'span', 'NOP': 'nop', 'RBW': 'rbw',
+                   'OSC1': 'power', 'ATR1': 'att_r1', 'ATT1': 'att_t1'}
+
+    # S-parameter shown by the S-parameter measurement functions
+    _s_functions = {4: (0, 0), 5: (1, 0), 6: (0, 1), 7: (1, 1)}
+
+    def __init__(self, touchstone=None, latency=None, default_latency=0.0,
+                 time_scale=1.0, noise=0.0, z0=50.):
+        self.latency = dict(latency or {})
+        self.default_latency = default_latency
+        self.time_scale = time_scale
+        self.noise = noise
+        self.z0 = z0
+        self._load(touchstone)
+        self.reset()
+
+    def _load(self, touchstone):
+        if touchstone is None:
+            self._f = None
+            return
+        from skrf.network import Network
+        ntwk = Network(touchstone)
+        self._f = ntwk.f
+        self._s = ntwk.s
+        self.z0 = float(npy.real(ntwk.z0[0, 0]))
+
+    def reset(self):
+        '''
+        Power-on state.
+        '''
+        self.function = 1
+        self.sweep_type = 1
+        self.sweep_mode = 1
+        self.fmt = 1
+        self.start = 0.
+        self.stop = 500e6
+        self.nop = 401
+        self.rbw = 3e3
+        self.power = 0.
+        self.att_r1 = 20.
+        self.att_t1 = 20.
+        self.rqs_mask = 0
+        self._stb = 0
+        self._errors = []
+        self._output = []
+        self._trigger()
+
+    ## SWEEP
+    @property
+    def sweep_time(self):
+        '''
+        Emulated sweep duration: a fixed time per point plus the
+        settling of the resolution bandwidth filter.
+        '''
+        return self.time_scale * self.nop * (2.5e-3 + 2. / self.rbw)
+
+    @property
+    def center(self):
+        return (self.start + self.stop) / 2
+
+    @center.setter
+    def center(self, value):
+        span = self.span
+        self.start, self.stop = value - span / 2, value + span / 2
+
+    @property
+    def span(self):
+        return self.stop - self.start
+
+    @span.setter
+    def span(self, value):
+        center = self.center
+        self.start, self.stop = center - value / 2, center + value / 2
+
+    def frequency(self):
+        '''
+        Sweep points (X register).
+        '''
+        if self.sweep_type == 2:
+            return npy.logspace(npy.log10(max(self.start, 1e-3)), npy.log10(self.stop), self.nop)
+        return npy.linspace(self.start, self.stop, self.nop)
+
+    def _trigger(self):
+        self._sweeping = True
+        self._sweep_started = time.time()
+        self._stb &= ~STB_SWEEP_END
+
+    def status_byte(self):
+        '''
+        Current status byte, sweep end and RQS bits included.
+        '''
+        now = time.time()
+        if self._sweeping and now - self._sweep_started >= self.sweep_time:
+            self._stb |= STB_SWEEP_END
+            if self.sweep_mode == 1:
+                # continuous: the next sweep starts right away
+                self._sweep_started = now
+            else:
+                self._sweeping = False
+        if self._stb & self.rqs_mask & ~STB_RQS:
+            self._stb |= STB_RQS
+        return self._stb
+
+    @property
+    def srq(self):
+        return bool(self.status_byte() & STB_RQS)
+
+    def serial_poll(self):
+        '''
+        Status byte for a serial poll, which clears the request.
+        '''
+        stb = self.status_byte()
+        self._stb &= ~(STB_RQS | STB_SWEEP_END)
+        return stb
+
+    ## TRACES
+    def _s_parameters(self, f):
+        if self._f is None:
+            # capacitor in shunt between port 1 and port 2
+            z = series_rlc(f)
+            s11 = -self.z0 / (2 * z + self.z0)
+            s21 = 2 * z / (2 * z + self.z0)
+            return npy.array([[s11, s21], [s21, s11]])
+        ports = self.ports
+        s = npy.empty((ports, ports, len(f)), dtype=complex)
+        for m in range(ports):
+            for n in range(ports):
+                s[m, n] = npy.interp(f, self._f, self._s[:, m, n].real) + \
+                          1j * npy.interp(f, self._f, self._s[:, m, n].imag)
+        return s
+
+    def trace(self):
+        '''
+        Registers A and B for the current measurement function.
+        '''
+        f = self.frequency()
+        s = self._s_parameters(f)
+        if self.function == 3:
+            # impedance: |Z| and phase seen on port 1
+            value = self.z0 * (1 + s[0, 0]) / (1 - s[0, 0])
+            a = npy.abs(value)
+        else:
+            m, n = self._s_functions.get(self.function, (min(1, len(s) - 1), 0))
+            value = s[m, n]
+            a = 20 * npy.log10(npy.abs(value))
+            if self.function == 2:
+                a = a + self.power
+        if self.noise:
+            a = a + npy.random.normal(0, self.noise, len(a))
+        return a, npy.degrees(npy.angle(value))
+
+    def register(self, name):
+        if name == 'X':
+            return self.frequency()
+        a, b = self.trace()
+        if name in ('A', 'C'):
+            return a
+        if name in ('B', 'D'):
+            return b
+        raise KeyError(name)
+
+    ## GPIB
+    def _respond_values(self, values):
+        if self.fmt == 3:
+            self._output.append(_format_binary(values, '>f4'))
+        elif self.fmt == 2:
+            self._output.append(_format_binary(values, '>f8'))
+        else:
+            self._output.append(_format_ascii(values))
+
+    def _delay(self, command):
+        # latency by full command name (e.g. 'A?', 'FNC4', 'START'),
+        # then by mnemonic (e.g. 'A', 'FNC')
+        name = command.split('=')[0].strip()
+        mnemonic = name.rstrip('?').rstrip('0123456789')
+        return self.latency.get(name, self.latency.get(mnemonic, self.default_latency))
+
+    @property
+    def ports(self):
+        '''
+        Number of ports of the DUT.
+        '''
+        return 2 if self._f is None else self._s.shape[1]
+
+    def _error(self, command):
+        # rejected command: counted by ERR?, flagged in the status byte
+        self._errors.append(command)
+        self._stb |= STB_ERROR
+
+    def _command(self, command):
+        delay = self._delay(command)
+        if delay:
+            time.sleep(delay)
+
+        if '=' in command or command.startswith('RQS '):
+            name, value = command.replace(' ', '=', 1).split('=', 1)
+            try:
+                value = float(value)
+            except ValueError:
+                self._error(command)
+                return
+            if name == 'RQS':
+                self.rqs_mask = int(value)
+            elif name in self._parameters:
+                setattr(self, self._parameters[name], value)
+                self.nop = int(self.nop)
+            else:
+                self._error(command)
+        elif command.endswith('?'):
+            name = command[:-1]
+            if name == 'ID':
+                self._output.append(('%s\r\n' % self.idn).encode('ascii'))
+            elif name == 'STB':
+                self._output.append(('%d\r\n' % self.status_byte()).encode('ascii'))
+            elif name == 'ERR':
+                self._output.append(('%d\r\n' % len(self._errors)).encode('ascii'))
+                self._errors = []
+                self._stb &= ~STB_ERROR
+            elif name == 'ST':
+                self._output.append(_format_ascii([self.sweep_time]))
+            elif name in ('FNC', 'SWT', 'SWM'):
+                value = getattr(self, {'FNC': 'function', 'SWT': 'sweep_type', 'SWM': 'sweep_mode'}[name])
+                self._output.append(('%d\r\n' % value).encode('ascii'))
+            elif name in self._parameters:
+                self._output.append(_format_ascii([getattr(self, self._parameters[name])]))
+            elif name in ('A', 'B', 'C', 'D', 'X'):
+                self._respond_values(self.register(name))
+            else:
+                self._error(command)
+        elif command[:3] in ('FNC', 'SWT', 'SWM', 'FMT') and command[3:].isdigit():
+            if command[:3] == 'FNC' and int(command[3:]) in self._s_functions \
+                    and max(self._s_functions[int(command[3:])]) >= self.ports:
+                self._error(command) # two port function on a one port DUT
+                return
+            attribute = {'FNC': 'function', 'SWT': 'sweep_type',
+                         'SWM': 'sweep_mode', 'FMT': 'fmt'}[command[:3]]
+            setattr(self, attribute, int(command[3:]))
+            if command[:3] == 'SWM':
+                self._sweeping = False
+            if self.sweep_mode == 1 and command[:3] in ('SWM', 'SWT', 'FNC'):
+                self._trigger()
+        elif command == 'SWTRG':
+            self._trigger()
+        elif command == 'RST':
+            self.reset()
+        else:
+            self._error(command)
+
+    def write(self, message):
+        '''
+        Execute a ';' separated program message.
+        '''
+        for command in message.split(';'):
+            command = command.strip().upper()
+            if command:
+                self._command(command)
+
+    def read(self):
+        '''
+        Pending output, as sent when the instrument is told to talk.
+        '''
+        output, self._output = b''.join(self._output), []
+        return output
+
+
+class _PrologixHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        data = b''
+        while True:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            data += chunk.replace(b'\r', b'\n')
+            lines = data.split(b'\n')
+            data = lines.pop()
+            for line in lines:
+                line = line.decode('ascii').strip()
+                if not line:
+                    continue
+                with server.lock:
+                    response = server.execute(line)
+                if response:
+                    self.request.sendall(response)
+
+
+class PrologixEmulator(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    '''
+    TCP server speaking the Prologix GPIB-Ethernet protocol.
+
+    Input:
+        address (tuple) : (host, port) to listen on, port 0 picks a free one
+        instruments (dict) : personalities by GPIB address
+        latency (float) : seconds spent on each ``++`` command
+        version (string) : answer to ``++ver``
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 1234), instruments=None, latency=0.0,
+                 version='Prologix GPIB-ETHERNET Controller version 01.06.06.00'):
+        socketserver.TCPServer.__init__(self, address, _PrologixHandler)
+        self.instruments = instruments if instruments is not None else {17: HP4195Personality()}
+        self.latency = latency
+        self.version = version
+        self.lock = threading.RLock()
+        self.addr = min(self.instruments) if self.instruments else 0
+        self.auto = False
+        self.eoi = True
+        self.mode = 1
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def instrument(self):
+        return self.instruments.get(self.addr)
+
+    def _controller(self, command, argument):
+        if self.latency:
+            time.sleep(self.latency)
+        if command == 'addr':
+            if argument is None:
+                return '%d' % self.addr
+            self.addr = int(argument.split()[0])
+        elif command == 'auto':
+            if argument is None:
+                return '%d' % self.auto
+            self.auto = bool(int(argument))
+        elif command == 'eoi':
+            if argument is None:
+                return '%d' % self.eoi
+            self.eoi = bool(int(argument))
+        elif command == 'mode':
+            if argument is None:
+                return '%d' % self.mode
+            self.mode = int(argument)
+        elif command == 'ver':
+            return self.version
+        elif command == 'srq':
+            return '%d' % any(inst.srq for inst in self.instruments.values())
+        elif command == 'spoll':
+            addr = self.addr if argument is None else int(argument.split()[0])
+            inst = self.instruments.get(addr)
+            return '%d' % (inst.serial_poll() if inst is not None else 0)
+        elif command in ('clr', 'rst') and self.instrument is not None:
+            self.instrument.reset()
+        elif command == 'trg' and self.instrument is not None:
+            self.instrument.write('SWTRG')
+        elif command == 'savecfg' and argument is None:
+            return '0'
+        # other commands (eos, eot_enable, read_tmo_ms, ...) are accepted
+
+    def execute(self, line):
+        '''
+        Process one line received from a client, return the bytes to send back.
+        '''
+        if line.startswith('++'):
+            parts = line[2:].split(None, 1)
+            command = parts[0].lower()
+            if command == 'read':
+                # the instrument talks, whatever the termination asked for
+                return self.instrument.read() if self.instrument is not None else None
+            response = self._controller(command, parts[1] if len(parts) > 1 else None)
+            if response is None:
+                return None
+            return ('%s\r\n' % response).encode('ascii')
+        inst = self.instrument
+        if inst is None:
+            return None
+        inst.write(line)
+        if self.auto and '?' in line:
+            return inst.read()
+        return None
+
+    def start(self):
+        '''
+        Serve from a background thread.
+        '''
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1234)
+    parser.add_argument('--gpib', type=int, default=17, help='HP4195 GPIB address')
+    parser.add_argument('--touchstone', help='DUT file, default: built-in 47uF capacitor')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds spent on each instrument command')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='factor applied to the emulated sweep time')
+    args = parser.parse_args()
+
+    vna = HP4195Personality(args.touchstone, default_latency=args.latency, time_scale=args.time_scale)
+    server = PrologixEmulator((args.host, args.port), {args.gpib: vna})
+    print('Prologix emulator listening on %s:%d' % server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
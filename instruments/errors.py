@@ -44,3 +44,10 @@ class InvalidBinaryFormat(Error):
             description = ": " + description
         super(InvalidBinaryFormat, self).__init__("Unrecognized binary data format" + description)
 
+
+class Timeout(Error):
+
+    def __init__(self, description=""):
+        if description:
+            description = ": " + description
+        super(Timeout, self).__init__("Timeout expired before operation completed" + description)
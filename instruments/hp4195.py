@@ -1,22 +1,112 @@
 
-import numpy as npy
-
-from prologix import *
+from .prologix import *
+from .streaming import SweepStream
 
+from contextlib import contextmanager
+from time import sleep, time
 from warnings import warn
 
-from skrf.frequency import *
-from skrf.network import *
-from skrf import mathFunctions as mf
+# numpy, scikit-rf and the modules built on them are imported by the
+# data methods, on first use: connecting, configuring and querying the
+# instrument only need the standard library
+
+# status byte bits
+STB_SWEEP_END = 0x01
+STB_RQS = 0x40
 
-class HP4195():
+def dbdeg_network(db_data, deg_data, frequency):
+    '''
+    One port Network from magnitude (dB) and phase (deg) registers.
+    '''
+    from skrf import mathFunctions as mf
+    from skrf.network import Network
+
+    data=mf.dbdeg_2_reim(db_data,deg_data) # convert to Re/Im array
+    ntwk = Network()
+    ntwk.s =data.reshape(-1,1,1) # fxnxn format for 1 port Network.s definition
+    ntwk.frequency= frequency # add frequency points
+    return ntwk
+
+class HP4195(object):
     '''
     HP4195A
+
+    Settings are kept in a local shadow: each one is queried once, then
+    updated by the setters and served from memory. Call resync() after
+    changing settings from the front panel.
     '''
-    def __init__(self, ip_prologix='137.138.62.172',gpib_address=17,**kwargs):
-        self.plx = prologix_ethernet(ip_prologix)
+
+    # shadowed settings and the query reading each of them
+    _queries = {'start': 'START?', 'stop': 'STOP?',
+                'center': 'CENTER?', 'span': 'SPAN?',
+                'nop': 'NOP?', 'rbw': 'RBW?', 'power': 'OSC1?',
+                'att_r1': 'ATR1?', 'att_t1': 'ATT1?',
+                'sweep_time': 'ST?', 'function': 'FNC?',
+                'sweep_type': 'SWT?', 'sweep_mode': 'SWM?'}
+
+    # shadowed settings holding a mode number rather than a value
+    _modes = frozenset(['function', 'sweep_type', 'sweep_mode'])
+
+    # settings the stimulus (X register) depends on
+    _sweep_settings = frozenset(['start', 'stop', 'center', 'span',
+                                 'nop', 'sweep_type'])
+
+    # settings the (automatic) sweep time depends on
+    _sweep_time_settings = _sweep_settings | frozenset(['rbw'])
+
+    def __init__(self, ip_prologix='137.138.62.172',gpib_address=17,port=1234,**kwargs):
+        self.plx = prologix_ethernet(ip_prologix, port)
         self.inst = self.plx.instrument(gpib_address,values_format = single|big_endian)
         self.inst.timeout = 30
+        self._state = {}
+        self._axis = None # cached X register
+        self._averaging = 1 # host averaging factor
+
+    ## SETTINGS SHADOW
+    def _setting(self, name):
+        '''
+        Value of a shadowed setting, queried only if unknown.
+        '''
+        state = self._state
+        # start/stop and center/span can be derived from each other
+        if 'start' in state and 'stop' in state:
+            state.setdefault('center', (state['start'] + state['stop']) / 2.)
+            state.setdefault('span', state['stop'] - state['start'])
+        elif 'center' in state and 'span' in state:
+            state.setdefault('start', state['center'] - state['span'] / 2.)
+            state.setdefault('stop', state['center'] + state['span'] / 2.)
+        if name not in state:
+            value = float(self.inst.ask('FMT1;%s' % self._queries[name]))
+            state[name] = int(value) if name in self._modes else value
+        return state[name]
+
+    def _update(self, drop=(), **settings):
+        '''
+        Record settings just written, dropping the derived ones they change.
+        '''
+        for name in drop:
+            self._state.pop(name, None)
+        self._state.update(settings)
+        if self._sweep_settings.intersection(settings):
+            self._axis = None
+        if self._sweep_time_settings.intersection(settings):
+            self._state.pop('sweep_time', None)
+
+    @property
+    def settings(self):
+        '''
+        Copy of the shadowed settings known so far.
+        '''
+        return dict(self._state)
+
+    def resync(self):
+        '''
+        Forget the shadowed settings and read them back from the instrument.
+        '''
+        self._state.clear()
+        self._axis = None
+        for name in sorted(self._queries):
+            self._setting(name)
 
     ## BASIC GPIB
     @property
@@ -35,14 +125,47 @@ class HP4195():
 
     def reset(self):
         '''
-        reset
+        reset, the settings shadow is invalidated
         '''
         self.inst.write('RST;')
+        self._state.clear()
+        self._axis = None
 
     @property
     def error(self):
         return self.inst.ask('ERR?')
 
+    @contextmanager
+    def batch(self):
+        '''
+        Send the settings made inside a ``with`` block as one program
+        message, e.g.
+
+        >>> with vna.batch():
+        ...     vna.start_freq = 1e3
+        ...     vna.stop_freq = 1e6
+        ...     vna.numpoints = 401
+
+        If the block raises, the commands still queued are discarded
+        and the settings changed in the block are dropped from the
+        shadow, to be queried again: some may have been sent before.
+        '''
+        state = dict(self._state)
+        axis = self._axis
+        try:
+            with self.inst.batch() as inst:
+                yield inst
+        except BaseException:
+            missing = object()
+            for name in set(state) | set(self._state):
+                if state.get(name, missing) != self._state.get(name, missing):
+                    state.pop(name, None)
+            self._state.clear()
+            self._state.update(state)
+            if self._axis is not axis:
+                self._axis = None
+            raise
+
     ## TRIGGER
 
     def set_trigger_continuous(self):
@@ -56,6 +179,7 @@ class HP4195():
             None
         '''
         self.inst.write('SWM1')
+        self._update(sweep_mode=1)
 
     def set_trigger_single(self):
         '''
@@ -69,6 +193,7 @@ class HP4195():
             None
         '''
         self.inst.write('SWM2')
+        self._update(sweep_mode=2)
 
     def set_trigger_manual(self):
         '''
@@ -81,6 +206,7 @@ class HP4195():
             None
         '''
         self.inst.write('SWM3')
+        self._update(sweep_mode=3)
 
     def send_trigger(self):
         '''
@@ -94,15 +220,175 @@ class HP4195():
         '''
         self.inst.write('SWTRG')
 
-    def trigger_and_wait_till_done(self):
+    def set_service_request(self, mask=STB_SWEEP_END):
+        '''
+        Enable service requests (SRQ) for the status bits in mask.
+
+        Input:
+            mask (int) : status byte bits, default sweep end
+
+        Output:
+            None
+        '''
+        self.inst.write('RQS=%d' % mask)
+        self._state['rqs'] = mask
+
+    def trigger_and_wait_till_done(self, timeout=25):
         '''
         send a manual trigger signal, and dont return untill operation
         is completed
+
+        The sweep end raises a service request, waited for on the SRQ
+        line. Raises errors.Timeout if the sweep has not ended after
+        timeout seconds.
+
+        Output:
+            status (int) : status byte read by the serial poll
         '''
+        if self._state.get('rqs') != STB_SWEEP_END:
+            self.set_service_request(STB_SWEEP_END)
+        self.inst.stb # clear a request left by a previous sweep
         self.send_trigger()
-        #status=self.status()
-        self.wait_for_srq()
-        #TODO check if it works
+        return self.inst.wait_for_srq(timeout)
+
+    def _prepare_single_sweeps(self):
+        '''
+        Single sweep mode with a service request at the sweep end,
+        returns the previous sweep mode.
+        '''
+        sweep_mode = self._setting('sweep_mode')
+        if sweep_mode != 2:
+            self.set_trigger_single()
+        # the mask cannot be queried: set it unless known to be set
+        if self._state.get('rqs') != STB_SWEEP_END:
+            self.set_service_request(STB_SWEEP_END)
+        self.inst.stb # clear a request left by a previous sweep
+        return sweep_mode
+
+    def _restore_sweep_mode(self, sweep_mode):
+        '''
+        Back to the sweep mode returned by _prepare_single_sweeps.
+        '''
+        if sweep_mode == 1:
+            self.set_trigger_continuous()
+        elif sweep_mode == 3:
+            self.set_trigger_manual()
+
+    def _wait_sweep_end(self, started, guard=0.01, timeout=25):
+        '''
+        Sleep until the sweep triggered at time started should be over,
+        then confirm with a serial poll (waiting on SRQ if it is not).
+        '''
+        remaining = started + self.sweep_time + guard - time()
+        if remaining > 0:
+            sleep(remaining)
+        status = self.inst.stb
+        if not status & STB_SWEEP_END:
+            status = self.inst.wait_for_srq(timeout)
+        return status
+
+    def single_sweeps(self, count=None, process=None, registers=('A', 'B'), guard=0.01, timeout=25):
+        '''
+        Run single sweeps back to back and yield their data.
+
+        Each sweep is triggered, waited for using the sweep time plus
+        guard seconds, confirmed by the status byte, then read. The
+        previous trace is processed (and handed to the caller) while
+        the next sweep runs, so the rate follows the instrument's. The
+        previous sweep mode is restored when the generator is exhausted
+        or closed, or when a sweep fails.
+
+        Input:
+            count (int) : number of sweeps, None to run until closed
+            process (callable) : applied to the register arrays,
+                                 default: one port Network from A and B
+            registers (strings) : registers read after each sweep
+            guard (float) : seconds waited past the sweep time
+
+        Output:
+            generator of process(*registers) results
+        '''
+        if process is None:
+            process = lambda db_data, deg_data: dbdeg_network(db_data, deg_data, self.frequency)
+        sweeps = self._triggered_sweeps(count, registers, guard, timeout)
+        try:
+            for started, data in sweeps:
+                yield process(*data)
+        finally:
+            sweeps.close()
+
+    def _triggered_sweeps(self, count=None, registers=('A', 'B'), guard=0.01, timeout=25):
+        '''
+        Generator of (trigger time, register arrays) of single sweeps,
+        each yielded once the following sweep has been triggered. The
+        previous sweep mode is restored however the generator ends.
+        '''
+        sweep_mode = self._prepare_single_sweeps()
+        try:
+            pending = None
+            done = 0
+            while count is None or done < count:
+                self.send_trigger()
+                started = time()
+                if pending is not None:
+                    yield pending
+                self._wait_sweep_end(started, guard, timeout)
+                pending = (started, self.read_registers(*registers))
+                done += 1
+            if pending is not None:
+                yield pending
+        finally:
+            self._restore_sweep_mode(sweep_mode)
+
+    def single_sweep(self, registers=('A', 'B'), guard=0.01, timeout=25):
+        '''
+        Trigger one sweep, wait for its end and read the registers.
+
+        Output:
+            data (32 bits float) : one array of data points per register
+        '''
+        sweeps = self._triggered_sweeps(1, registers, guard, timeout)
+        try:
+            started, data = next(sweeps)
+        finally:
+            sweeps.close() # restores the sweep mode
+        return data
+
+    def stream(self, maxsize=16, policy='block', count=None, process=None,
+               registers=('A', 'B'), guard=0.01, timeout=25):
+        '''
+        Acquire single sweeps continuously on a background thread.
+
+        The sweeps are queued (at most maxsize of them) as soon as
+        read; when the queue is full the 'block' policy holds the
+        acquisition until the consumer catches up, the 'drop' policy
+        discards the oldest sweep instead. Stopping the stream (close(),
+        leaving the ``with`` block or the loop) waits for the sweep in
+        progress, then puts the instrument back in its previous sweep
+        mode.
+        Do not use the instrument from another thread meanwhile.
+
+        >>> with vna.stream(policy='drop') as sweeps:
+        ...     for timestamp, ntwk in sweeps:
+        ...         ...
+
+        Input:
+            maxsize (int) : number of sweeps the queue holds
+            policy (string) : 'block' or 'drop'
+            count (int) : number of sweeps, None to run until stopped
+            process (callable) : applied to the register arrays in the
+                                 consumer thread, default: one port Network
+            registers (strings) : registers read after each sweep
+
+        Output:
+            streaming.SweepStream of (trigger time, process(*registers))
+        '''
+        if process is None:
+            frequency = self.frequency # read before the thread owns the bus
+            process = lambda db_data, deg_data: dbdeg_network(db_data, deg_data, frequency)
+        sweeps = self._triggered_sweeps(count, registers, guard, timeout)
+        # closing the generator on the thread restores the sweep mode
+        return SweepStream(sweeps, maxsize, policy, process)
 
     @property
     def continuous(self):
@@ -120,21 +406,60 @@ class HP4195():
     @property
     def averaging(self):
         '''
-        averaging factor
+        averaging factor: number of single sweeps averaged on the host
+        by one_port (and s11, two_port...), 1 for no averaging
         '''
-        raise NotImplementedError
+        return self._averaging
 
     @averaging.setter
     def averaging(self, factor ):
-        raise NotImplementedError
-        #self.inst.write('AVERON %i;'%factor )
+        factor = int(factor)
+        if factor < 1:
+            raise ValueError('averaging factor must be at least 1')
+        self._averaging = factor
+
+    def average(self, count=None, domain='complex', alpha=None, guard=0.01, timeout=25):
+        '''
+        Average single sweeps of the A/B registers on the host.
+
+        The running mean and variance per point are kept (see
+        averaging.SweepAverager), so the uncertainty of the mean comes
+        with it. The trigger mode is restored afterwards.
+
+        Input:
+            count (int) : number of sweeps, default: the averaging factor
+            domain (string) : 'complex' or 'dbdeg'
+            alpha (float) : weight of the latest sweep for exponential
+                            weighting, None for the plain average
+
+        Output:
+            averager (SweepAverager)
+        '''
+        from .averaging import SweepAverager
+
+        if count is None:
+            count = self._averaging
+        averager = SweepAverager(len(self.frequency), domain, alpha)
+        sweeps = self._triggered_sweeps(count, ('A', 'B'), guard, timeout)
+        try:
+            for started, data in sweeps:
+                averager.update_dbdeg(*data)
+        finally:
+            sweeps.close() # restores the sweep mode, even on Timeout
+        return averager
 
     @property
     def frequency(self, unit='hz'):
-        freq=Frequency( float(self.inst.ask('FMT1;START?')),\
-                float(self.inst.ask('FMT1;STOP?')),\
-                int(float(self.inst.ask('FMT1;NOP?'))),\
-                'hz')
+        '''
+        Frequency points of the sweep, as found in the X register.
+        Correct for log sweeps too; read once per sweep configuration.
+        '''
+        import numpy as npy
+        from skrf.frequency import Frequency
+
+        if self._axis is None:
+            self._axis = npy.array(self.read_register('X'), dtype=float)
+        freq = Frequency.from_f(self._axis, unit='hz')
         freq.unit = unit
         return freq
 
@@ -146,12 +471,30 @@ class HP4195():
             register(string) to read
 
         Output:
-            data (32 bits float)  : list of data points
+            data (32 bits float)  : array of data points
         '''
         command="FMT3;%s?" %(register)
         data = self.inst.ask_for_values(command)
         return data
 
+    def read_registers(self, *registers):
+        '''
+        Read several data registers in a single transaction, so that
+        they all come from the same sweep.
+
+        Input:
+            registers (strings) to read, e.g. 'A', 'B', 'X'
+
+        Output:
+            data (32 bits float)  : one array of data points per register
+        '''
+        command = "FMT3;" + ";".join(["%s?" % register for register in registers])
+        data = self.inst.ask_for_values(command, frames=len(registers))
+        if 'X' in registers and self._axis is None:
+            import numpy as npy
+            self._axis = npy.array(data[registers.index('X')], dtype=float)
+        return data
+
 
     def set_measurement_network(self):
         '''
@@ -164,6 +507,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC1')
+        self._update(function=1)
 
 
     def set_measurement_spectrum(self):
@@ -177,6 +521,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC2')
+        self._update(function=2)
 
     def set_measurement_impedance(self):
         '''
@@ -189,6 +534,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC3')
+        self._update(function=3)
 
     def set_measurement_S11(self):
         '''
@@ -201,6 +547,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC4')
+        self._update(function=4)
 
     def set_measurement_S22(self):
         '''
@@ -213,6 +560,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC7')
+        self._update(function=7)
 
     def set_measurement_S12(self):
         '''
@@ -225,6 +573,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC6')
+        self._update(function=6)
 
     def set_measurement_S21(self):
         '''
@@ -237,6 +586,7 @@ class HP4195():
             None
         '''
         self.inst.write('FNC5')
+        self._update(function=5)
 
     def set_lin_freq(self):
         '''
@@ -249,6 +599,7 @@ class HP4195():
             None
         '''
         self.inst.write('SWT1')
+        self._update(sweep_type=1)
 
     def set_log_freq(self):
         '''
@@ -261,14 +612,15 @@ class HP4195():
             None
         '''
         self.inst.write('SWT2')
+        self._update(sweep_type=2)
     ### parameters
 
     @property
     def sweep_time(self):
         '''
-        Get sweep time from device
+        Get sweep time from device, queried once per sweep configuration
         '''
-        return float(self.inst.ask('FMT1;ST?'))
+        return self._setting('sweep_time')
 
     @property
     def resbw(self):
@@ -281,7 +633,7 @@ class HP4195():
         Output:
             bandwidth (float)   : Resolution bandwidth
         '''
-        return self.inst.ask('FMT1;RBW?')
+        return self._setting('rbw')
 
     @resbw.setter
     def resbw(self, bw):
@@ -296,6 +648,7 @@ class HP4195():
             None
         '''
         self.inst.write('RBW=%f' %bw)
+        self._update(rbw=float(bw))
 
 
     @property
@@ -309,7 +662,7 @@ class HP4195():
         Output:
             numpoints (int) : Number of points in trace
         '''
-        return self.inst.ask('FMT1;NOP?')
+        return int(self._setting('nop'))
 
     @numpoints.setter
     def numpoints(self, numpts):
@@ -324,6 +677,7 @@ class HP4195():
             None
         '''
         self.inst.write('NOP=%f' %numpts)
+        self._update(nop=int(numpts))
 
 
     @property
@@ -337,8 +691,7 @@ class HP4195():
         Output:
             freq (float)    : Start frequency
         '''
-        #return float(self.inst.ask('FMT1;START?'))
-        return self.inst.ask('FMT1;START?')
+        return self._setting('start')
 
     @start_freq.setter
     def start_freq(self, freq):
@@ -352,6 +705,7 @@ class HP4195():
             None
         '''
         self.inst.write('START=%f' %freq)
+        self._update(('center', 'span'), start=float(freq))
 
     @property
     def stop_freq(self):
@@ -364,7 +718,7 @@ class HP4195():
         Output:
             freq (float)    : Stop frequency
         '''
-        return (self.inst.ask('FMT1;STOP?'))
+        return self._setting('stop')
 
     @stop_freq.setter
     def stop_freq(self, freq):
@@ -378,6 +732,7 @@ class HP4195():
             None
         '''
         self.inst.write('STOP=%f' %freq)
+        self._update(('center', 'span'), stop=float(freq))
 
     @property
     def center_freq(self):
@@ -390,7 +745,7 @@ class HP4195():
         Output:
             freq (float) : Center Frequency
         '''
-        return float(self.inst.ask('FMT1;CENTER?'))
+        return self._setting('center')
 
     @center_freq.setter
     def center_freq(self, freq):
@@ -404,6 +759,7 @@ class HP4195():
             None
         '''
         self.inst.write('CENTER=%f' %freq)
+        self._update(('start', 'stop'), center=float(freq))
 
 
     @property
@@ -417,7 +773,7 @@ class HP4195():
         Output:
             freq (float) : Span frequency
         '''
-        return float(self.inst.ask('FMT1;SPAN?'))
+        return self._setting('span')
 
     @span_freq.setter
     def span_freq(self, freq):
@@ -431,6 +787,7 @@ class HP4195():
             None
         '''
         self.inst.write('SPAN=%f' %freq)
+        self._update(('start', 'stop'), span=float(freq))
 
     @property
     def power(self):
@@ -443,7 +800,7 @@ class HP4195():
         Output:
             pow (float) : Power
         '''
-        return float(self.inst.ask('FMT1;OSC1?'))
+        return self._setting('power')
 
 
     @power.setter
@@ -458,6 +815,7 @@ class HP4195():
             None
         '''
         self.inst.write('OSC1=%f' % pow)
+        self._update(power=float(pow))
 
     @property
     def att_r1(self):
@@ -470,7 +828,7 @@ class HP4195():
         Output:
             att (dB): port r1 attenuation
         '''
-        return int(float(self.inst.ask('FMT1;ATR1?')))
+        return int(self._setting('att_r1'))
 
     @att_r1.setter
     def att_r1(self,att):
@@ -485,6 +843,7 @@ class HP4195():
             None
         '''
         self.inst.write('ATR1=%f' %att)
+        self._update(att_r1=float(att))
 
     @property
     def att_t1(self):
@@ -497,7 +856,7 @@ class HP4195():
         Output:
             att (dB): port t1 attenuation
         '''
-        return int(float(self.inst.ask('FMT1;ATT1?')))
+        return int(self._setting('att_t1'))
 
     @att_t1.setter
     def att_t1(self,att):
@@ -512,6 +871,7 @@ class HP4195():
             None
         '''
         self.inst.write('ATT1=%f' %att)
+        self._update(att_t1=float(att))
 
     
     @property
@@ -520,43 +880,205 @@ class HP4195():
         Initiates a sweep and returns a  Network type representing the
         data.
         '''
-        #self.continuous = False #VNA single sweep mode
-        #self.send_trigger() #VNA trigger one time
-        db_data = npy.array(self.read_register('A')) #MAG in Db
-        deg_data = npy.array(self.read_register('B')) #Phase in Deg
-        data=mf.dbdeg_2_reim(db_data,deg_data) # convert to Re/Im array
+        if self._averaging > 1:
+            return self.average().network(self.frequency)
+        db_data, deg_data = self.read_registers('A', 'B') #MAG in Db, Phase in Deg
+        return dbdeg_network(db_data, deg_data, self.frequency)
+
+    def sweep_buffer(self, capacity=1000):
+        '''
+        Ring buffer holding capacity sweeps of the current configuration.
+
+        Output:
+            sweepbuffer.SweepBuffer on the current frequency axis
+        '''
+        from .sweepbuffer import SweepBuffer
+
+        self.frequency # make sure the X register is known
+        return SweepBuffer(capacity, self._axis)
+
+    def read_into(self, buffer, timestamp=None):
+        '''
+        Read the current trace into the next slot of a SweepBuffer,
+        with the settings it was taken with. Unlike one_port, nothing is
+        allocated but the transfer itself. Raises ValueError if the
+        sweep is not on the buffer's frequency axis (the X register is
+        read again after a sweep setting changed).
+
+        Output:
+            slot (int) : where the trace was written
+        '''
+        import numpy as npy
+
+        if timestamp is None:
+            timestamp = time()
+        if self._axis is None:
+            self.frequency # reads the X register
+        if not npy.array_equal(self._axis, buffer.f):
+            raise ValueError('sweep of %d points from %g to %g Hz, the buffer axis has %d points from %g to %g Hz'
+                             % (len(self._axis), self._axis[0], self._axis[-1],
+                                buffer.points, buffer.f[0], buffer.f[-1]))
+        db_data, deg_data = self.read_registers('A', 'B')
+        return buffer.append_dbdeg(db_data, deg_data, timestamp, self._state)
+
+    # two port parameters in acquisition order (the forward ones, then
+    # the reverse ones: one test set switch), with their index in s
+    # and measurement function
+    _two_port_order = (('S11', 0, 0, 4), ('S21', 1, 0, 5),
+                       ('S22', 1, 1, 7), ('S12', 0, 1, 6))
+
+    def measure_two_port(self, progress=None, guard=0.01, timeout=25):
+        '''
+        Measure the four S-parameters with single sweeps.
+
+        The frequency axis is read once. Each parameter switch is sent
+        with the trigger of its sweep, and the previous parameter is
+        decoded into the result while that sweep runs. With averaging
+        above 1, each parameter is averaged over that many sweeps. The
+        measurement function and the trigger mode are restored
+        afterwards, also when a sweep fails.
+
+        Input:
+            progress (callable) : called as progress(name, done, total)
+                                  after each parameter, e.g. ('S21', 2, 4)
+
+        Output:
+            ntwk (Network) : two port network
+        '''
+        import numpy as npy
+        from skrf.network import Network
+        from .averaging import SweepAverager
+        from .sweepbuffer import dbdeg_to_complex
+
+        frequency = self.frequency
+        points = len(self._axis)
+        s = npy.empty((points, 2, 2), dtype=complex)
+        scratch = npy.empty(points), npy.empty(points)
+        repeats = self._averaging
+        plan = [parameter for parameter in self._two_port_order for _ in range(repeats)]
+        state = {'averager': None, 'done': 0}
+
+        def decode(parameter, data):
+            name, i, j, function = parameter
+            if repeats == 1:
+                dbdeg_to_complex(data[0], data[1], s[:, i, j], *scratch)
+            else:
+                if state['averager'] is None:
+                    state['averager'] = SweepAverager(points)
+                state['averager'].update_dbdeg(*data)
+                if state['averager'].count < repeats:
+                    return
+                s[:, i, j] = state['averager'].mean
+                state['averager'] = None
+            state['done'] += 1
+            if progress is not None:
+                progress(name, state['done'], len(self._two_port_order))
+
+        function = self._setting('function')
+        sweep_mode = self._prepare_single_sweeps()
+        try:
+            pending = None
+            for parameter in plan:
+                with self.batch():
+                    if self._state.get('function') != parameter[3]:
+                        self.inst.write('FNC%d' % parameter[3])
+                        self._update(function=parameter[3])
+                    self.send_trigger()
+                started = time()
+                if pending is not None:
+                    decode(*pending)
+                self._wait_sweep_end(started, guard, timeout)
+                pending = (parameter, self.read_registers('A', 'B'))
+            decode(*pending)
+        finally:
+            # the function first: in continuous mode it would start a sweep
+            with self.batch():
+                if self._state.get('function') != function:
+                    self.inst.write('FNC%d' % function)
+                    self._update(function=function)
+                self._restore_sweep_mode(sweep_mode)
+
         ntwk = Network()
-        ntwk.s =data.reshape(-1,1,1) # fxnxn format for 1 port Network.s definition
-        ntwk.frequency= self.frequency # add frequency points
-        #self.continuous  = True # VNA back to continous sweep
+        ntwk.s = s
+        ntwk.frequency = frequency
         return ntwk
 
     @property
     def two_port(self):
         '''
-        Initiates a sweep and returns a  Network type represting the
-        data.
+        Measures the four S-parameters and returns a two port Network,
+        see measure_two_port.
+        '''
+        return self.measure_two_port()
 
-        if you are taking multiple sweeps, and want the sweep timing to
-        work, put the turn continuous mode off. like pnax.continuous='off'
+    def wideband(self, start, stop, segments=None, progress=None, **plan):
         '''
-        print ('s11')
-        s11 = self.s11.s[:,0,0]
-        print ('s12')
-        s12 = self.s12.s[:,0,0]
-        print ('s22')
-        s22 = self.s22.s[:,0,0]
-        print ('s21')
-        s21 = self.s21.s[:,0,0]
+        Measure a band of several decades in log sweep segments, back
+        to back, and stitch them into one one port Network.
 
-        ntwk = Network()
-        ntwk.s = npy.array(\
-                [[s11,s21],\
-                [ s12, s22]]\
-                ).transpose().reshape(-1,2,2)
-        ntwk.frequency= self.frequency
+        Each segment has its own RBW, NOP and attenuators (see
+        segments.plan_segments); its bad leading points and the overlap
+        with the previous segment are dropped. The measurement function
+        is left as is, the sweep settings are those of the last segment
+        and the sweep mode is restored.
 
+        >>> z11 = vna.wideband(100, 500e6, points_per_decade=80)
+        >>> z11 = vna.wideband(100, 500e6, edges=[10e3], att_r1=[20, 0])
+
+        Input:
+            start, stop (float) : band, Hz
+            segments (list) : planned segments, default:
+                              plan_segments(start, stop, **plan)
+            progress (callable) : called as progress(segment, done, total)
+
+        Output:
+            ntwk (Network)
+        '''
+        import numpy as npy
+        from skrf.frequency import Frequency
+        from skrf.network import Network
+        from .segments import plan_segments, stitch_segments
+        from .sweepbuffer import dbdeg_to_complex
+
+        if segments is None:
+            segments = plan_segments(start, stop, **plan)
+        for segment in segments:
+            for name in segment.settings:
+                setter = getattr(type(self), name, None)
+                if not isinstance(setter, property) or setter.fset is None:
+                    raise ValueError("%s is not an HP4195 setting" % name)
+        sweep_mode = self._prepare_single_sweeps()
+        try:
+            if self._state.get('sweep_type') != 2:
+                self.set_log_freq()
+            frequencies = []
+            values = []
+            for index, segment in enumerate(segments):
+                with self.batch():
+                    self.start_freq = segment.start
+                    self.stop_freq = segment.stop
+                    self.numpoints = segment.nop
+                    self.resbw = segment.rbw
+                    for name, value in sorted(segment.settings.items()):
+                        setattr(self, name, value)
+                if self._averaging > 1:
+                    data = self.average().mean
+                else:
+                    db_data, deg_data = self.single_sweep()
+                    data = dbdeg_to_complex(db_data, deg_data, npy.empty(len(db_data), dtype=complex))
+                frequencies.append(self.frequency.f)
+                values.append(data)
+                if progress is not None:
+                    progress(segment, index + 1, len(segments))
+        finally:
+            self._restore_sweep_mode(sweep_mode)
+
+        f, data = stitch_segments(segments, frequencies, values)
+        ntwk = Network()
+        ntwk.s = data.reshape(-1, 1, 1)
+        ntwk.frequency = Frequency.from_f(f, unit='hz')
         return ntwk
+
     ##properties for the super lazy
     @property
     def s11(self):
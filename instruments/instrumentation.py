@@ -0,0 +1,225 @@
+"""
+Timing instrumentation of the GPIB transactions.
+
+The methods of :class:`prologix.Instrument` and of the controllers emit
+an :class:`Event` per call (command, bytes out/in, duration and the time
+spent in the nested calls, e.g. address switching or ``++read eoi``) to
+the enabled listeners. With no listener enabled they only pay for a
+function call and a test.
+
+>>> from instruments import instrumentation
+>>> recorder = instrumentation.Recorder()
+>>> instrumentation.enable(recorder)
+>>> vna.s11
+>>> print(recorder.summary())
+>>> instrumentation.disable(recorder)
+
+"""
+
+from __future__ import division
+
+import functools
+import math
+import threading
+
+try:
+    from time import perf_counter as clock
+except ImportError: # Python 2
+    from time import time as clock
+
+_listeners = []
+_local = threading.local()
+
+
+def enable(listener):
+    """Send the events to listener, a callable taking an :class:`Event`."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+    return listener
+
+
+def disable(listener=None):
+    """Stop sending events to listener, or to all listeners if None."""
+    if listener is None:
+        del _listeners[:]
+    elif listener in _listeners:
+        _listeners.remove(listener)
+
+
+class Event(object):
+    """One timed call.
+
+    :ivar name: the instrumented method, e.g. 'instrument.ask'.
+    :ivar command: the command or query sent, if any.
+    :ivar duration: seconds spent in the call.
+    :ivar bytes_out: bytes of the command.
+    :ivar bytes_in: bytes of the response (or of the decoded values).
+    :ivar phases: seconds spent in the nested timed calls, by phase name.
+    :ivar error: the exception raised, if any.
+    """
+
+    __slots__ = ('name', 'command', 'start', 'duration', 'bytes_out', 'bytes_in', 'phases', 'error')
+
+    def __init__(self, name, command=None):
+        self.name = name
+        self.command = command
+        self.start = None
+        self.duration = None
+        self.bytes_out = len(command) if command is not None else 0
+        self.bytes_in = 0
+        self.phases = {}
+        self.error = None
+
+    @property
+    def phase(self):
+        """Name under which this event is accounted in its parent."""
+        if self.command is not None and self.command.startswith('++'):
+            return self.command.split()[0]
+        return self.name
+
+    def __repr__(self):
+        return '<Event %s %r %.6fs>' % (self.name, self.command, self.duration or 0.)
+
+
+def _size(result):
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    if hasattr(result, 'nbytes'):
+        return result.nbytes
+    if isinstance(result, list):
+        return sum(_size(item) for item in result)
+    return 0
+
+
+def _run(name, method, args, kwargs):
+    command = args[1] if len(args) > 1 and isinstance(args[1], str) else None
+    event = Event(name, command)
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(event)
+    event.start = clock()
+    try:
+        result = method(*args, **kwargs)
+        event.bytes_in = _size(result)
+        return result
+    except Exception as e:
+        event.error = e
+        raise
+    finally:
+        event.duration = clock() - event.start
+        stack.pop()
+        if stack:
+            phases = stack[-1].phases
+            phases[event.phase] = phases.get(event.phase, 0.) + event.duration
+        for listener in list(_listeners):
+            listener(event)
+
+
+def timed(name):
+    """Decorator emitting an :class:`Event` per call of a method."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not _listeners:
+                return method(*args, **kwargs)
+            return _run(name, method, args, kwargs)
+        return wrapper
+    return decorator
+
+
+class LatencyHistogram(object):
+    """Histogram of durations with logarithmic buckets.
+
+    Bucket i holds durations up to ``resolution * 2 ** (i / 4)``, so the
+    quantiles are within 19% of the true value.
+    """
+
+    def __init__(self, resolution=1e-6, buckets=100):
+        self.resolution = resolution
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, duration):
+        index = 0
+        if duration > self.resolution:
+            index = int(math.ceil(4 * math.log(duration / self.resolution, 2)))
+        self.counts[min(index, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = duration if self.max is None else max(self.max, duration)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile (0 < q <= 1)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.resolution * 2 ** (index / 4), self.max)
+        return self.max
+
+
+class Recorder(object):
+    """Listener keeping counters, latency histograms and phase totals
+    per instrumented method.
+
+    :param keep: number of most recent events to keep in `events`.
+    """
+
+    def __init__(self, keep=0):
+        self.keep = keep
+        self.events = []
+        self.histograms = {}
+        self.counters = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event.name not in self.histograms:
+                self.histograms[event.name] = LatencyHistogram()
+                self.counters[event.name] = {'calls': 0, 'errors': 0, 'bytes_out': 0, 'bytes_in': 0}
+                self.phases[event.name] = {}
+            self.histograms[event.name].add(event.duration)
+            counters = self.counters[event.name]
+            counters['calls'] += 1
+            counters['errors'] += event.error is not None
+            counters['bytes_out'] += event.bytes_out
+            counters['bytes_in'] += event.bytes_in
+            phases = self.phases[event.name]
+            for phase, duration in event.phases.items():
+                phases[phase] = phases.get(phase, 0.) + duration
+            if self.keep:
+                self.events.append(event)
+                del self.events[:-self.keep]
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self.histograms.clear()
+            self.counters.clear()
+            self.phases.clear()
+
+    def summary(self):
+        """Table of calls, latencies (ms) and where the time went."""
+        lines = ['%-26s %7s %9s %9s %9s %10s %10s' % ('call', 'calls', 'mean', 'p50', 'p99', 'bytes out', 'bytes in')]
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            counters = self.counters[name]
+            lines.append('%-26s %7d %9.3f %9.3f %9.3f %10d %10d' % (
+                name, counters['calls'], 1e3 * histogram.mean, 1e3 * histogram.quantile(.5),
+                1e3 * histogram.quantile(.99), counters['bytes_out'], counters['bytes_in']))
+            for phase, duration in sorted(self.phases[name].items(), key=lambda item: -item[1]):
+                lines.append('    %-22s %6.1f%%' % (phase, 100 * duration / max(histogram.total, 1e-12)))
+        return '\n'.join(lines)
@@ -3,13 +3,16 @@
 
 """
 
-from serial import Serial
-from socket import socket, AF_INET, SOCK_STREAM, IPPROTO_TCP
-from time import sleep,clock
+from contextlib import contextmanager
+from socket import socket, AF_INET, SOCK_STREAM, IPPROTO_TCP, TCP_NODELAY
+from socket import timeout as socket_timeout
+from time import sleep,time
 
 import warnings
-import errors
-from util import (split_kwargs, warn_for_invalid_kwargs,parse_ascii, parse_binary)
+from . import errors
+from .instrumentation import timed
+from .util import (split_kwargs, warn_for_invalid_kwargs,parse_ascii, parse_binary,
+                  parse_binary_frames, frame_end)
 
 # From pyVisa
 
@@ -30,6 +33,12 @@ big_endian = 4
 CR = '\r'
 LF = '\n'
 
+def _text(resp):
+    # responses are bytes on Python 3
+    if isinstance(resp, str):
+        return resp
+    return resp.decode('ascii')
+
 #
 class _prologix_base(object):
     """
@@ -37,19 +46,22 @@ class _prologix_base(object):
 
     """
 
+    framed_reads = False
+    """True when readall waits for complete response frames by itself."""
+
     def __init__(self):
         """
         initialization routines common to USB and ethernet
 
         """
+        self._timeout=5 #default timeout value
+
         # keep a local copy of the current address
         # and read-after write setting
         # so we're not always asking for it
         self._addr = self.addr
         self._auto = self.auto
 
-        self._timeout=5 #default timeout value
-
     @property
     def timeout(self):
         """The timeout in seconds for all resource I/O operations.
@@ -117,6 +129,27 @@ class _prologix_base(object):
         """ Check the Prologix firmware version. """
         return self.ask("++ver")
 
+    @property
+    def srq(self):
+        """
+        Boolean. State of the GPIB SRQ line: True when any
+        instrument on the bus requests service.
+
+        """
+        return bool(int(self.ask("++srq")))
+
+    def spoll(self, addr=None):
+        """
+        Serial poll an instrument and return its status byte.
+        Polling clears the service request of the instrument.
+
+        `addr` -- GPIB address of the instrument, defaults to
+                  the currently addressed one.
+        """
+        if addr is None:
+            return int(self.ask("++spoll"))
+        return int(self.ask("++spoll %d" % addr))
+
     @property
     def savecfg(self):
         """
@@ -168,34 +201,100 @@ class PrologixEthernet(_prologix_base):
     Replace the ``xxx``es with the controller's actual ip
     address, found using the Prologix Netfinder tool.
 
+    Responses are read as complete frames (see :meth:`readall`),
+    so writes do not need to sleep while the instrument answers.
 
     """
 
-    def __init__(self, ip):
+    framed_reads = True
+
+    def __init__(self, ip, port=1234):
+        # bytes received past the end of the last frame
+        self._pending = b''
+
         # open a socket to the controller
         self.bus = socket(AF_INET, SOCK_STREAM, IPPROTO_TCP)
         self.bus.settimeout(2)
-        self.bus.connect((ip, 1234))
+        # commands are short lines answered by the controller: send them
+        # right away rather than waiting for the ACK of the previous one
+        self.bus.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self.bus.connect((ip, port))
 
         # change to controller mode
-        self.bus.send('++mode 1\n')
+        self.bus.sendall(b'++mode 1\n')
 
         # do common startup routines
         super(PrologixEthernet, self).__init__()
 
-    def write(self, command, lag=0.1):
-        self.bus.send("%s\n" % command)
-        sleep(lag)
+    @timed('controller.write')
+    def write(self, command, lag=0.0):
+        """
+        Send a command line to the controller.
 
-    def readall(self,chunk_size=100):
-        resp = self.bus.recv(chunk_size) #100 should be enough, right?
+        `lag` -- optional settle time in seconds after the command
+                 is sent. Not needed before reading a response.
+        """
+        self.bus.sendall(("%s\n" % command).encode('ascii'))
+        if lag > 0.0:
+            sleep(lag)
+
+    @timed('controller.readall')
+    def readall(self, chunk_size=4096, timeout=None, header=b"#A", frames=1):
+        """
+        Read one complete response from the controller.
+
+        Keeps receiving until either a line terminated by LF, or a
+        binary block whose byte count is announced in its `header`,
+        has arrived. Text responses are returned without their
+        terminator, binary blocks untouched.
+
+        `chunk_size` -- bytes requested per socket read.
+        `timeout` -- seconds to wait for the whole response,
+                     defaults to the controller timeout.
+        `frames` -- number of consecutive frames making the response,
+                    e.g. the answer to 'A?;B?'.
+        """
+        if timeout is None:
+            timeout = self._timeout
+        deadline = time() + timeout
+
+        data = self._pending
+        start = len(data) - len(data.lstrip(b"\r\n")) # terminators left over by a binary block
+        end = frame_end(data, header, start, frames)
+        while end is None:
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise errors.Timeout("%d bytes received, frame incomplete" % (len(data) - start))
+            self.bus.settimeout(remaining)
+            try:
+                chunk = self.bus.recv(chunk_size)
+            except socket_timeout:
+                chunk = None
+            if chunk == b'':
+                raise errors.Error("connection closed by the controller")
+            if chunk:
+                data += chunk
+                start = len(data) - len(data.lstrip(b"\r\n"))
+                end = frame_end(data, header, start, frames)
+
+        self._pending = data[end:]
+        resp = data[start:end]
+        if header and resp.find(header) != -1:
+            return resp
         return resp.rstrip()
 
     def ask(self, query, *args, **kwargs):
         """ Write to the bus, then read response. """
         # no need to clear buffer
         self.write(query, *args, **kwargs)
-        return self.readall()
+        return _text(self.readall())
+
+    def close(self):
+        """ Close the connection to the controller. """
+        for key, controller in list(controllers.items()):
+            if controller is self:
+                del controllers[key]
+        self.bus.close()
 
 
 class PrologixUSB(_prologix_base):
@@ -214,7 +313,8 @@ class PrologixUSB(_prologix_base):
     """
 
     def __init__(self, port='/dev/ttyUSBgpib', log=False):
-        # create a serial port object
+        # create a serial port object (pyserial is only needed here)
+        from serial import Serial
         self.bus = Serial(port, baudrate=115200, rtscts=1, log=log)
         # if this doesn't work, try settin rtscts=0
 
@@ -227,12 +327,18 @@ class PrologixUSB(_prologix_base):
         # do common startup routines
         super(PrologixUSB, self).__init__()
 
+    @timed('controller.write')
     def write(self, command, lag=0.1):
-        self.bus.write("%s\r" % command)
+        self.bus.write(("%s\r" % command).encode('ascii'))
         sleep(lag)
 
-    def readall(self):
+    @timed('controller.readall')
+    def readall(self, chunk_size=4096, timeout=None, header=b"#A", frames=1):
+        # same signature as PrologixEthernet.readall, the serial port
+        # reads whatever is waiting; binary blocks are left untouched
         resp = self.bus.readall()
+        if header and resp.find(header) != -1:
+            return resp
         return resp.rstrip()
 
     def ask(self, query, *args, **kwargs):
@@ -241,11 +347,11 @@ class PrologixUSB(_prologix_base):
         self.bus.logger.debug('clearing buffer - expect no result')
         self.readall()  # clear the buffer
         self.write(query, *args, **kwargs)
-        return self.readall()
+        return _text(self.readall())
 
 controllers = dict()
 
-def prologix_ethernet(ip):
+def prologix_ethernet(ip, port=1234):
     """
     Factory function for a Prologix GPIB-Ethernet controller.
 
@@ -253,10 +359,13 @@ def prologix_ethernet(ip):
 
     >>> plx = prologix.prologix_ethernet('128.223.xxx.xxx')
 
+    `port` is only needed for an emulated controller
+    (see :mod:`instruments.emulator`).
+
     """
-    if ip not in controllers:
-        controllers[ip] = PrologixEthernet(ip)
-    return controllers[ip]
+    if (ip, port) not in controllers:
+        controllers[(ip, port)] = PrologixEthernet(ip, port)
+    return controllers[(ip, port)]
 
 def prologix_USB(port='/dev/ttyUSBgpib', log=False):
     """
@@ -297,10 +406,17 @@ class Instrument(object):
     :meth:`ask` and :meth:`write` methods to send GPIB queries and
     commands.
 
+    Several commands can be sent as a single program message with
+    :meth:`batch`:
+
+    >>> with inst.batch():
+    ...     inst.write('START=1000')
+    ...     inst.write('STOP=1E6')
+
     """
 
     delay = 0.1
-    """Seconds to pause after each write."""
+    """Seconds to pause after each write (batched writes pause once)."""
     #From PyVISA
     """
     :param timeout: the VISA timeout for each low-level operation in
@@ -329,7 +445,9 @@ class Instrument(object):
                       #: floating point data value format
                       'values_format': ascii,
                         # header for binary format
-                      'header': b"#A"
+                      'header': b"#A",
+                      #: Seconds to wait for a complete response (None: controller timeout).
+                      'timeout': None
                         }
 
     def __init__(self, controller, addr,**kwargs):
@@ -351,10 +469,13 @@ class Instrument(object):
         self.auto = False
         #self.delay = 0.1 # now in kwargs
         self.controller = controller
+        # commands held back by batch(), None when not batching
+        self._batch = None
 
         for key, value in Instrument.DEFAULT_KWARGS.items():
             setattr(self, key, kwargs.get(key, value))
 
+    @timed('instrument.priority')
     def _get_priority(self):
         """
         configure the controller to address this instrument
@@ -368,6 +489,17 @@ class Instrument(object):
         if self.addr != self.controller._addr:
             self.controller.addr = self.addr
 
+    @property
+    def _write_lag(self):
+        """
+        Seconds to pause after a write. Controllers with framed
+        reads wait for the complete response instead.
+
+        """
+        if self.controller.framed_reads:
+            return 0.0
+        return self.ask_delay
+
 #     def ask(self, command):
 #         """
 #         Send a query the instrument, then read its response.
@@ -397,24 +529,68 @@ class Instrument(object):
 #         self.write(command)
 #         return self.read()
 
+    @timed('instrument.read')
     def read(self): # behaves like readall
         """
         Read a response from an instrument.
 
         """
+        self.flush()
         self._get_priority()
         if not self.auto:
             # explicitly tell instrument to talk.
-            self.controller.write('++read eoi',self.ask_delay)
-        return self.controller.readall()
+            self.controller.write('++read eoi', lag=self._write_lag)
+        return _text(self.controller.readall(timeout=self.timeout))
 
+    @timed('instrument.write')
     def write(self, command):
         """
         Write a command to the instrument.
 
+        Inside a :meth:`batch` block the command is only queued.
+
         """
+        if self._batch is not None:
+            self._batch.append(command.rstrip(';'))
+            return
         self._get_priority()
-        self.controller.write(command, lag=self.ask_delay)
+        self.controller.write(command, lag=self._write_lag)
+
+    @timed('instrument.flush')
+    def flush(self):
+        """
+        Send the commands queued by :meth:`batch` as one
+        ';'-separated program message, then pause once for `delay`.
+
+        """
+        if not self._batch:
+            return
+        program = ';'.join(self._batch)
+        self._batch = []
+        self._get_priority()
+        self.controller.write(program, lag=self.delay)
+
+    @contextmanager
+    def batch(self):
+        """
+        Queue the writes made inside a ``with`` block and send them
+        in a single program message when the block ends.
+
+        Reading (e.g. with :meth:`ask`) flushes the queue first, the
+        query being sent together with the queued commands. Commands
+        still queued when the block raises are discarded. Nested
+        blocks join the outer batch.
+
+        """
+        if self._batch is not None:
+            yield self
+            return
+        self._batch = []
+        try:
+            yield self
+            self.flush()
+        finally:
+            self._batch = None
 
 
     # From Pyvisa
@@ -432,7 +608,7 @@ class Instrument(object):
         """
 
         self._get_priority()
-        self.controller.write(message, lag=self.ask_delay)
+        self.controller.write(message, lag=self._write_lag)
 
         return 0
 
@@ -472,22 +648,25 @@ class Instrument(object):
         return message.rstrip(CR + LF)
 
     #FIXME:Modified to test
-    def read_raw(self):
+    @timed('instrument.read_raw')
+    def read_raw(self, frames=1):
         """Read the unmodified string sent from the instrument to the computer.
 
         In contrast to read(), no termination characters are checked or
         stripped. You get the pristine message.
 
+        :param frames: number of consecutive responses (e.g. binary
+            blocks) to wait for.
         :rtype: bytes
 
         """
-        ret = bytes()
+        self.flush()
         self._get_priority()
         if not self.auto:
             # explicitly tell instrument to talk.
-            self.controller.write('++read eoi', lag=self.ask_delay)
-        ret+= self.controller.readall(self.chunk_size)
-        return ret
+            self.controller.write('++read eoi', lag=self._write_lag)
+        # returned as received, parse_binary decodes it in place
+        return self.controller.readall(self.chunk_size, timeout=self.timeout, frames=frames)
 
     # def read(self):
     #     """Read a string from the device.
@@ -506,24 +685,32 @@ class Instrument(object):
     #
     #     return self._strip_term_chars(self.read_raw().decode('ascii'))
 
-    def read_values(self, fmt=None):
+    @timed('instrument.read_values')
+    def read_values(self, fmt=None, frames=None):
         """Read a list of floating point values from the device.
 
         :param fmt: the format of the values.  If given, it overrides
             the class attribute "values_format".  Possible values are bitwise
             disjunctions of the above constants ascii, single, double, and
             big_endian.  Default is ascii.
+        :param frames: if given, the number of consecutive responses
+            (one per query of a program message) to read and decode
+            separately.
 
-        :return: the list of read values
-        :rtype: list
+        :return: the read values, binary formats are returned as a view
+            over the received bytes. A list of arrays if frames is given.
+        :rtype: numpy.ndarray
         """
         if not fmt:
             fmt = self.values_format
 
         if fmt & 0x01 == ascii:
-            return parse_ascii(self.read())
+            if frames is None:
+                return parse_ascii(self.read_raw())
+            lines = self.read_raw(frames).split(b'\n')
+            return [parse_ascii(line) for line in lines if line.strip()]
 
-        data = self.read_raw()
+        data = self.read_raw(frames or 1)
         try:
             if fmt & 0x01 == single: #DPO FIXME
                 is_single = True
@@ -531,44 +718,52 @@ class Instrument(object):
                 is_single = False
             else:
                 raise ValueError("unknown data values fmt requested")
+            if frames is not None:
+                return parse_binary_frames(data, frames, fmt & 0x04 == big_endian, is_single, self.header)
             return parse_binary(data, fmt & 0x04 == big_endian, is_single,self.header)
         except ValueError as e:
-            raise errors.InvalidBinaryFormat(e.args)
+            raise errors.InvalidBinaryFormat(str(e))
 
+    @timed('instrument.ask')
     def ask(self, message, delay=None):
         """A combination of write(message) and read()
 
         :param message: the message to send.
         :type message: str
         :param delay: delay in seconds between write and read operations.
-                      if None, defaults to self.ask_delay
+                      if None, defaults to self.ask_delay (no delay
+                      for controllers with framed reads)
         :returns: the answer from the device.
         :rtype: str
         """
         self.write(message)
         if delay is None:
-            delay = self.ask_delay
+            delay = self._write_lag
         if delay > 0.0:
             sleep(delay)
         return self.read()
 
 
-    def ask_for_values(self, message, format=None, delay=None):
+    @timed('instrument.ask_for_values')
+    def ask_for_values(self, message, format=None, delay=None, frames=None):
         """A combination of write(message) and read_values()
 
         :param message: the message to send.
         :type message: str
         :param delay: delay in seconds between write and read operations.
-                      if None, defaults to self.ask_delay
+                      if None, defaults to self.ask_delay (no delay
+                      for controllers with framed reads)
+        :param frames: number of queries in message whose answers are
+                       returned separately, see read_values.
         :returns: the answer from the device.
-        :rtype: list
+        :rtype: numpy.ndarray
         """
         self.write(message)
         if delay is None:
-            delay = self.ask_delay
+            delay = self._write_lag
         if delay > 0.0:
             sleep(delay)
-        return self.read_values(format)
+        return self.read_values(format, frames)
 
     def trigger(self):
         """Sends a software trigger to the device.
@@ -635,40 +830,39 @@ class Instrument(object):
             self.controller.write('++eoi 0')
 
 
-    def wait_for_srq(self, timeout=25):
+    def wait_for_srq(self, timeout=25, interval=0.005):
         """Wait for a serial request (SRQ) coming from the instrument.
 
         Note that this method is not ended when *another* instrument signals an
         SRQ, only *this* instrument.
 
+        The controller SRQ line is checked every `interval` seconds; once
+        asserted, the instrument is serial polled to check the request is
+        its own, which also clears it.
+
         :param timeout: the maximum waiting time in seconds.
                         Defaul: 25 (seconds).
                         None means waiting forever if necessary.
+        :param interval: seconds between two checks of the SRQ line.
+        :returns: the status byte of the instrument.
         """
 
         if timeout and not(0 <= timeout <= 4294967):
             raise ValueError("timeout value is invalid")
 
-        starting_time = clock()
-
+        self.flush()
+        deadline = None if timeout is None else time() + timeout
         while True:
-            if timeout is None:
-                pass
-                adjusted_timeout = 10 #VI_TMO_INFINITE
-            else:
-                adjusted_timeout = int((starting_time + timeout - clock()) * 1000)
-                if adjusted_timeout < 0:
-                    adjusted_timeout = 0
-
-            #event_type, context = lib.wait_on_event(self.session, VI_EVENT_SERVICE_REQ,adjusted_timeout)
-            #lib.close(context)
-            if self.stb & 0x40:
-                break
-
-        #lib.discard_events(self.session, VI_EVENT_SERVICE_REQ, VI_QUEUE)
+            if self.controller.srq:
+                status = self.stb
+                if status & 0x40:
+                    return status
+            if deadline is not None and time() >= deadline:
+                raise errors.Timeout("no service request from GPIB address %d" % self.addr)
+            sleep(interval)
 
     @property
     def stb(self):
-        """Service request status register."""
-        return 1
-        #return self.visalib.read_stb(self.session)
+        """Service request status register, read by serial poll."""
+        self.flush()
+        return self.controller.spoll(self.addr)
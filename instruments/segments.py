@@ -0,0 +1,161 @@
+"""
+Wideband sweeps made of several log sweep segments.
+
+A band of several decades cannot be measured well in one sweep: the
+resolution bandwidth must stay well below the lowest frequency, which
+makes a single sweep very slow, and 401 points are thin over 7 decades.
+:func:`plan_segments` splits the band into segments, each with the
+largest RBW its lowest frequency allows; :func:`stitch_segments` joins the
+measured segments into one trace.
+
+Each segment sweep starts a few points early: the leading points
+(always bad on the HP4195) are dropped, then the overlap with the
+previous segment, so the stitched trace is continuous.
+
+>>> for segment in plan_segments(100, 500e6, points_per_decade=100):
+...     print(segment)
+
+"""
+
+from __future__ import division
+
+import math
+
+import numpy as npy
+
+#: resolution bandwidths of the HP4195A, in Hz
+RBW_VALUES = (3, 10, 30, 100, 300, 1e3, 3e3, 10e3, 30e3, 100e3, 300e3)
+
+#: frequency range of the HP4195A network analyzer, in Hz
+MIN_FREQUENCY = 0.001
+MAX_FREQUENCY = 500e6
+
+#: most points in one sweep
+MAX_POINTS = 401
+
+
+class Segment(object):
+    """
+    One log sweep of a wideband measurement.
+
+    :ivar start, stop: swept range, Hz.
+    :ivar nop: number of points swept.
+    :ivar rbw: resolution bandwidth, Hz.
+    :ivar lo, hi: range kept when stitching, lo included, hi excluded
+                  (included for the last segment).
+    :ivar drop: number of leading points discarded.
+    :ivar settings: other instrument settings (att_r1, att_t1...).
+    """
+
+    def __init__(self, start, stop, nop, rbw, lo, hi, drop=0, **settings):
+        self.start = start
+        self.stop = stop
+        self.nop = nop
+        self.rbw = rbw
+        self.lo = lo
+        self.hi = hi
+        self.drop = drop
+        self.settings = settings
+
+    @property
+    def sweep_time(self):
+        """Rough sweep duration, to compare plans."""
+        return self.nop * 2. / self.rbw
+
+    def __repr__(self):
+        extra = ''.join(', %s=%g' % item for item in sorted(self.settings.items()))
+        return '<Segment %g-%g Hz, %d points, RBW %g Hz%s>' % (self.start, self.stop, self.nop, self.rbw, extra)
+
+
+def _rbw_for(frequency, rbw_ratio):
+    # largest RBW at least rbw_ratio times below frequency
+    allowed = [rbw for rbw in RBW_VALUES if rbw * rbw_ratio <= frequency]
+    return allowed[-1] if allowed else RBW_VALUES[0]
+
+
+def _per_segment(value, count, name):
+    # a per segment list, or the same value for all segments
+    if isinstance(value, (list, tuple)):
+        if len(value) != count:
+            raise ValueError("%s: %d values for %d segments" % (name, len(value), count))
+        return list(value)
+    return [value] * count
+
+
+def plan_segments(start, stop, edges=None, rbw=None, points_per_decade=100,
+                  max_points=MAX_POINTS, rbw_ratio=10, drop=2, overlap=2, **settings):
+    """
+    Split the band start-stop into log sweep segments.
+
+    :param edges: frequencies where a segment ends and the next one
+                  begins. Default: one segment per decade of RBW, from
+                  the frequencies where rbw_ratio * RBW becomes allowed.
+    :param rbw: RBW of each segment (a list) or of all of them. Default:
+                the largest RBW rbw_ratio times below the segment start.
+    :param points_per_decade: density of the stitched trace; segments
+                              needing more than max_points are split.
+    :param drop: leading points discarded from each sweep.
+    :param overlap: points swept below the previous segment end.
+    :param settings: other settings, per segment (lists) or for all,
+                     e.g. att_r1=[20, 0].
+    :returns: list of :class:`Segment`
+    """
+    if not MIN_FREQUENCY <= start < stop <= MAX_FREQUENCY:
+        raise ValueError("invalid band %g-%g Hz" % (start, stop))
+    extra = drop + overlap
+    if max_points - extra < 2:
+        raise ValueError("max_points too small for drop and overlap")
+
+    if edges is None:
+        edges = [r * rbw_ratio for r in RBW_VALUES[1::2] + RBW_VALUES[-1:]]
+    edges = sorted(set(edge for edge in edges if start < edge < stop))
+    bounds = [start] + edges + [stop]
+    count = len(bounds) - 1
+    rbws = _per_segment(rbw, count, 'rbw')
+    per_segment = dict((name, _per_segment(value, count, name)) for name, value in settings.items())
+
+    segments = []
+    for index in range(count):
+        lo, hi = bounds[index], bounds[index + 1]
+        decades = math.log10(hi / lo)
+        # split the segment if it needs more points than a sweep holds
+        points = max(2, int(math.ceil(decades * points_per_decade)) + 1)
+        parts = int(math.ceil((points - 1) / (max_points - extra - 1)))
+        nop = int(math.ceil((points - 1) / parts)) + 1
+        segment_rbw = rbws[index] or _rbw_for(lo, rbw_ratio)
+        segment_settings = dict((name, values[index]) for name, values in per_segment.items()
+                                if values[index] is not None)
+        for part in range(parts):
+            part_lo = lo * (hi / lo) ** (part / parts)
+            part_hi = lo * (hi / lo) ** ((part + 1) / parts)
+            step = (part_hi / part_lo) ** (1 / (nop - 1))
+            sweep_start = max(part_lo / step ** extra, MIN_FREQUENCY)
+            segments.append(Segment(sweep_start, part_hi, nop + extra, segment_rbw,
+                                    part_lo, part_hi, drop, **segment_settings))
+    return segments
+
+
+def stitch_segments(segments, frequencies, values):
+    """
+    Join measured segments into one trace.
+
+    :param segments: the planned :class:`Segment` list.
+    :param frequencies: frequency axis measured for each segment.
+    :param values: data of each segment (any trailing shape).
+    :returns: (frequency, values) arrays, increasing frequencies.
+    """
+    kept_f = []
+    kept_values = []
+    last = len(segments) - 1
+    for index, (segment, f, data) in enumerate(zip(segments, frequencies, values)):
+        f = npy.asarray(f, dtype=float)[segment.drop:]
+        data = npy.asarray(data)[segment.drop:]
+        # relative tolerance for the single precision X register
+        keep = f >= segment.lo * (1 - 1e-6)
+        if index == last:
+            keep &= f <= segment.hi * (1 + 1e-6)
+        else:
+            keep &= f < segment.hi * (1 - 1e-6)
+        kept_f.append(f[keep])
+        kept_values.append(data[keep])
+    return npy.concatenate(kept_f), npy.concatenate(kept_values)
@@ -0,0 +1,140 @@
+"""
+Continuous acquisition on a background thread.
+
+A :class:`SweepStream` runs a generator of sweeps (e.g. the single
+sweeps of :meth:`hp4195.HP4195.stream`) on its own thread and hands the
+sweeps to the consumer through a bounded queue, so GPIB transfers go on
+while the consumer processes, plots or stores the previous sweeps:
+
+>>> with vna.stream(maxsize=16, policy='drop') as sweeps:
+...     for timestamp, ntwk in sweeps:
+...         log(timestamp, ntwk)
+
+When the queue is full, the ``'block'`` policy makes the acquisition
+wait for the consumer (no sweep lost, the sweep rate follows the
+consumer), the ``'drop'`` policy discards the oldest queued sweep (the
+acquisition never waits, the consumer sees the freshest data).
+
+"""
+
+import threading
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError: # Python 2
+    from Queue import Queue, Empty, Full
+
+POLICIES = ('block', 'drop')
+
+
+class SweepStream(object):
+    """
+    Iterable of (timestamp, sweep) filled by a background thread.
+
+    :param sweeps: iterable of (timestamp, data) run on the thread,
+                   closed (if it is a generator) when the stream stops.
+    :param maxsize: number of sweeps the queue holds.
+    :param policy: 'block' or 'drop', what to do when the queue is full.
+    :param process: applied to each data in the consumer thread, as
+                    ``process(*data)``. Default: yield data unchanged.
+    :param on_close: called once the thread has stopped, e.g. to put
+                     the instrument back on continuous trigger.
+
+    :ivar acquired: number of sweeps acquired so far.
+    :ivar dropped: number of sweeps discarded by the 'drop' policy.
+    """
+
+    #: seconds between checks of the stop request while waiting
+    poll_interval = 0.1
+
+    def __init__(self, sweeps, maxsize=16, policy='block', process=None, on_close=None):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of %s" % ', '.join(POLICIES))
+        self.policy = policy
+        self.process = process
+        self.acquired = 0
+        self.dropped = 0
+        self._on_close = on_close
+        self._closed = False
+        self._queue = Queue(maxsize)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._acquire, args=(sweeps,), name='sweep-stream')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item, block):
+        # queue item, unless the stream is stopped
+        while not self._stop.is_set():
+            try:
+                if block:
+                    self._queue.put(item, True, self.poll_interval)
+                else:
+                    self._queue.put_nowait(item)
+                return
+            except Full:
+                if not block:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except Empty:
+                        pass
+
+    def _acquire(self, sweeps):
+        error = None
+        try:
+            for item in sweeps:
+                self.acquired += 1
+                self._put(item, self.policy == 'block')
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(sweeps, 'close'):
+                try:
+                    sweeps.close()
+                except Exception as e:
+                    error = error or e
+            # end of stream marker, never dropped
+            self._put((None, error), True)
+
+    def __iter__(self):
+        try:
+            while True:
+                try:
+                    timestamp, data = self._queue.get(True, self.poll_interval)
+                except Empty:
+                    continue
+                if timestamp is None:
+                    if data is not None:
+                        raise data
+                    return
+                if self.process is not None:
+                    data = self.process(*data)
+                yield timestamp, data
+        finally:
+            self.close()
+
+    @property
+    def pending(self):
+        """Number of sweeps waiting in the queue."""
+        return self._queue.qsize()
+
+    def close(self):
+        """
+        Stop the acquisition after the sweep in progress, wait for the
+        thread, then call on_close. Queued sweeps are discarded.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self._thread.join()
+        if self._on_close is not None:
+            self._on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
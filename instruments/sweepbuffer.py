@@ -0,0 +1,182 @@
+"""
+Preallocated ring buffer of sweeps.
+
+Long captures keep the last `capacity` sweeps in one complex array
+instead of creating a :class:`skrf.Network` (and its arrays and
+Frequency) per acquisition. Sweeps are decoded straight into the next
+slot, with their timestamp and the instrument settings they were taken
+with; a Network is only built on request.
+
+>>> buf = vna.sweep_buffer(1000)
+>>> for _ in range(5000):
+...     vna.read_into(buf)
+>>> buf.latest()            # complex view of the last sweep
+>>> buf.network(-1)         # the same, as a one port Network
+>>> times, data = buf.ordered()
+
+"""
+
+import numpy as npy
+from skrf.frequency import Frequency
+from skrf.network import Network
+
+_DEG_TO_RAD = npy.pi / 180.
+
+
+def dbdeg_to_complex(db_data, deg_data, out, magnitude=None, phase=None):
+    """
+    Convert magnitude (dB) and phase (deg) into the complex array out,
+    which may be a strided view. magnitude and phase are optional float
+    scratch arrays, so that repeated conversions allocate nothing.
+    """
+    if magnitude is None:
+        magnitude = npy.empty(len(out))
+    if phase is None:
+        phase = npy.empty(len(out))
+    npy.multiply(db_data, 1 / 20., out=magnitude)
+    npy.power(10., magnitude, out=magnitude)
+    npy.multiply(deg_data, _DEG_TO_RAD, out=phase)
+    npy.cos(phase, out=out.real)
+    npy.multiply(out.real, magnitude, out=out.real)
+    npy.sin(phase, out=out.imag)
+    npy.multiply(out.imag, magnitude, out=out.imag)
+    return out
+
+
+class SweepBuffer(object):
+    """
+    Ring buffer of `capacity` sweeps sharing one frequency axis.
+
+    Sweeps are indexed in acquisition order, 0 being the oldest one
+    still held and -1 the latest.
+
+    :param capacity: number of sweeps held.
+    :param frequency: frequency points (Hz) of every sweep.
+
+    :ivar data: (capacity, points) complex array, in slot order.
+    :ivar timestamps: acquisition time of each slot, NaN if empty.
+    :ivar settings_index: index in `settings` of the settings of each slot.
+    :ivar count: number of sweeps written since the creation.
+    """
+
+    def __init__(self, capacity, frequency):
+        self.capacity = int(capacity)
+        if self.capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.f = npy.array(frequency, dtype=float)
+        points = len(self.f)
+        self.data = npy.zeros((self.capacity, points), dtype=complex)
+        self.timestamps = npy.full(self.capacity, npy.nan)
+        self.settings_index = npy.full(self.capacity, -1, dtype=npy.intp)
+        self.settings = []
+        self.count = 0
+        self._frequency = None
+        # decoding scratch, so that writing a sweep allocates nothing
+        self._magnitude = npy.empty(points)
+        self._phase = npy.empty(points)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def points(self):
+        return len(self.f)
+
+    @property
+    def frequency(self):
+        """The shared :class:`skrf.Frequency`, created on first use."""
+        if self._frequency is None:
+            self._frequency = Frequency.from_f(self.f, unit='hz')
+        return self._frequency
+
+    def _slot(self, index):
+        # slot of the sweep at acquisition order index
+        size = len(self)
+        if not -size <= index < size:
+            raise IndexError("sweep index out of range")
+        if index < 0:
+            index += size
+        return (self.count - size + index) % self.capacity
+
+    def _next_slot(self, timestamp, settings):
+        slot = self.count % self.capacity
+        if settings is not None:
+            if not self.settings or self.settings[-1] != settings:
+                self.settings.append(dict(settings))
+            self.settings_index[slot] = len(self.settings) - 1
+        else:
+            self.settings_index[slot] = -1
+        self.timestamps[slot] = timestamp
+        return slot
+
+    def _check(self, values):
+        if len(values) != self.points:
+            raise ValueError("sweep of %d points, buffer axis of %d" % (len(values), self.points))
+
+    def append(self, values, timestamp, settings=None):
+        """
+        Copy a complex sweep into the next slot, overwriting the oldest
+        sweep once full. Returns the slot.
+        """
+        self._check(values)
+        slot = self._next_slot(timestamp, settings)
+        self.data[slot] = values
+        self.count += 1
+        return slot
+
+    def append_dbdeg(self, db_data, deg_data, timestamp, settings=None):
+        """
+        Decode magnitude (dB) and phase (deg) registers into the next
+        slot, without intermediate arrays. Returns the slot.
+        """
+        self._check(db_data)
+        self._check(deg_data)
+        slot = self._next_slot(timestamp, settings)
+        dbdeg_to_complex(db_data, deg_data, self.data[slot], self._magnitude, self._phase)
+        self.count += 1
+        return slot
+
+    def __getitem__(self, index):
+        """Complex view of a sweep, valid until its slot is overwritten."""
+        return self.data[self._slot(index)]
+
+    def latest(self):
+        """Complex view of the last sweep."""
+        return self[-1]
+
+    def timestamp(self, index):
+        return self.timestamps[self._slot(index)]
+
+    def settings_of(self, index):
+        """Settings recorded with a sweep, None if none were."""
+        position = self.settings_index[self._slot(index)]
+        return self.settings[position] if position >= 0 else None
+
+    def ordered(self):
+        """
+        Copy of the held sweeps, oldest first.
+
+        :returns: (timestamps, data) arrays of len(self) rows
+        """
+        size = len(self)
+        slots = npy.arange(self.count - size, self.count) % self.capacity
+        return self.timestamps[slots], self.data[slots]
+
+    def network(self, index=-1, name=None):
+        """
+        One port :class:`skrf.Network` of a sweep, built from the
+        buffer's Frequency.
+        """
+        ntwk = Network()
+        ntwk.s = self[index].reshape(-1, 1, 1)
+        ntwk.frequency = self.frequency
+        if name is not None:
+            ntwk.name = name
+        return ntwk
+
+    def clear(self):
+        """Forget the sweeps, keeping the arrays."""
+        self.count = 0
+        self.timestamps[:] = npy.nan
+        self.settings_index[:] = -1
+        del self.settings[:]
@@ -23,14 +23,24 @@ import contextlib
 import platform
 import warnings
 
+# numpy is imported by the parsers, on first use: the transport and
+# the helpers here only need the standard library
+
 #from . import __version__
 
 if sys.version >= '3':
     _struct_unpack = struct.unpack
+    _struct_unpack_from = struct.unpack_from
+    _maketrans = bytes.maketrans
 else:
+    from string import maketrans as _maketrans
+
     def _struct_unpack(fmt, string):
         return struct.unpack(str(fmt), string)
 
+    def _struct_unpack_from(fmt, string, offset=0):
+        return struct.unpack_from(str(fmt), string, offset)
+
 
 def warn_for_invalid_kwargs(keyw, allowed_keys):
     for key in keyw.keys():
@@ -67,40 +77,170 @@ def split_kwargs(keyw, self_keys, parent_keys, warn=True):
 _ascii_re = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\d*\.\d+)(?:[eE][-+]?\d+)?")
 
 
-def parse_ascii(bytes_data):
+# separators found in FMT1/FMT2 transfers, all mapped to a space
+_ascii_separators = _maketrans(b",;\r\n\t", b"     ")
+
+
+def _parse_ascii_re(bytes_data):
+    # slow path: pick anything that looks like a number
     return [float(raw_value) for raw_value in
             _ascii_re.findall(bytes_data.decode('ascii'))]
 
 
-def parse_binary(bytes_data, is_big_endian=False, is_single=False, header=b"#"):
+class AsciiValuesParser(object):
+    """Incremental parser for separated ASCII values.
+
+    Chunks are fed as they arrive; complete values are converted in bulk
+    into a preallocated array, which only grows when size_hint was too
+    small. A block that does not convert cleanly (stray text, units,
+    inf or nan words, '1_000'...) falls back to the regular expression
+    parser, so both return the same values.
+    """
+
+    def __init__(self, size_hint=401):
+        import numpy as np
+        self._values = np.empty(max(int(size_hint), 1), dtype=np.float64)
+        self._count = 0
+        self._tail = b""
+
+    def _reserve(self, count):
+        needed = self._count + count
+        if needed > len(self._values):
+            import numpy as np
+            values = np.empty(max(needed, 2 * len(self._values)), dtype=np.float64)
+            values[:self._count] = self._values[:self._count]
+            self._values = values
+
+    def _convert(self, block):
+        tokens = block.split()
+        if not tokens:
+            return
+        self._reserve(len(tokens))
+        try:
+            # numpy also converts inf/nan words and digits grouped with
+            # underscores ('1_000'), which are not numbers to the regular
+            # expression: treat them as stray text
+            if b"_" in block:
+                raise ValueError('digit separator')
+            self._values[self._count:self._count + len(tokens)] = tokens
+            import numpy as np
+            if not np.isfinite(self._values[self._count:self._count + len(tokens)]).all():
+                raise ValueError('non-finite value')
+        except ValueError:
+            tokens = _parse_ascii_re(block)
+            self._reserve(len(tokens))
+            self._values[self._count:self._count + len(tokens)] = tokens
+        self._count += len(tokens)
+
+    def feed(self, chunk):
+        """Parse the values completed by chunk, keep a trailing partial one."""
+        data = self._tail + chunk.translate(_ascii_separators)
+        cut = data.rfind(b" ") + 1
+        self._tail = data[cut:]
+        self._convert(data[:cut])
+
+    def close(self):
+        """Parse what is left and return the values as an array."""
+        self._convert(self._tail)
+        self._tail = b""
+        return self._values[:self._count]
+
+
+def parse_ascii(bytes_data, size_hint=None):
+    """Parse separated ASCII values into a float64 array."""
+    if size_hint is None:
+        size_hint = bytes_data.count(b",") + bytes_data.count(b"\n") + 1
+    parser = AsciiValuesParser(size_hint)
+    parser.feed(bytes_data)
+    return parser.close()
+
+
+def _binary_dtype(is_big_endian, is_single):
+    import numpy as np
+    return np.dtype(('>' if is_big_endian else '<') + ('f4' if is_single else 'f8'))
+
+
+def _parse_binary_block(bytes_data, dtype, header, start=0):
+    # decode the first block found from start, return it with its end index
     # DPo : added header
-    data = bytes_data
-    #print (data.encode('hex')) #test
-    # look for the header
-    hash_sign_position = bytes_data.find(header)
-    if hash_sign_position == -1 or len(data) - hash_sign_position < 3:
+    # look for the header, resyncing the frame if misaligned
+    hash_sign_position = bytes_data.find(header, start)
+    if hash_sign_position == -1 or len(bytes_data) - hash_sign_position < 3:
         raise ValueError('Cound not find valid hash position')
-    # resync frame if misaligned
-    if hash_sign_position > 0:
-        data = data[hash_sign_position+len(header):]
-    else :
-        data = data[len(header):]
-    data_length=ord(data[0:1])*256+ord(data[1:2])  # compute number of bytes in frame
-    data = data[2:2+ data_length] # strip the number of bytes and the terminators if any
-    # print (data_length) #test
-    #print (data.encode('hex')) #test
-    if is_big_endian:
-        endianess = ">"
-    else:
-        endianess = "<"
-    try:
-        if is_single:
-            result=list(_struct_unpack(endianess+"%sf" % (data_length//4), data)) #DPo - simpler
-        else:
-            result=list(_struct_unpack(endianess+"%sd" % (data_length//8), data)) #DPo - simpler
-    except struct.error:
+    offset = hash_sign_position + len(header)
+    if len(bytes_data) < offset + 2:
         raise ValueError("Binary data itself was malformed")
-
-    return result
+    data_length, = _struct_unpack_from(">H", bytes_data, offset)  # number of bytes in frame
+    offset += 2
+    if len(bytes_data) < offset + data_length:
+        raise ValueError("Binary data itself was malformed")
+    import numpy as np
+    values = np.frombuffer(bytes_data, dtype, data_length // dtype.itemsize, offset)
+    return values, offset + data_length
 
 
+def parse_binary(bytes_data, is_big_endian=False, is_single=False, header=b"#"):
+    """Decode a binary block (header, 16 bits byte count, data) into an array.
+
+    The result is a read-only NumPy view over bytes_data: the values are
+    not copied and no Python float objects are created.
+    """
+    # any terminators past the announced length are ignored
+    dtype = _binary_dtype(is_big_endian, is_single)
+    return _parse_binary_block(bytes_data, dtype, header)[0]
+
+
+def parse_binary_frames(bytes_data, count, is_big_endian=False, is_single=False, header=b"#"):
+    """Decode count concatenated binary blocks into a list of arrays.
+
+    Whatever separates the blocks (terminators, ';') is skipped. Each
+    array is a view over bytes_data, as with parse_binary.
+    """
+    dtype = _binary_dtype(is_big_endian, is_single)
+    frames = []
+    end = 0
+    for _ in range(count):
+        values, end = _parse_binary_block(bytes_data, dtype, header, end)
+        frames.append(values)
+    return frames
+
+
+def _skip_separators(bytes_data, start):
+    # skip what may separate consecutive responses
+    while bytes_data[start:start + 1] in (b"\r", b"\n", b";", b","):
+        start += 1
+    return start
+
+
+def _single_frame_end(bytes_data, header, start):
+    lf_position = bytes_data.find(b"\n", start)
+    hash_sign_position = bytes_data.find(header, start) if header else -1
+    if hash_sign_position != -1 and (lf_position == -1 or hash_sign_position < lf_position):
+        length_position = hash_sign_position + len(header)
+        if len(bytes_data) < length_position + 2:
+            return None
+        data_length, = _struct_unpack_from(">H", bytes_data, length_position)
+        end = length_position + 2 + data_length
+        if len(bytes_data) < end:
+            return None
+        return end
+    if lf_position == -1:
+        return None
+    return lf_position + 1
+
+
+def frame_end(bytes_data, header=b"#A", start=0, count=1):
+    """Return the index just past the count-th complete frame in bytes_data.
+
+    A frame is either a binary block, i.e. ``header`` followed by a 16 bits
+    big-endian byte count and that many data bytes, or a line of text
+    terminated by LF. None is returned while the frames are still incomplete.
+    """
+    end = start
+    for index in range(count):
+        if index:
+            end = _skip_separators(bytes_data, end)
+        end = _single_frame_end(bytes_data, header, end)
+        if end is None:
+            return None
+    return end
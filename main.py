@@ -1,6 +1,8 @@
+import os
 import skrf as rf
-from pylab import *
 from instruments import HP4195
+from pdn import SweepStore, AxisMismatch
+from pdn.figures import z11_figure, save
 
 filename='t520_10u_lfF'
 myvna=HP4195()
@@ -19,22 +21,23 @@ s11.name="Z11"
 
 # Saving to file
 # --------------
+# one store per campaign; other sweep settings (start/stop/NOP) start a new one
+index=0
+while True:
+    store_file=os.path.join('results',filename+('_%d'%index if index else '')+'.sweeps')
+    if os.path.exists(store_file):
+        store=SweepStore(store_file)
+    else:
+        store=SweepStore.create(store_file,s11.f)
+    try:
+        store.append(s11,dut=filename,name=s11.name,comments=s11.comments,settings=myvna.settings)
+        break
+    except AxisMismatch: # other sweep settings
+        index+=1
+# Touchstone file, read by the analysis manifest (pdn.batch)
 s11.write_touchstone(filename,'./results/',False,True)
 # Plotting
 # --------
-s11.frequency.unit='mhz'
+# drawn headless (Agg) and saved; a lot of sweeps: pdn.figures.render_all
 rf.stylely() # matplotlib custom style from skrf.mplstyle
-figure(figsize=(8,4))
-subplot(221)
-s11.plot_s_db()
-title('Z11 Magnitude')
-subplot(222)
-s11.plot_s_deg()
-title('Z11 Phase')
-tight_layout()
-subplot(223)
-title('Z mag')
-loglog()
-s11.plot_z_mag(marker='x', markevery=1)
-
-show()
\ No newline at end of file
+save(z11_figure(s11,filename),os.path.join('results',filename),formats=('png','svg'))
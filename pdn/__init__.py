@@ -0,0 +1,21 @@
+import sys
+
+from .store import SweepStore, StoreWriter, AxisMismatch
+from .dataset import Dataset
+
+_FITTING = ['FitResult', 'z_from_s11', 'fit_series_rlc', 'fit_parallel_rlc']
+
+__all__ = ['SweepStore', 'StoreWriter', 'AxisMismatch', 'Dataset'] + _FITTING
+
+# the fits are imported on first use of one of their names (PEP 562),
+# so that storing and indexing sweeps does not import scipy.stats
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in _FITTING:
+            from . import fitting
+            value = getattr(fitting, name)
+            globals()[name] = value
+            return value
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+else:
+    from .fitting import FitResult, z_from_s11, fit_series_rlc, fit_parallel_rlc
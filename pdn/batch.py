@@ -0,0 +1,212 @@
+'''
+Batch analysis of capacitor measurements against their models.
+
+    python -m pdn.batch results/manifest.csv --output report --workers 8
+
+The manifest is a CSV file with one part per row:
+
+    name,measured,model,drop
+    T520B_47uF10V,t520_10u_lfF.s1p;t520_10uF.s1p,T520B476M010ATE035.s2p,2
+
+`measured` lists the Touchstone files of the measurement, lowest band
+first, to be stitched; `drop` is the number of bad leading points
+dropped from the lowest band; `model` (optional) is the vendor model.
+Paths are relative to the manifest. A directory stands for its
+manifest.csv.
+
+Each part is parsed, stitched, compared with its model and rendered
+in a pool of worker processes; the workers only send back a summary
+row, so memory does not grow with the number of parts. The stitched
+measurement (Touchstone), the figure (see pdn.figures, --formats
+png,svg) and summary.csv go to the output directory.
+'''
+from __future__ import division, print_function
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import numpy as npy
+import skrf as rf
+
+from .cache import load_touchstone
+from .figures import comparison_figure, impedance_figure, save
+
+SUMMARY_FIELDS = ('name', 'points', 'fmin', 'fmax', 'srf', 'z_min', 'model_srf', 'model_z_min',
+                  'rms_error_db', 'max_error_db', 'seconds', 'error')
+
+
+def read_manifest(path):
+    '''
+    Tasks of a manifest file (or of the manifest.csv of a directory).
+    '''
+    if os.path.isdir(path):
+        path = os.path.join(path, 'manifest.csv')
+    base = os.path.dirname(os.path.abspath(path))
+    tasks = []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            if not row.get('name') or row['name'].startswith('#'):
+                continue
+            measured = [os.path.join(base, name.strip()) for name in row['measured'].split(';') if name.strip()]
+            model = (row.get('model') or '').strip()
+            tasks.append({'name': row['name'].strip(),
+                          'measured': measured,
+                          'model': os.path.join(base, model) if model else None,
+                          'drop': int(row.get('drop') or 0)})
+    return tasks
+
+
+def load_network(path):
+    '''
+    Parse a Touchstone file, through the parsed file cache.
+    '''
+    return load_touchstone(path)
+
+
+def stitch_networks(networks, drop=0):
+    '''
+    Join measurements of adjacent bands, lowest first: the first `drop`
+    points of the lowest band are dropped (as in rf.stitch(lf[2:], hf)),
+    and each band is cut where the next one starts.
+    '''
+    frequencies = []
+    values = []
+    for index, ntwk in enumerate(networks):
+        first = drop if index == 0 else 0
+        f = ntwk.f[first:]
+        s = ntwk.s[first:]
+        if index + 1 < len(networks):
+            keep = f < networks[index + 1].f[0]
+            f, s = f[keep], s[keep]
+        frequencies.append(f)
+        values.append(s)
+    stitched = rf.Network()
+    stitched.s = npy.concatenate(values)
+    stitched.frequency = rf.Frequency.from_f(npy.concatenate(frequencies), unit='hz')
+    stitched.z0 = networks[0].z0[0, 0]
+    return stitched
+
+
+def _resonance(f, z):
+    # self resonant frequency and impedance there (ESR)
+    magnitude = npy.abs(z)
+    index = int(npy.argmin(magnitude))
+    return f[index], magnitude[index]
+
+
+def compare(measured, model):
+    '''
+    Summary of the measured Z11 and of its deviation from the model,
+    the model being interpolated (log-log) on the measured points.
+    '''
+    f = measured.f
+    z = measured.z[:, 0, 0]
+    summary = {'points': len(f), 'fmin': f[0], 'fmax': f[-1]}
+    summary['srf'], summary['z_min'] = _resonance(f, z)
+    if model is not None:
+        model_z = npy.abs(model.z[:, 0, 0])
+        summary['model_srf'], summary['model_z_min'] = _resonance(model.f, model.z[:, 0, 0])
+        inside = (f >= model.f[0]) & (f <= model.f[-1])
+        if inside.any():
+            expected = npy.exp(npy.interp(npy.log(f[inside]), npy.log(model.f), npy.log(model_z)))
+            error = 20 * npy.log10(npy.abs(z[inside]) / expected)
+            summary['rms_error_db'] = float(npy.sqrt(npy.mean(error ** 2)))
+            summary['max_error_db'] = float(npy.max(npy.abs(error)))
+    return summary
+
+
+def analyse(task):
+    '''
+    Parse, stitch, compare and render one part, return its summary row.
+    Runs in a worker process.
+    '''
+    start = time.time()
+    row = {'name': task['name'], 'index': task.get('index')}
+    try:
+        measured = stitch_networks([load_network(path) for path in task['measured']], task['drop'])
+        measured.name = task['name'] + '_meas'
+        model = load_network(task['model']) if task.get('model') else None
+        row.update(compare(measured, model))
+        output = task['output']
+        measured.write_touchstone(measured.name, output)
+        if task.get('render', True):
+            if model is not None:
+                figure = comparison_figure(measured, model, task['name'])
+            else:
+                figure = impedance_figure([measured], task['name'], ['measured'])
+            save(figure, os.path.join(output, task['name']), task.get('formats', ('png',)))
+    except Exception:
+        row['error'] = traceback.format_exc().strip().splitlines()[-1]
+    row['seconds'] = time.time() - start
+    return row
+
+
+def run(tasks, output, workers=None, render=True, progress=None, formats=('png',)):
+    '''
+    Analyse the tasks in a process pool, write output/summary.csv and
+    return the summary rows (in manifest order).
+    '''
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    # annotated copies: the caller's tasks are left as they are
+    tasks = [dict(task, index=index) for index, task in enumerate(tasks)]
+    for task in tasks:
+        task.setdefault('output', output)
+        task.setdefault('render', render)
+        task.setdefault('formats', formats)
+    rows = []
+    # fresh workers now and then keep the memory of the pool bounded
+    pool = multiprocessing.Pool(workers, maxtasksperchild=50)
+    try:
+        for row in pool.imap_unordered(analyse, tasks):
+            rows.append(row)
+            if progress is not None:
+                progress(row, len(rows), len(tasks))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    rows.sort(key=lambda row: row['index'])
+    write_summary(rows, os.path.join(output, 'summary.csv'))
+    return rows
+
+
+def write_summary(rows, path):
+    with open(path, 'w') as f:
+        writer = csv.DictWriter(f, SUMMARY_FIELDS, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict((key, '%.6g' % value if isinstance(value, float) else value)
+                                 for key, value in row.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('manifest', help='manifest CSV file, or directory holding manifest.csv')
+    parser.add_argument('--output', default='report', help='output directory')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--no-figures', action='store_true', help='skip the figures')
+    parser.add_argument('--formats', default='png', help='figure formats, e.g. png,svg')
+    args = parser.parse_args(argv)
+
+    def progress(row, done, total):
+        status = row.get('error') or '%.2fs' % row['seconds']
+        print('[%d/%d] %s: %s' % (done, total, row['name'], status))
+
+    start = time.time()
+    rows = run(read_manifest(args.manifest), args.output, args.workers, not args.no_figures, progress,
+               tuple(args.formats.split(',')))
+    failed = sum(1 for row in rows if row.get('error'))
+    print('%d parts in %.1fs, %d failed' % (len(rows), time.time() - start, failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
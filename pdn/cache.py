@@ -0,0 +1,236 @@
+'''
+On-disk cache of parsed Touchstone files.
+
+Parsing a Touchstone file into a Network costs far more than loading
+its arrays back from a binary file, and vendor models never change.
+load_touchstone() parses a file once and then serves it from the cache:
+
+>>> ntwk = load_touchstone('results/T520B476M010ATE035.s2p')
+
+A file is identified by its path, size and modification time, which
+point to the hash of its content; the parsed arrays are stored under
+that hash, so a file that is touched or copied is not parsed again.
+The least recently used entries are evicted beyond max_bytes, with
+the keys pointing to them or to files since changed. A cached Network comes
+back as rf.Network(path) would give it: name, comments, frequency
+unit and Touchstone variables included.
+
+The cache directory is $PDN_CACHE, or ~/.cache/pdn/touchstone. Every
+entry is its own file, written atomically, so several processes can
+share the cache without locking.
+'''
+from __future__ import division
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as npy
+import skrf as rf
+
+#: default size limit of the cache, bytes
+MAX_BYTES = 512 * 1024 ** 2
+
+_FORMAT = 2 # bumped when the entry layout changes
+
+
+def _cache_directory():
+    return os.environ.get('PDN_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'pdn', 'touchstone')
+
+
+def _write_atomic(path, write):
+    # write(file) to a temporary file, then move it into place
+    directory = os.path.dirname(path)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            write(f)
+        os.rename(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+class TouchstoneCache(object):
+    '''
+    Cache of parsed Touchstone files in a directory.
+    '''
+
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        self.directory = directory or _cache_directory()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        for sub in ('keys', 'data'):
+            path = os.path.join(self.directory, sub)
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError: # created meanwhile by another process
+                    if not os.path.isdir(path):
+                        raise
+
+    def _key_path(self, path, stat):
+        key = '%d|%s|%d|%r' % (_FORMAT, os.path.abspath(path), stat.st_size, stat.st_mtime)
+        return os.path.join(self.directory, 'keys', hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _data_path(self, digest):
+        return os.path.join(self.directory, 'data', digest + '.npz')
+
+    @staticmethod
+    def _digest(path):
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def load(self, path):
+        '''
+        Network of a Touchstone file, parsed only if not cached.
+        '''
+        stat = os.stat(path)
+        key_path = self._key_path(path, stat)
+        digest = None
+        try:
+            with open(key_path) as f:
+                digest = json.load(f)['digest']
+        except (IOError, OSError, ValueError, KeyError):
+            pass # unknown file, or key written by another version
+        if digest is None:
+            digest = self._digest(path)
+            # the key records what it stands for, see prune_keys()
+            key = json.dumps({'digest': digest, 'path': os.path.abspath(path),
+                              'size': stat.st_size, 'mtime': stat.st_mtime})
+            _write_atomic(key_path, lambda f: f.write(key.encode('utf-8')))
+        data_path = self._data_path(digest)
+        try:
+            ntwk = self._read(data_path, path)
+            os.utime(data_path, None) # most recently used
+            self.hits += 1
+            return ntwk
+        except (IOError, OSError, KeyError, ValueError):
+            pass # not cached, or evicted meanwhile
+        self.misses += 1
+        ntwk = rf.Network(path)
+        self._write(data_path, ntwk)
+        self.evict()
+        return ntwk
+
+    @staticmethod
+    def _read(data_path, path):
+        with open(data_path, 'rb') as f:
+            arrays = npy.load(f)
+            ntwk = rf.Network()
+            ntwk.s = arrays['s']
+            ntwk.frequency = rf.Frequency.from_f(arrays['f'], unit='hz')
+            ntwk.z0 = arrays['z0']
+            ntwk.comments = str(arrays['comments'])
+            extra = json.loads(str(arrays['extra']))
+        ntwk.frequency.unit = extra.pop('unit')
+        for name, value in extra.items():
+            setattr(ntwk, name, value)
+        ntwk.name = os.path.splitext(os.path.basename(path))[0]
+        return ntwk
+
+    # Network attributes set from the Touchstone file, besides the arrays
+    _attributes = ('variables', 'comments_after_option_line')
+
+    @classmethod
+    def _write(cls, data_path, ntwk):
+        extra = dict((name, getattr(ntwk, name)) for name in cls._attributes if hasattr(ntwk, name))
+        extra['unit'] = ntwk.frequency.unit
+        _write_atomic(data_path, lambda f: npy.savez(f, f=ntwk.f, s=ntwk.s, z0=ntwk.z0,
+                                                     comments=npy.array(ntwk.comments or ''),
+                                                     extra=npy.array(json.dumps(extra))))
+
+    def entries(self):
+        '''
+        (path, size, last use) of the cached entries, least recent first.
+        '''
+        directory = os.path.join(self.directory, 'data')
+        entries = []
+        for name in os.listdir(directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self, max_bytes=None):
+        '''
+        Remove the least recently used entries beyond max_bytes.
+        '''
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.entries()
+        total = sum(size for path, size, used in entries)
+        evicted = 0
+        for path, size, used in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self.prune_keys()
+        return total
+
+    def prune_keys(self):
+        '''
+        Remove the keys whose entry is gone, and those of files since
+        modified or removed. Called by evict().
+        '''
+        directory = os.path.join(self.directory, 'keys')
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                try:
+                    with open(path) as f:
+                        key = json.load(f)
+                    stat = os.stat(key['path'])
+                    stale = (stat.st_size != key['size'] or stat.st_mtime != key['mtime']
+                             or not os.path.exists(self._data_path(key['digest'])))
+                except (ValueError, KeyError, TypeError, OSError):
+                    stale = True # unreadable key, or file removed
+                if stale:
+                    os.remove(path)
+            except (IOError, OSError):
+                pass # removed meanwhile by another process
+
+    def clear(self):
+        '''
+        Remove every entry.
+        '''
+        self.evict(0)
+        directory = os.path.join(self.directory, 'keys')
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+_default = None
+
+
+def load_touchstone(path):
+    '''
+    Network of a Touchstone file, through the default cache.
+    '''
+    global _default
+    try:
+        if _default is None or _default.directory != _cache_directory():
+            _default = TouchstoneCache()
+        return _default.load(path)
+    except (IOError, OSError):
+        if not os.path.exists(path):
+            raise
+        return rf.Network(path) # cache not writable
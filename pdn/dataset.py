@@ -0,0 +1,366 @@
+'''
+Indexed access to archived sweeps.
+
+A Dataset is an index of sweeps, each described by its DUT, date,
+measurement function and frequency range, taken from sweep stores
+(see store.SweepStore) and Touchstone files. Selecting sweeps only
+looks at the index; the data is read when asked for, from the memory
+mapped stores:
+
+>>> archive = Dataset.scan('results')
+>>> lot = archive.select(dut='T520B*', function='S11', since='2016-03-01')
+>>> s = lot.s                  # (sweeps, points, ports, ports) array
+>>> for ntwk in lot.networks(): ...
+
+Touchstone files are summarised (frequency range, points) by a single
+pass over their lines, and the summaries of a directory are kept in
+an index file so that a rescan only reads new files. The index files
+live in $PDN_INDEX, or ~/.cache/pdn/index, one per directory: nothing
+is written to the archive, which may be read-only.
+'''
+from __future__ import division
+
+import datetime
+import fnmatch
+import hashlib
+import json
+import os
+import time
+
+import numpy as npy
+
+from .cache import load_touchstone
+from .store import SweepStore
+
+#: measurement functions (FNC command) of the HP4195A
+FUNCTIONS = {1: 'network', 2: 'spectrum', 3: 'impedance',
+             4: 'S11', 5: 'S21', 6: 'S12', 7: 'S22'}
+
+def _index_path(directory):
+    # index file of an archive directory, in the user's cache
+    root = os.environ.get('PDN_INDEX') or os.path.join(os.path.expanduser('~'), '.cache', 'pdn', 'index')
+    key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()
+    return os.path.join(root, key + '.json')
+
+try:
+    _string_types = basestring
+except NameError: # Python 3
+    _string_types = str
+
+_UNITS = {'HZ': 1., 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}
+
+
+class Record(object):
+    '''
+    Index entry of one sweep.
+
+    :ivar source: path of the store or Touchstone file.
+    :ivar index: record number in the store, None for Touchstone.
+    :ivar dut, function, timestamp, fmin, fmax, points, ports: as indexed.
+    :ivar metadata: everything else known about the sweep.
+    '''
+
+    __slots__ = ('source', 'index', 'dut', 'function', 'timestamp',
+                 'fmin', 'fmax', 'points', 'ports', 'metadata')
+
+    def __init__(self, source, index=None, dut=None, function=None, timestamp=None,
+                 fmin=None, fmax=None, points=None, ports=1, metadata=None):
+        self.source = source
+        self.index = index
+        self.dut = dut
+        self.function = function
+        self.timestamp = timestamp
+        self.fmin = fmin
+        self.fmax = fmax
+        self.points = points
+        self.ports = ports
+        self.metadata = metadata or {}
+
+    @property
+    def date(self):
+        return datetime.datetime.fromtimestamp(self.timestamp) if self.timestamp is not None else None
+
+    def __repr__(self):
+        where = self.source if self.index is None else '%s[%d]' % (self.source, self.index)
+        return '<Record %s %s %s>' % (self.dut, self.function, where)
+
+
+def _timestamp(value):
+    # seconds since the epoch from a number, date, datetime or ISO string
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, _string_types):
+        fmt = '%Y-%m-%dT%H:%M:%S' if 'T' in value else '%Y-%m-%d'
+        value = datetime.datetime.strptime(value, fmt)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    return time.mktime(value.timetuple()) + value.microsecond / 1e6
+
+
+def _function_name(settings):
+    function = (settings or {}).get('function')
+    return FUNCTIONS.get(int(function)) if function is not None else None
+
+
+def store_records(path):
+    '''
+    Records of the sweeps of a store, from its metadata only.
+    '''
+    store = SweepStore(path)
+    fmin, fmax = float(store.frequency[0]), float(store.frequency[-1])
+    records = []
+    for index, metadata in enumerate(store.metadata):
+        records.append(Record(path, index, metadata.get('dut'),
+                              metadata.get('function') or _function_name(metadata.get('settings')),
+                              metadata.get('timestamp'), fmin, fmax, store.points,
+                              store.ports, metadata))
+    return records
+
+
+def touchstone_summary(path):
+    '''
+    Frequency range, points and ports of a Touchstone file, from one
+    pass over its lines (no parsing into a Network).
+    '''
+    ports = int(os.path.splitext(path)[1][2:-1] or 1)
+    multiplier = 1e9 # Touchstone default unit
+    fmin = fmax = None
+    points = 0
+    with open(path) as f:
+        for line in f:
+            line = line.split('!', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                for word in line[1:].upper().split():
+                    multiplier = _UNITS.get(word, multiplier)
+                continue
+            if line.startswith('['): # Touchstone 2 keywords
+                continue
+            if ports > 2 and fmax is not None and len(line.split()) % 2 == 0:
+                continue # continuation line of a frequency point
+            frequency = float(line.split()[0]) * multiplier
+            if fmin is None:
+                fmin = frequency
+            fmax = frequency
+            points += 1
+    return {'fmin': fmin, 'fmax': fmax, 'points': points, 'ports': ports}
+
+
+def touchstone_record(path, summary=None):
+    '''
+    Record of a Touchstone file, named after the file. A one port file
+    holds S11; the function of a file with more ports is left unknown
+    (None), as it holds them all.
+    '''
+    if summary is None:
+        summary = touchstone_summary(path)
+    dut = os.path.splitext(os.path.basename(path))[0]
+    function = 'S11' if summary['ports'] == 1 else None
+    return Record(path, None, dut, function, os.path.getmtime(path), summary['fmin'],
+                  summary['fmax'], summary['points'], summary['ports'])
+
+
+class Dataset(object):
+    '''
+    A selection of indexed sweeps. Indexing and slicing a Dataset, and
+    select(), give Datasets; nothing is read until s, networks() or
+    frequency are used.
+    '''
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self._stores = {}
+
+    @classmethod
+    def scan(cls, *paths):
+        '''
+        Index the stores (*.sweeps) and Touchstone files (*.s?p) found
+        in the given files and directories.
+        '''
+        records = []
+        for path in paths:
+            if os.path.isdir(path):
+                records.extend(cls._scan_directory(path))
+            elif path.endswith('.sweeps'):
+                records.extend(store_records(path))
+            else:
+                records.append(touchstone_record(path))
+        return cls(records)
+
+    @staticmethod
+    def _scan_directory(directory):
+        index_path = _index_path(directory)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            index = {}
+        updated = {}
+        records = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            extension = os.path.splitext(name)[1].lower()
+            if extension == '.sweeps':
+                records.extend(store_records(path))
+            elif len(extension) >= 4 and extension[:2] == '.s' and extension[-1] == 'p' \
+                    and extension[2:-1].isdigit():
+                stat = os.stat(path)
+                known = index.get(name)
+                if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                    summary = known
+                else:
+                    summary = touchstone_summary(path)
+                    summary.update(size=stat.st_size, mtime=stat.st_mtime)
+                updated[name] = summary
+                records.append(touchstone_record(path, summary))
+        if updated != index:
+            try:
+                if not os.path.isdir(os.path.dirname(index_path)):
+                    os.makedirs(os.path.dirname(index_path))
+                with open(index_path, 'w') as f:
+                    json.dump(updated, f, indent=0, sort_keys=True)
+            except (IOError, OSError):
+                pass # no cache, the next scan reads the files again
+        return records
+
+    ## INDEX
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._subset(self.records[key])
+        return self.records[key]
+
+    def _subset(self, records):
+        subset = Dataset(records)
+        subset._stores = self._stores
+        return subset
+
+    def select(self, dut=None, function=None, since=None, until=None,
+               fmin=None, fmax=None, where=None):
+        '''
+        Sweeps matching all the criteria given.
+
+        :param dut: DUT name, shell wildcards allowed.
+        :param function: measurement function, e.g. 'S11'.
+        :param since, until: date range (timestamp, date, datetime or
+                             'YYYY-MM-DD' string), until excluded.
+        :param fmin, fmax: band the sweeps must cover, Hz.
+        :param where: predicate on the Record.
+        '''
+        since, until = _timestamp(since), _timestamp(until)
+        selected = []
+        for record in self.records:
+            if dut is not None and not fnmatch.fnmatchcase(record.dut or '', dut):
+                continue
+            if function is not None and record.function != function:
+                continue
+            if since is not None and (record.timestamp is None or record.timestamp < since):
+                continue
+            if until is not None and (record.timestamp is None or record.timestamp >= until):
+                continue
+            if fmin is not None and (record.fmin is None or record.fmin > fmin):
+                continue
+            if fmax is not None and (record.fmax is None or record.fmax < fmax):
+                continue
+            if where is not None and not where(record):
+                continue
+            selected.append(record)
+        return self._subset(selected)
+
+    def group_by(self, key='dut'):
+        '''
+        Datasets by value of a record attribute (or of a callable).
+        '''
+        groups = {}
+        for record in self.records:
+            value = key(record) if callable(key) else getattr(record, key)
+            groups.setdefault(value, []).append(record)
+        return dict((value, self._subset(records)) for value, records in groups.items())
+
+    @property
+    def duts(self):
+        return sorted(set(record.dut for record in self.records if record.dut))
+
+    ## DATA
+    def _store(self, path):
+        if path not in self._stores:
+            self._stores[path] = SweepStore(path)
+        return self._stores[path]
+
+    def _touchstone(self, path):
+        return load_touchstone(path)
+
+    @property
+    def frequency(self):
+        '''
+        Frequency axis (Hz) shared by the sweeps.
+        '''
+        if not self.records:
+            raise ValueError('empty dataset')
+        return self._frequency(self.records[0])
+
+    def _frequency(self, record):
+        if record.index is not None:
+            return npy.asarray(self._store(record.source).frequency)
+        return self._touchstone(record.source).f
+
+    @property
+    def s(self):
+        '''
+        S-parameters of the sweeps, (sweeps, points, ports, ports).
+
+        A run of consecutive records of one store is returned as a view
+        of its memory map; otherwise the sweeps are read into a new
+        array. The sweeps must share their frequency axis.
+        '''
+        if not self.records:
+            raise ValueError('empty dataset')
+        first = self.records[0]
+        if first.index is not None and all(
+                record.source == first.source and record.index == first.index + offset
+                for offset, record in enumerate(self.records)):
+            return self._store(first.source).data[first.index:first.index + len(self.records)]
+
+        frequency = self.frequency
+        ports = first.ports
+        s = npy.empty((len(self.records), len(frequency), ports, ports), dtype=complex)
+        by_store = {}
+        for position, record in enumerate(self.records):
+            if record.ports != ports:
+                raise ValueError('%r: %d ports, expected %d' % (record, record.ports, ports))
+            if record.index is not None:
+                by_store.setdefault(record.source, []).append((position, record.index))
+                continue
+            ntwk = self._touchstone(record.source)
+            if len(ntwk.f) != len(frequency) or not npy.allclose(ntwk.f, frequency):
+                raise ValueError('%r: frequency axis differs' % record)
+            s[position] = ntwk.s
+        for path, positions in by_store.items():
+            store = self._store(path)
+            if len(store.frequency) != len(frequency) or not npy.allclose(store.frequency, frequency):
+                raise ValueError('%s: frequency axis differs' % path)
+            rows, indices = zip(*positions)
+            s[list(rows)] = store.data[list(indices)]
+        return s
+
+    def network(self, position):
+        '''
+        skrf Network of one sweep.
+        '''
+        record = self.records[position]
+        if record.index is None:
+            return self._touchstone(record.source)
+        return self._store(record.source).network(record.index)
+
+    def networks(self):
+        '''
+        Generator of the sweeps as skrf Networks, read one at a time.
+        '''
+        for position in range(len(self.records)):
+            yield self.network(position)
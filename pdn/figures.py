@@ -0,0 +1,237 @@
+'''
+Headless rendering of the report figures.
+
+The figures are drawn on matplotlib's Agg canvas (no display, whatever
+the pyplot backend is) and every trace is first reduced to the pixel
+resolution of its axes: within each pixel column only the first, last,
+lowest and highest points are kept, which draws the same picture as
+the full sweep, resonance dips included.
+
+FIGURES names the standard figures:
+
+    z11          Z11 magnitude (dB), phase and |Z| log-log of a sweep
+    impedance    |Z| log-log of one or more sweeps
+    comparison   measured |Z| over its model, with the deviation (dB)
+
+render_all() renders a batch of them in a pool of worker processes:
+
+>>> render_all([{'figure': 'z11', 'networks': ['results/t520_10uF.s1p'],
+...              'path': 'report/t520_10uF'}], formats=('png', 'svg'))
+'''
+from __future__ import division
+
+import multiprocessing
+import os
+import traceback
+
+import numpy as npy
+
+from .cache import load_touchstone
+
+DPI = 100
+
+try:
+    _string_types = basestring
+except NameError: # Python 3
+    _string_types = str
+
+
+def downsample(x, y, pixels, log=False):
+    '''
+    Points of a trace (x ascending) that draw the same at `pixels`
+    columns: first, last, min and max of each column.
+    '''
+    x = npy.asarray(x)
+    y = npy.asarray(y)
+    if len(x) <= 4 * pixels:
+        return x, y
+    u = npy.log10(x) if log else x
+    span = u[-1] - u[0]
+    if not span > 0:
+        return x, y
+    columns = npy.minimum(((u - u[0]) / span * pixels).astype(int), pixels - 1)
+    starts = npy.flatnonzero(npy.r_[True, columns[1:] != columns[:-1]])
+    ends = npy.r_[starts[1:], len(x)] - 1
+    # sorted by column then value: each column keeps its positions
+    order = npy.lexsort((y, columns))
+    keep = npy.unique(npy.concatenate([starts, ends, order[starts], order[ends]]))
+    return x[keep], y[keep]
+
+
+def _pixels(axes):
+    return max(int(axes.get_window_extent().width), 1)
+
+
+def _plot(axes, x, y, *args, **kwargs):
+    log = axes.get_xscale() == 'log'
+    x, y = downsample(x, y, _pixels(axes), log)
+    return axes.plot(x, y, *args, **kwargs)
+
+
+def _new_figure(size):
+    # the Agg canvas needs no display, whatever the pyplot backend is
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=size, dpi=DPI)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _loglog(axes):
+    axes.set_xscale('log')
+    axes.set_yscale('log')
+    axes.set_xlabel('Frequency (Hz)')
+    axes.set_ylabel('|Z| (ohm)')
+    axes.grid(True, which='both')
+
+
+def z11_figure(ntwk, title=None):
+    '''
+    Z11 magnitude and phase over |Z| log-log, as plotted by main.py.
+    '''
+    figure = _new_figure((8, 6))
+    s11 = ntwk.s[:, 0, 0]
+    mhz = ntwk.f / 1e6
+    magnitude = figure.add_subplot(221)
+    _plot(magnitude, mhz, 20 * npy.log10(npy.abs(s11)))
+    magnitude.set_title('Z11 Magnitude')
+    magnitude.set_xlabel('Frequency (MHz)')
+    magnitude.set_ylabel('Magnitude (dB)')
+    phase = figure.add_subplot(222)
+    _plot(phase, mhz, npy.angle(s11, deg=True))
+    phase.set_title('Z11 Phase')
+    phase.set_xlabel('Frequency (MHz)')
+    phase.set_ylabel('Phase (deg)')
+    z = figure.add_subplot(212)
+    _loglog(z)
+    _plot(z, ntwk.f, npy.abs(ntwk.z[:, 0, 0]), marker='x', markersize=3)
+    z.set_title('Z mag')
+    if title or ntwk.name:
+        figure.suptitle(title or ntwk.name)
+    figure.tight_layout(rect=(0, 0, 1, 0.95))
+    return figure
+
+
+def impedance_figure(networks, title=None, labels=None):
+    '''
+    |Z| log-log of each network.
+    '''
+    figure = _new_figure((8, 6))
+    axes = figure.add_subplot(111)
+    _loglog(axes)
+    for index, ntwk in enumerate(networks):
+        label = labels[index] if labels else ntwk.name
+        _plot(axes, ntwk.f, npy.abs(ntwk.z[:, 0, 0]), label=label)
+    axes.set_title(title or '')
+    axes.legend()
+    return figure
+
+
+def comparison_figure(measured, model, title=None):
+    '''
+    Measured |Z| over its model, and their deviation in dB on the
+    measured points (the model interpolated log-log).
+    '''
+    figure = _new_figure((8, 6))
+    axes = figure.add_subplot(211)
+    _loglog(axes)
+    z = npy.abs(measured.z[:, 0, 0])
+    model_z = npy.abs(model.z[:, 0, 0])
+    _plot(axes, model.f, model_z, 'x', label='model')
+    _plot(axes, measured.f, z, '+', label='measured')
+    axes.set_title(title or measured.name)
+    axes.legend()
+    deviation = figure.add_subplot(212, sharex=axes)
+    inside = (measured.f >= model.f[0]) & (measured.f <= model.f[-1])
+    if inside.any():
+        f = measured.f[inside]
+        expected = npy.exp(npy.interp(npy.log(f), npy.log(model.f), npy.log(model_z)))
+        _plot(deviation, f, 20 * npy.log10(z[inside] / expected))
+    deviation.set_xlabel('Frequency (Hz)')
+    deviation.set_ylabel('Measured / model (dB)')
+    deviation.grid(True, which='both')
+    figure.tight_layout()
+    return figure
+
+
+def _comparison(networks, title=None):
+    if len(networks) < 2 or networks[1] is None:
+        return impedance_figure(networks[:1], title, ['measured'])
+    return comparison_figure(networks[0], networks[1], title)
+
+
+#: standard figures, by name: function of (networks, title)
+FIGURES = {
+    'z11': lambda networks, title=None: z11_figure(networks[0], title),
+    'impedance': impedance_figure,
+    'comparison': _comparison,
+}
+
+
+def save(figure, path, formats=('png',)):
+    '''
+    Write a figure to path.<format> for each format, returns the files.
+    '''
+    files = []
+    for extension in formats:
+        name = '%s.%s' % (path, extension)
+        figure.savefig(name, format=extension)
+        files.append(name)
+    return files
+
+
+def render(job):
+    '''
+    Render one job, a dictionary of
+        figure      name in FIGURES
+        networks    Networks or Touchstone paths (None for no model)
+        path        output path, without extension
+        title       (optional)
+        formats     (optional) e.g. ('png', 'svg')
+    and return the files written. Runs in a worker process.
+    '''
+    networks = [load_touchstone(ntwk) if isinstance(ntwk, _string_types) else ntwk
+                for ntwk in job['networks']]
+    directory = os.path.dirname(job['path'])
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError: # created meanwhile by another worker
+            if not os.path.isdir(directory):
+                raise
+    figure = FIGURES[job['figure']](networks, job.get('title'))
+    return save(figure, job['path'], job.get('formats', ('png',)))
+
+
+def _render_job(job):
+    try:
+        return job['path'], render(job), None
+    except Exception:
+        return job['path'], [], traceback.format_exc().strip().splitlines()[-1]
+
+
+def render_all(jobs, workers=None, formats=None, progress=None):
+    '''
+    Render the jobs (see render()) in a process pool. formats, if given,
+    applies to the jobs that do not set theirs. Returns
+    {path: (files, error)}.
+    '''
+    jobs = [dict(job) for job in jobs]
+    if formats is not None:
+        for job in jobs:
+            job.setdefault('formats', formats)
+    results = {}
+    pool = multiprocessing.Pool(workers, maxtasksperchild=50)
+    try:
+        for path, files, error in pool.imap_unordered(_render_job, jobs):
+            results[path] = (files, error)
+            if progress is not None:
+                progress(path, files, error, len(results), len(jobs))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
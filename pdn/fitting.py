@@ -0,0 +1,277 @@
+'''
+Equivalent circuit fitting of capacitor impedance sweeps.
+
+All the sweeps of a lot are fitted at once, as one (sweeps, points)
+array of impedances on a shared frequency axis:
+
+>>> z = z_from_s11(lot.s[:, :, 0, 0])       # e.g. a Dataset selection
+>>> fit = fit_series_rlc(lot.frequency, z)
+>>> fit.value('C'), fit.interval('C')       # per sweep, with 95% bounds
+
+The series RLC model, Z = R + j(wL - 1/(wC)), is linear in R, L and
+1/C: it is solved in closed form, per sweep, by weighted least squares.
+Models of several RLC branches in parallel are fitted by Levenberg-
+Marquardt iterations run on all the sweeps together (batched residuals,
+Jacobians and normal equations), from a few starts derived from the
+series fit, keeping the best of them for each sweep.
+
+Residuals are relative to |Z| by default, so that every decade of a
+wideband sweep weighs the same. Confidence intervals come from the
+covariance of the parameters (Student t quantiles), with the residual
+variance of each sweep.
+'''
+from __future__ import division
+
+import numpy as npy
+from scipy import stats
+
+
+def z_from_s11(s11, z0=50.):
+    '''
+    Impedance of a one port from its reflection coefficient.
+    '''
+    s11 = npy.asarray(s11)
+    return z0 * (1 + s11) / (1 - s11)
+
+
+class FitResult(object):
+    '''
+    Parameters fitted to each sweep.
+
+    :ivar names: parameter names, e.g. ('R', 'L', 'C').
+    :ivar params: (sweeps, parameters) values.
+    :ivar stderr: (sweeps, parameters) standard errors.
+    :ivar dof: degrees of freedom of the residuals.
+    :ivar rms: rms weighted residual of each sweep.
+    :ivar converged: per sweep, False if the iterations did not settle.
+    '''
+
+    def __init__(self, names, params, stderr, dof, rms, converged=None, confidence=0.95):
+        self.names = tuple(names)
+        self.params = params
+        self.stderr = stderr
+        self.dof = dof
+        self.rms = rms
+        self.converged = npy.ones(len(params), bool) if converged is None else converged
+        self.confidence = confidence
+
+    def __len__(self):
+        return len(self.params)
+
+    def _column(self, name):
+        return self.names.index(name)
+
+    def value(self, name):
+        return self.params[:, self._column(name)]
+
+    def interval(self, name, confidence=None):
+        '''
+        (sweeps, 2) lower and upper confidence bounds of a parameter.
+        '''
+        if confidence is None:
+            confidence = self.confidence
+        quantile = stats.t.ppf((1 + confidence) / 2, max(self.dof, 1))
+        column = self._column(name)
+        half = quantile * self.stderr[:, column]
+        value = self.params[:, column]
+        return npy.stack([value - half, value + half], axis=-1)
+
+    def table(self):
+        '''
+        List of {name: value, name_stderr: error} dictionaries, one per sweep.
+        '''
+        rows = []
+        for values, errors, rms in zip(self.params, self.stderr, self.rms):
+            row = {'rms': rms}
+            for name, value, error in zip(self.names, values, errors):
+                row[name] = value
+                row[name + '_stderr'] = error
+            rows.append(row)
+        return rows
+
+
+def _weights(z, weighting):
+    if weighting == 'relative':
+        return 1 / npy.abs(z)
+    if weighting == 'absolute':
+        return npy.ones(z.shape)
+    raise ValueError("weighting must be 'relative' or 'absolute'")
+
+
+def _prepare(f, z, band):
+    f = npy.asarray(f, dtype=float)
+    z = npy.atleast_2d(npy.asarray(z, dtype=complex))
+    if z.shape[-1] != len(f):
+        raise ValueError('%d frequencies for sweeps of %d points' % (len(f), z.shape[-1]))
+    if band is not None:
+        inside = (f >= band[0]) & (f <= band[1])
+        f, z = f[inside], z[:, inside]
+    return f, z
+
+
+def fit_series_rlc(f, z, weighting='relative', band=None, confidence=0.95):
+    '''
+    Fit Z = R + j(wL - 1/(wC)) to each sweep.
+
+    :param f: frequency axis, Hz.
+    :param z: (sweeps, points) complex impedances, or one sweep.
+    :param weighting: 'relative' (residuals divided by |Z|) or 'absolute'.
+    :param band: optional (fmin, fmax) restricting the fit.
+    :returns: FitResult of R (ohm), L (H) and C (F), plus the derived
+              self resonant frequency SRF (Hz).
+    '''
+    f, z = _prepare(f, z, band)
+    w = 2 * npy.pi * f
+    w0 = npy.sqrt(w[0] * w[-1]) # scales the columns of the normal equations
+    a = w / w0          # times L * w0
+    b = -w0 / w         # times 1 / (C * w0)
+    weight2 = _weights(z, weighting) ** 2
+
+    # real part: R alone
+    sum_w2 = weight2.sum(axis=1)
+    R = (weight2 * z.real).sum(axis=1) / sum_w2
+    # imaginary part: 2x2 normal equations in (L w0, 1/(C w0))
+    aa = (weight2 * a * a).sum(axis=1)
+    ab = (weight2 * a * b).sum(axis=1)
+    bb = (weight2 * b * b).sum(axis=1)
+    ay = (weight2 * a * z.imag).sum(axis=1)
+    by = (weight2 * b * z.imag).sum(axis=1)
+    det = aa * bb - ab * ab
+    x = (bb * ay - ab * by) / det
+    y = (aa * by - ab * ay) / det
+
+    residual = npy.concatenate([(z.real - R[:, None]), z.imag - (x[:, None] * a + y[:, None] * b)], axis=1)
+    dof = 2 * len(f) - 3
+    chi2 = (npy.concatenate([weight2, weight2], axis=1) * residual ** 2).sum(axis=1)
+    variance = chi2 / max(dof, 1)
+
+    L = x / w0
+    D = y * w0 # 1/C
+    C = 1 / D
+    stderr_R = npy.sqrt(variance / sum_w2)
+    stderr_L = npy.sqrt(variance * bb / det) / w0
+    stderr_D = npy.sqrt(variance * aa / det) * w0
+    stderr_C = stderr_D / D ** 2
+    srf = 1 / (2 * npy.pi * npy.sqrt(npy.abs(L * C)))
+    # delta method: SRF ~ (L C)**-1/2
+    covariance_LD = -variance * ab / det # of (L w0, D / w0)
+    relative_srf = 0.5 * npy.sqrt(npy.maximum((stderr_L / L) ** 2 + (stderr_D / D) ** 2
+                                              - 2 * covariance_LD / (x * y), 0))
+    params = npy.stack([R, L, C, srf], axis=1)
+    stderr = npy.stack([stderr_R, stderr_L, stderr_C, relative_srf * srf], axis=1)
+    return FitResult(('R', 'L', 'C', 'SRF'), params, stderr, dof, npy.sqrt(chi2 / (2 * len(f))),
+                     confidence=confidence)
+
+
+def _branches_admittance(p, jw):
+    # p: (sweeps, branches, 3) of R, L, C; returns total Y and per branch Y
+    R, L, C = p[..., 0, None], p[..., 1, None], p[..., 2, None]
+    y_branch = 1 / (R + jw * L + 1 / (jw * C))
+    return y_branch.sum(axis=1), y_branch
+
+
+def _levenberg_marquardt(theta, evaluate, max_iterations, tolerance, max_step):
+    # batched iterations; theta (batch, parameters), evaluate(theta) gives
+    # the residuals (batch, residuals) and Jacobians (batch, parameters, residuals)
+    batch, count = theta.shape
+    residual, jacobian = evaluate(theta)
+    cost = (residual ** 2).sum(axis=1)
+    damping = npy.full(batch, 1e-3)
+    converged = npy.zeros(batch, bool)
+    identity = npy.eye(count)
+    for _ in range(max_iterations):
+        normal = npy.einsum('spi,sqi->spq', jacobian, jacobian)
+        gradient = npy.einsum('spi,si->sp', jacobian, residual)
+        diagonal = normal[:, range(count), range(count)]
+        # scaled damping, kept positive for parameters without influence
+        diagonal = diagonal + 1e-12 * diagonal.max(axis=1, keepdims=True) + 1e-300
+        damped = normal + damping[:, None, None] * identity * diagonal[:, :, None]
+        step = -npy.linalg.solve(damped, gradient[..., None])[..., 0]
+        step = npy.clip(step, -max_step, max_step)
+        step[converged] = 0
+        with npy.errstate(all='ignore'):
+            trial_residual, trial_jacobian = evaluate(theta + step)
+        trial_cost = (trial_residual ** 2).sum(axis=1)
+        better = npy.isfinite(trial_cost) & (trial_cost < cost)
+        settled = better & (cost - trial_cost <= tolerance * cost)
+        theta[better] += step[better]
+        residual[better] = trial_residual[better]
+        jacobian[better] = trial_jacobian[better]
+        cost[better] = trial_cost[better]
+        damping = npy.where(better, damping / 3, damping * 4)
+        # no descent left either: a minimum within the numerical precision
+        converged |= settled | (damping > 1e12)
+        if converged.all():
+            break
+    return theta, cost, jacobian, converged
+
+
+def fit_parallel_rlc(f, z, branches=2, p0=None, weighting='relative', band=None,
+                     confidence=0.95, max_iterations=200, tolerance=1e-10, max_step=2.,
+                     ratios=(10, 100, 1000, 10000)):
+    '''
+    Fit `branches` series RLC branches in parallel to each sweep, e.g.
+    a capacitor with a parasitic resonance above its SRF.
+
+    The parameters are fitted as logarithms (so they stay positive) by
+    Levenberg-Marquardt iterations on all the sweeps at once. Unless p0
+    is given, the fit starts from the series fit, the capacitance
+    divided by each of the ratios from one branch to the next, and the
+    best of these starts is kept for each sweep.
+
+    :param p0: (sweeps or 1, branches, 3) starting R, L, C.
+    :param max_step: largest change of a log parameter per iteration.
+    :returns: FitResult of R1, L1, C1, R2, L2, C2...
+    '''
+    f, z = _prepare(f, z, band)
+    sweeps, points = z.shape
+    jw = 1j * 2 * npy.pi * f
+    weight = _weights(z, weighting)
+    if p0 is None:
+        series = npy.abs(fit_series_rlc(f, z, weighting).params)
+        starts = npy.empty((len(ratios), sweeps, branches, 3))
+        for start, ratio in enumerate(ratios):
+            for branch in range(branches):
+                starts[start, :, branch, 0] = series[:, 0] * (branch + 1)
+                starts[start, :, branch, 1] = series[:, 1]
+                starts[start, :, branch, 2] = series[:, 2] / ratio ** branch
+    else:
+        starts = npy.broadcast_to(npy.asarray(p0, dtype=float), (1, sweeps, branches, 3))
+    count = 3 * branches
+    theta = npy.log(starts).reshape(-1, count)
+    # every start of every sweep is one problem of the batch
+    z = npy.tile(z, (len(starts), 1))
+    weight = npy.tile(weight, (len(starts), 1))
+
+    def evaluate(theta):
+        p = npy.exp(theta).reshape(len(theta), branches, 3)
+        y, y_branch = _branches_admittance(p, jw)
+        model = 1 / y
+        r = (model - z) * weight
+        residual = npy.concatenate([r.real, r.imag], axis=1)
+        # dZ/dp = -Z**2 dY/dp, dY_k/dR_k = -Y_k**2, dY_k/dL_k = -jw Y_k**2,
+        # dY_k/dC_k = Y_k**2 / (jw C_k**2); times p for the log parameters
+        y2 = y_branch ** 2
+        dy = npy.stack([-y2 * p[..., 0, None], -jw * y2 * p[..., 1, None],
+                        y2 / (jw * p[..., 2, None])], axis=2) # (batch, branches, 3, points)
+        dz = (-(model ** 2)[:, None, None, :] * dy).reshape(len(theta), count, points) * weight[:, None, :]
+        jacobian = npy.concatenate([dz.real, dz.imag], axis=2) # (batch, parameters, 2 points)
+        return residual, jacobian
+
+    theta, cost, jacobian, converged = _levenberg_marquardt(theta, evaluate, max_iterations,
+                                                            tolerance, max_step)
+    # best start of each sweep
+    cost = npy.where(npy.isfinite(cost), cost, npy.inf).reshape(-1, sweeps)
+    best = npy.argmin(cost, axis=0) * sweeps + npy.arange(sweeps)
+    theta, cost, jacobian, converged = theta[best], cost.ravel()[best], jacobian[best], converged[best]
+
+    dof = 2 * points - count
+    variance = cost / max(dof, 1)
+    normal = npy.einsum('spi,sqi->spq', jacobian, jacobian)
+    covariance = npy.linalg.pinv(normal) * variance[:, None, None]
+    params = npy.exp(theta)
+    # log parameters: stderr(p) = p stderr(log p)
+    stderr = params * npy.sqrt(npy.maximum(covariance[:, range(count), range(count)], 0))
+    names = ['%s%d' % (name, branch + 1) for branch in range(branches) for name in 'RLC']
+    return FitResult(names, params, stderr, dof, npy.sqrt(cost / (2 * points)), converged,
+                     confidence)
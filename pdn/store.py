@@ -0,0 +1,370 @@
+'''
+Append-only binary store of sweeps.
+
+One file per measurement campaign holds the frequency axis shared by
+all the sweeps and the sweeps themselves, as fixed size complex
+records that can be memory-mapped:
+
+    header      64 bytes, see _HEADER
+    frequency   points float64, Hz
+    (padding to a 64 bytes boundary)
+    records     points x ports x ports complex64 or complex128 each
+
+The metadata of each sweep (timestamp, settings snapshot, DUT name...)
+goes to a JSON-lines sidecar file, `<store>.jsonl`, one line per record.
+A record only counts once its sidecar line is written, so a capture
+interrupted mid-write leaves a readable store. A campaign is therefore
+a pair of files rather than one: keeping the metadata out of the
+records file lets both be strictly appended to, and the records stay
+one memory-mappable block. Copy or move both files together; a store
+without its sidecar does not open.
+
+Every sweep appended must be on the store's frequency axis, else
+AxisMismatch (a ValueError) is raised and nothing is written.
+
+>>> store = SweepStore.create('results/t520.sweeps', vna.frequency.f)
+>>> with StoreWriter(store) as writer:
+...     for timestamp, ntwk in vna.stream(count=100):
+...         writer.add(ntwk, timestamp=timestamp, dut='T520B', settings=vna.settings)
+>>> store.network(-1).write_touchstone('t520', 'results')
+'''
+from __future__ import division
+
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as npy
+from skrf.frequency import Frequency
+from skrf.network import Network
+
+try:
+    from queue import Queue
+except ImportError: # Python 2
+    from Queue import Queue
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b'PDNSWEEP'
+VERSION = 1
+
+# magic, version, ports, record item size (8: complex64, 16: complex128),
+# points, offset of the first record
+_HEADER = struct.Struct('<8sHHIQQ')
+_HEADER_SIZE = 64
+_ALIGNMENT = 64
+
+_DTYPES = {8: npy.dtype('<c8'), 16: npy.dtype('<c16')}
+
+
+def _data_offset(points):
+    end = _HEADER_SIZE + 8 * points
+    return -(-end // _ALIGNMENT) * _ALIGNMENT
+
+
+def _sidecar(path):
+    return path + '.jsonl'
+
+
+def _lock(f):
+    # exclusive lock of an open file, against other processes and
+    # other SweepStore objects on the same store
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class AxisMismatch(ValueError):
+    '''
+    A sweep is not on the frequency axis of the store.
+    '''
+
+
+class SweepStore(object):
+    '''
+    A sweep store file, opened for reading and appending.
+
+    Use SweepStore.create for a new campaign, SweepStore(path) to open
+    an existing one.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER_SIZE)
+        if not os.path.exists(_sidecar(path)):
+            raise IOError('%s: metadata file %s is missing, a store is both files'
+                          % (path, _sidecar(path)))
+        if len(header) < _HEADER.size:
+            raise ValueError('%s: truncated header' % path)
+        magic, version, ports, itemsize, points, offset = _HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError('%s: not a sweep store' % path)
+        if version > VERSION:
+            raise ValueError('%s: store version %d not supported' % (path, version))
+        self.ports = ports
+        self.points = points
+        self.dtype = _DTYPES[itemsize]
+        self._offset = offset
+        self._record_size = points * ports * ports * itemsize
+        self._metadata = None
+        self._lock = threading.Lock()
+        self.frequency = npy.memmap(path, dtype='<f8', mode='r', offset=_HEADER_SIZE, shape=(points,))
+
+    @classmethod
+    def create(cls, path, frequency, ports=1, dtype='complex64', overwrite=False):
+        '''
+        Create an empty store for sweeps on the frequency axis (Hz).
+        '''
+        if os.path.exists(path) and not overwrite:
+            raise IOError('%s already exists' % path)
+        frequency = npy.asarray(frequency, dtype='<f8')
+        itemsize = npy.dtype(dtype).itemsize
+        if itemsize not in _DTYPES:
+            raise ValueError('dtype must be complex64 or complex128')
+        offset = _data_offset(len(frequency))
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, ports, itemsize, len(frequency), offset).ljust(_HEADER_SIZE, b'\0'))
+            f.write(frequency.tobytes())
+            f.write(b'\0' * (offset - _HEADER_SIZE - frequency.nbytes))
+        with open(_sidecar(path), 'w'):
+            pass
+        return cls(path)
+
+    ## READING
+    @property
+    def metadata(self):
+        '''
+        Metadata of each record, read from the sidecar on first use.
+        '''
+        if self._metadata is None:
+            self._read_sidecar()
+        return self._metadata
+
+    def _read_sidecar(self):
+        # read the sidecar lines written since the last read
+        if self._metadata is None:
+            self._metadata = []
+            self._sidecar_size = 0
+        with open(_sidecar(self.path), 'rb') as f:
+            f.seek(self._sidecar_size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._metadata.append(json.loads(line.decode('utf-8')))
+                self._sidecar_size += len(line)
+        complete = (os.path.getsize(self.path) - self._offset) // self._record_size
+        if complete < len(self._metadata):
+            # lines of records missing from the store do not count
+            del self._metadata[complete:]
+            with open(_sidecar(self.path), 'rb') as f:
+                self._sidecar_size = sum(len(f.readline()) for _ in range(complete))
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @property
+    def data(self):
+        '''
+        Memory map of the records, (sweeps, points, ports, ports).
+        '''
+        shape = (len(self), self.points, self.ports, self.ports)
+        if not shape[0]:
+            return npy.empty(shape, self.dtype)
+        return npy.memmap(self.path, dtype=self.dtype, mode='r', offset=self._offset, shape=shape)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def network(self, index=-1):
+        '''
+        skrf Network of a record, named after its DUT if recorded.
+        '''
+        ntwk = Network()
+        ntwk.s = npy.array(self.data[index], dtype=complex)
+        ntwk.frequency = Frequency.from_f(npy.array(self.frequency), unit='hz')
+        meta = self.metadata[index]
+        ntwk.name = meta.get('name') or meta.get('dut') or ''
+        if meta.get('comments'):
+            ntwk.comments = meta['comments']
+        return ntwk
+
+    def export_touchstone(self, directory, indices=None, filename='%(dut)s_%(index)04d'):
+        '''
+        Write records to Touchstone files, returns their names.
+
+        filename is formatted with the record metadata and its index.
+        '''
+        if indices is None:
+            indices = range(len(self))
+        names = []
+        for index in indices:
+            fields = {'dut': 'sweep'}
+            fields.update(self.metadata[index])
+            fields['index'] = index
+            name = filename % fields
+            self.network(index).write_touchstone(name, directory)
+            names.append(name)
+        return names
+
+    ## WRITING
+    def check(self, sweep):
+        '''
+        Raise ValueError unless sweep (a Network, or an array of values)
+        fits the store: same frequency points (else AxisMismatch), same
+        number of ports.
+        '''
+        if hasattr(sweep, 'f'):
+            f = npy.asarray(sweep.f, dtype=float)
+            if len(f) != self.points or not npy.allclose(f, self.frequency, rtol=1e-9, atol=0):
+                raise AxisMismatch('%s: sweep of %d points from %g to %g Hz, the store axis has '
+                                   '%d points from %g to %g Hz' % (self.path, len(f), f[0], f[-1], self.points,
+                                                                   self.frequency[0], self.frequency[-1]))
+        values = sweep.s if hasattr(sweep, 's') else sweep
+        if npy.size(values) != self.points * self.ports * self.ports:
+            raise ValueError('%s: sweep of %d values, records hold %d points x %d ports x %d ports'
+                             % (self.path, npy.size(values), self.points, self.ports, self.ports))
+
+    def _encode(self, sweep):
+        if hasattr(sweep, 's'):
+            sweep = sweep.s
+        sweep = npy.asarray(sweep).reshape(self.points, self.ports, self.ports)
+        return sweep.astype(self.dtype).tobytes()
+
+    @staticmethod
+    def _dumps(metadata):
+        return (json.dumps(metadata, sort_keys=True, default=float) + '\n').encode('utf-8')
+
+    def extend(self, records):
+        '''
+        Append (sweep, timestamp, metadata) records in one write.
+
+        sweep is a Network or an array of points x ports x ports values
+        on the store's frequency axis (see check(), nothing is written
+        if one does not fit). Writers, in this process or others, take
+        turns on a lock of the sidecar and append after the records
+        found on disk; what an interrupted write left past the last
+        complete record is overwritten.
+        '''
+        blobs = []
+        entries = []
+        for sweep, timestamp, metadata in records:
+            self.check(sweep)
+            blobs.append(self._encode(sweep))
+            metadata = dict(metadata)
+            metadata['timestamp'] = time.time() if timestamp is None else float(timestamp)
+            entries.append(json.loads(self._dumps(metadata).decode('utf-8')))
+        lines = b''.join(self._dumps(entry) for entry in entries)
+        with self._lock:
+            with open(_sidecar(self.path), 'r+b') as sidecar:
+                _lock(sidecar)
+                try:
+                    # records appended by other writers since the last read
+                    self._read_sidecar()
+                    count = len(self._metadata)
+                    with open(self.path, 'r+b') as f:
+                        f.seek(self._offset + count * self._record_size)
+                        f.truncate()
+                        f.write(b''.join(blobs))
+                    sidecar.seek(self._sidecar_size)
+                    sidecar.truncate()
+                    sidecar.write(lines)
+                    sidecar.flush()
+                    self._metadata.extend(entries)
+                    self._sidecar_size += len(lines)
+                finally:
+                    _unlock(sidecar)
+
+    def append(self, sweep, timestamp=None, **metadata):
+        '''
+        Append one sweep, with its DUT name, settings... as metadata.
+        '''
+        self.extend([(sweep, timestamp, metadata)])
+
+    def refresh(self):
+        '''
+        Forget the cached metadata, to see records appended by others.
+        '''
+        self._metadata = None
+
+
+class StoreWriter(object):
+    '''
+    Appends sweeps to a SweepStore from a background thread.
+
+    add() only queues the sweep, so acquisition is never held by the
+    disk; the thread writes whatever has been queued in one chunk.
+    Errors are raised by the next add() or by close().
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.written = 0
+        self._queue = Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='store-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            records = [self._queue.get()]
+            while not self._queue.empty():
+                records.append(self._queue.get())
+            if None in records:
+                stop = True
+                records = [record for record in records if record is not None]
+            if records and self._error is None:
+                try:
+                    self.store.extend(records)
+                    self.written += len(records)
+                except Exception as e:
+                    self._error = e
+
+    def add(self, sweep, timestamp=None, **metadata):
+        '''
+        Queue a sweep (Network or array) with its metadata.
+        '''
+        if self._error is not None:
+            raise self._error
+        self.store.check(sweep) # raised here rather than on the thread
+        if hasattr(sweep, 's'):
+            sweep = sweep.s
+        self._queue.put((npy.array(sweep), time.time() if timestamp is None else timestamp, metadata))
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self):
+        '''
+        Write the queued sweeps and stop the thread.
+        '''
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,35 @@
+'''
+Fixtures shared by the tests: an HP4195A driven through the Prologix
+emulator (instruments.emulator), on a free local port.
+'''
+import sys
+
+import pytest
+
+from instruments.emulator import PrologixEmulator, HP4195Personality
+
+if sys.version_info < (3, 5):
+    collect_ignore = ['test_aprologix.py'] # asyncio
+
+
+@pytest.fixture
+def personality():
+    # sweeps 1000 times faster than the real instrument
+    return HP4195Personality(time_scale=0.001)
+
+
+@pytest.fixture
+def emulator(personality):
+    server = PrologixEmulator(('127.0.0.1', 0), {17: personality}).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def vna(emulator):
+    from instruments.hp4195 import HP4195
+
+    vna = HP4195('127.0.0.1', 17, port=emulator.port)
+    vna.numpoints = 51
+    yield vna
+    vna.plx.close()
@@ -0,0 +1,57 @@
+'''
+asyncio transport and HP4195 facade, against the emulator.
+'''
+import asyncio
+
+import pytest
+
+from instruments import errors
+from instruments.aprologix import AsyncHP4195, AsyncInstrument
+from instruments.emulator import PrologixEmulator, HP4195Personality
+from instruments.prologix import single, big_endian
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def _s11(port, **settings):
+    vna = await AsyncHP4195.connect('127.0.0.1', 17, port=port)
+    try:
+        await vna.configure(**settings)
+        return await vna.s11()
+    finally:
+        await vna.inst.controller.close()
+
+
+def test_s11(emulator, personality):
+    ntwk = _run(_s11(emulator.port, nop=51))
+    assert ntwk.name == 'S11'
+    assert ntwk.s.shape == (51, 1, 1)
+    assert ntwk.f[-1] == personality.stop
+    assert personality.function == 4
+
+
+async def _gather(*coroutines):
+    return await asyncio.gather(*coroutines)
+
+
+def test_two_controllers(emulator):
+    other = PrologixEmulator(('127.0.0.1', 0), {17: HP4195Personality(time_scale=0.001)}).start()
+    try:
+        low, high = _run(_gather(_s11(emulator.port, nop=51, stop=1e6),
+                                        _s11(other.port, nop=21, stop=2e6)))
+    finally:
+        other.stop()
+    assert (len(low.f), low.f[-1]) == (51, 1e6)
+    assert (len(high.f), high.f[-1]) == (21, 2e6)
+
+
+def test_short_binary_block():
+    inst = AsyncInstrument(None, 17)
+    with pytest.raises(errors.InvalidBinaryFormat):
+        inst._decode_values(b'#A\x00\x08\x00\x00', single | big_endian, None)
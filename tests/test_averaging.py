@@ -0,0 +1,94 @@
+'''
+Host-side sweep averaging against numpy on synthetic sweeps.
+'''
+import numpy as npy
+import pytest
+
+from instruments.averaging import SweepAverager
+
+POINTS = 11
+
+
+def _sweeps(count, seed=0):
+    rng = npy.random.RandomState(seed)
+    return (1 + 0.1 * rng.standard_normal((count, POINTS))) * \
+        npy.exp(1j * (npy.linspace(-3, 3, POINTS) + 0.1 * rng.standard_normal((count, POINTS))))
+
+
+def _wrap(degrees):
+    return (npy.asarray(degrees) + 180) % 360 - 180
+
+
+def test_complex():
+    sweeps = _sweeps(20)
+    averager = SweepAverager(POINTS)
+    for values in sweeps:
+        averager.update(values)
+    assert averager.count == 20
+    npy.testing.assert_allclose(averager.mean, sweeps.mean(axis=0))
+    npy.testing.assert_allclose(averager.variance, sweeps.real.var(axis=0, ddof=1) + sweeps.imag.var(axis=0, ddof=1))
+    npy.testing.assert_allclose(averager.stderr, npy.sqrt(averager.variance / 20))
+
+
+def test_dbdeg_registers():
+    sweeps = _sweeps(5)
+    from_complex = SweepAverager(POINTS)
+    from_registers = SweepAverager(POINTS)
+    for values in sweeps:
+        from_complex.update(values)
+        from_registers.update_dbdeg(20 * npy.log10(npy.abs(values)), npy.angle(values, deg=True))
+    npy.testing.assert_allclose(from_registers.mean, from_complex.mean)
+    npy.testing.assert_allclose(from_registers.variance, from_complex.variance)
+
+
+def test_phase_across_180():
+    rng = npy.random.RandomState(1)
+    db = rng.standard_normal((30, POINTS))
+    phase = 178 + 3 * rng.standard_normal((30, POINTS)) # unwrapped
+    averager = SweepAverager(POINTS, 'dbdeg')
+    for db_data, deg_data in zip(db, _wrap(phase)):
+        averager.update_dbdeg(db_data, deg_data)
+    mean_db, mean_deg = averager.mean_dbdeg
+    npy.testing.assert_allclose(mean_db, db.mean(axis=0))
+    npy.testing.assert_allclose(_wrap(mean_deg - phase.mean(axis=0)), 0, atol=1e-9)
+    assert (npy.abs(mean_deg) <= 180).all()
+    var_db, var_deg = averager.variance
+    npy.testing.assert_allclose(var_db, db.var(axis=0, ddof=1))
+    npy.testing.assert_allclose(var_deg, phase.var(axis=0, ddof=1))
+
+
+def test_exponential():
+    sweeps = _sweeps(10)
+    alpha = 0.3
+    averager = SweepAverager(POINTS, alpha=alpha)
+    for values in sweeps:
+        averager.update(values)
+    weights = alpha * (1 - alpha) ** npy.arange(9, -1, -1.)
+    weights[0] /= alpha # the first sweep starts the average
+    npy.testing.assert_allclose(weights.sum(), 1)
+    npy.testing.assert_allclose(averager.mean, npy.dot(weights, sweeps))
+    assert averager.effective_count == pytest.approx((2 - alpha) / alpha)
+
+
+@pytest.mark.parametrize('before', [0, 1, 3])
+def test_update_many(before):
+    sweeps = _sweeps(15)
+    sequential = SweepAverager(POINTS)
+    merged = SweepAverager(POINTS)
+    for values in sweeps:
+        sequential.update(values)
+    for values in sweeps[:before]:
+        merged.update(values)
+    merged.update_many(sweeps[before:])
+    assert merged.count == sequential.count
+    npy.testing.assert_allclose(merged.mean, sequential.mean)
+    npy.testing.assert_allclose(merged.variance, sequential.variance)
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        SweepAverager(POINTS, 'polar')
+    with pytest.raises(ValueError):
+        SweepAverager(POINTS, alpha=0)
+    with pytest.raises(ValueError):
+        SweepAverager(POINTS).update(npy.ones(POINTS + 1))
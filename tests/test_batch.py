@@ -0,0 +1,47 @@
+'''
+Stitching the sweeps of adjacent bands.
+'''
+import os
+
+import numpy as npy
+import skrf as rf
+
+from pdn.batch import run, stitch_networks
+
+
+def _network(f, s=None):
+    ntwk = rf.Network()
+    ntwk.s = npy.arange(len(f), dtype=complex) if s is None else s
+    ntwk.frequency = rf.Frequency.from_f(npy.asarray(f, dtype=float), unit='hz')
+    return ntwk
+
+
+def test_overlapping_bands():
+    low = _network(npy.linspace(1e3, 20e6, 51), npy.linspace(0, 1, 51) + 1j)
+    high = _network(npy.linspace(10e6, 500e6, 51), npy.linspace(1, 2, 51) - 1j)
+    stitched = stitch_networks([low, high], drop=2)
+    keep = low.f[2:] < high.f[0]
+    npy.testing.assert_array_equal(stitched.f, npy.concatenate([low.f[2:][keep], high.f]))
+    npy.testing.assert_array_equal(stitched.s, npy.concatenate([low.s[2:][keep], high.s]))
+    assert (npy.diff(stitched.f) > 0).all()
+
+
+def test_drop_applies_to_the_lowest_band():
+    bands = [_network([1, 2, 3, 4]), _network([4, 5, 6]), _network([6, 7])]
+    stitched = stitch_networks(bands, drop=2)
+    npy.testing.assert_array_equal(stitched.f, [3, 4, 5, 6, 7])
+    npy.testing.assert_array_equal(stitched.s[:, 0, 0], [2, 0, 1, 0, 1])
+
+
+def test_adjacent_bands():
+    stitched = stitch_networks([_network([1, 2]), _network([3, 4])])
+    npy.testing.assert_array_equal(stitched.f, [1, 2, 3, 4])
+
+
+def test_run_copies_the_tasks(tmp_path):
+    tasks = [{'name': 'C1', 'measured': [str(tmp_path / 'missing.s1p')], 'drop': 0}]
+    rows = run(tasks, str(tmp_path / 'report'), workers=1, render=False)
+    assert tasks == [{'name': 'C1', 'measured': [str(tmp_path / 'missing.s1p')], 'drop': 0}]
+    assert [(row['name'], row['index']) for row in rows] == [('C1', 0)]
+    assert rows[0]['error']
+    assert os.path.isfile(str(tmp_path / 'report' / 'summary.csv'))
@@ -0,0 +1,73 @@
+'''
+Parsed Touchstone cache: hits, invalidation and eviction.
+'''
+import os
+
+import numpy as npy
+import pytest
+import skrf as rf
+
+from pdn.cache import TouchstoneCache
+
+
+def _network(points):
+    ntwk = rf.Network()
+    ntwk.s = npy.exp(1j * npy.linspace(0, 3, points)) * npy.linspace(1, 0.1, points)
+    ntwk.frequency = rf.Frequency.from_f(npy.linspace(1e3, 500e6, points), unit='hz')
+    return ntwk
+
+
+@pytest.fixture
+def touchstone(tmp_path):
+    ntwk = _network(51)
+    ntwk.frequency.unit = 'mhz'
+    ntwk.write_touchstone('dut', str(tmp_path))
+    return str(tmp_path / 'dut.s1p')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TouchstoneCache(str(tmp_path / 'cache'))
+
+
+def _keys(cache):
+    return os.listdir(os.path.join(cache.directory, 'keys'))
+
+
+def test_hit(cache, touchstone):
+    parsed = cache.load(touchstone)
+    cached = cache.load(touchstone)
+    assert (cache.misses, cache.hits) == (1, 1)
+    npy.testing.assert_array_equal(cached.s, parsed.s)
+    npy.testing.assert_array_equal(cached.f, parsed.f)
+    assert cached.frequency.unit == parsed.frequency.unit == 'MHz'
+    assert cached.name == 'dut'
+
+
+def test_modified_file(cache, touchstone):
+    cache.load(touchstone)
+    _network(21).write_touchstone(touchstone[:-4])
+    os.utime(touchstone, (0, 1e9))
+    assert len(cache.load(touchstone).f) == 21
+    assert cache.misses == 2
+
+
+def test_eviction(cache, touchstone):
+    cache.load(touchstone)
+    assert cache.evict(0) == 0
+    assert cache.entries() == []
+    assert _keys(cache) == []
+    cache.load(touchstone)
+    assert (cache.misses, cache.hits) == (2, 0)
+
+
+def test_stale_keys(cache, touchstone):
+    cache.load(touchstone)
+    os.utime(touchstone, (0, 1e9))
+    cache.load(touchstone)
+    assert len(_keys(cache)) == 2
+    cache.prune_keys()
+    assert len(_keys(cache)) == 1
+    os.remove(touchstone)
+    cache.prune_keys()
+    assert _keys(cache) == []
@@ -0,0 +1,98 @@
+'''
+Dataset index over stores and Touchstone files, on synthetic sweeps.
+'''
+import json
+import os
+
+import numpy as npy
+import pytest
+import skrf as rf
+
+from pdn import dataset
+from pdn.dataset import Dataset
+from pdn.store import SweepStore
+
+F = npy.linspace(1e3, 1e6, 11)
+
+
+def _network(f, value, name):
+    ntwk = rf.Network()
+    ntwk.s = npy.full(len(f), value, dtype=complex)
+    ntwk.frequency = rf.Frequency.from_f(npy.asarray(f, dtype=float), unit='hz')
+    ntwk.name = name
+    return ntwk
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setenv('PDN_INDEX', str(tmp_path / 'index'))
+    directory = tmp_path / 'results'
+    directory.mkdir()
+    store = SweepStore.create(str(directory / 'campaign.sweeps'), F)
+    for index in range(4):
+        store.append(npy.full(len(F), index, complex), timestamp=1e9 + index,
+                     dut='C%d' % (index % 2), settings={'function': 4 if index < 3 else 5})
+    _network(F, 0.5j, 't520').write_touchstone('t520', str(directory))
+    return str(directory)
+
+
+def test_scan(archive):
+    lot = Dataset.scan(archive)
+    assert len(lot) == 5
+    assert lot.duts == ['C0', 'C1', 't520']
+    assert [record.function for record in lot] == ['S11', 'S11', 'S11', 'S21', 'S11']
+
+
+def test_select(archive):
+    lot = Dataset.scan(archive)
+    assert len(lot.select(function='S11')) == 4 # the .s1p included
+    assert [record.index for record in lot.select(dut='C*', function='S11')] == [0, 1, 2]
+    assert [record.index for record in lot.select(since=1e9 + 1, until=1e9 + 3)] == [1, 2]
+    assert len(lot.select(fmin=1e3, fmax=1e6)) == 5
+    assert len(lot.select(fmax=2e6)) == 0
+    assert [record.dut for record in lot.select(where=lambda record: record.index is None)] == ['t520']
+
+
+def test_s_memory_map(archive):
+    lot = Dataset.scan(archive)
+    consecutive = lot[1:3].s
+    assert isinstance(consecutive, npy.memmap)
+    assert consecutive.shape == (2, len(F), 1, 1)
+    npy.testing.assert_array_equal(consecutive[:, 0, 0, 0], [1, 2])
+
+
+def test_s_copy(archive):
+    lot = Dataset.scan(archive)
+    mixed = lot.select(where=lambda record: record.index != 1)
+    s = mixed.s
+    assert not isinstance(s, npy.memmap)
+    npy.testing.assert_allclose(s[:, 0, 0, 0], [0, 2, 3, 0.5j])
+    npy.testing.assert_allclose(mixed.network(-1).s, s[-1])
+
+
+def test_mixed_axis(archive):
+    _network(F * 2, 1, 'moved').write_touchstone('moved', archive)
+    lot = Dataset.scan(archive)
+    with pytest.raises(ValueError):
+        lot.s
+    assert lot.select(dut='moved').s.shape == (1, len(F), 1, 1)
+
+
+def test_index_reused(archive, monkeypatch):
+    Dataset.scan(archive)
+    with open(dataset._index_path(archive)) as f:
+        assert list(json.load(f)) == ['t520.s1p']
+
+    def summary(path):
+        raise AssertionError('%s read again' % path)
+    monkeypatch.setattr(dataset, 'touchstone_summary', summary)
+    record, = Dataset.scan(archive).select(dut='t520')
+    assert (record.fmin, record.fmax, record.points) == (F[0], F[-1], len(F))
+
+    # a modified file is read again
+    monkeypatch.undo()
+    monkeypatch.setenv('PDN_INDEX', os.path.dirname(dataset._index_path(archive)))
+    _network(F[:5], 0.5j, 't520').write_touchstone('t520', archive)
+    os.utime(os.path.join(archive, 't520.s1p'), (0, 1e9))
+    record, = Dataset.scan(archive).select(dut='t520')
+    assert record.points == 5
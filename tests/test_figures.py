@@ -0,0 +1,62 @@
+'''
+Report figures: trace reduction to the pixel width, batch rendering.
+'''
+import os
+
+import numpy as npy
+import pytest
+import skrf as rf
+
+from pdn.figures import downsample, render_all
+
+
+def _columns(x, pixels, log=False):
+    u = npy.log10(x) if log else x
+    return npy.minimum(((u - u[0]) / (u[-1] - u[0]) * pixels).astype(int), pixels - 1)
+
+
+@pytest.mark.parametrize('log', [False, True])
+def test_downsample(log):
+    rng = npy.random.RandomState(0)
+    x = npy.logspace(2, 8, 5001) if log else npy.linspace(0, 1, 5001)
+    y = rng.standard_normal(len(x))
+    y[1234] = -100 # a resonance dip
+    pixels = 100
+    kept_x, kept_y = downsample(x, y, pixels, log)
+    assert len(kept_x) <= 4 * pixels
+    assert (npy.diff(kept_x) > 0).all()
+    assert -100 in kept_y
+    columns = _columns(x, pixels, log)
+    kept_columns = _columns(kept_x, pixels, log)
+    for column in npy.unique(columns):
+        points = npy.flatnonzero(columns == column)
+        kept = kept_y[kept_columns == column]
+        assert kept[0] == y[points[0]]
+        assert kept[-1] == y[points[-1]]
+        assert kept.min() == y[points].min()
+        assert kept.max() == y[points].max()
+
+
+def test_downsample_below_width():
+    x = npy.linspace(0, 1, 400)
+    y = npy.sin(x)
+    kept_x, kept_y = downsample(x, y, 100)
+    assert kept_x is x and kept_y is y
+
+
+def test_render_all(tmp_path):
+    pytest.importorskip('matplotlib')
+    ntwk = rf.Network()
+    ntwk.s = npy.linspace(0.1, 0.9, 51).astype(complex)
+    ntwk.frequency = rf.Frequency.from_f(npy.logspace(3, 8, 51), unit='hz')
+    ntwk.write_touchstone('dut', str(tmp_path))
+    touchstone = str(tmp_path / 'dut.s1p')
+    jobs = [{'figure': 'z11', 'networks': [touchstone], 'path': str(tmp_path / 'report' / 'dut')},
+            {'figure': 'polar', 'networks': [touchstone], 'path': str(tmp_path / 'bad')}]
+    results = render_all(jobs, workers=2, formats=('png', 'svg'))
+    files, error = results[jobs[0]['path']]
+    assert error is None
+    assert [os.path.splitext(name)[1] for name in files] == ['.png', '.svg']
+    assert all(os.path.getsize(name) for name in files)
+    files, error = results[jobs[1]['path']]
+    assert files == [] and 'KeyError' in error
@@ -0,0 +1,91 @@
+'''
+Equivalent circuit fits, on emulated and synthetic sweeps.
+'''
+import subprocess
+import sys
+
+import numpy as npy
+import pytest
+
+from instruments.emulator import series_rlc
+from pdn.fitting import fit_series_rlc, fit_parallel_rlc, z_from_s11
+
+# the emulator's built-in capacitor, see series_rlc
+R, L, C = 35e-3, 1e-9, 47e-6
+
+
+def _parallel(f, branches):
+    y = sum(1 / series_rlc(f, c, r, l) for r, l, c in branches)
+    return 1 / y
+
+
+@pytest.fixture
+def measured(vna):
+    # the capacitor is in shunt between the ports: Z = Z0/2 S21 / (1 - S21)
+    vna.set_measurement_S21()
+    vna.set_log_freq()
+    vna.start_freq = 100
+    vna.stop_freq = 100e6
+    vna.numpoints = 101
+    ntwk = vna.one_port
+    s21 = ntwk.s[:, 0, 0]
+    return ntwk.f, 25 * s21 / (1 - s21)
+
+
+def test_series_rlc(measured):
+    f, z = measured
+    fit = fit_series_rlc(f, z)
+    npy.testing.assert_allclose(fit.params[0, :3], [R, L, C], rtol=1e-5)
+    npy.testing.assert_allclose(fit.value('SRF'), 1 / (2 * npy.pi * npy.sqrt(L * C)), rtol=1e-5)
+    lower, upper = fit.interval('C')[0]
+    assert lower <= fit.value('C')[0] <= upper
+
+
+def test_series_rlc_band(measured):
+    f, z = measured
+    fit = fit_series_rlc(f, z, band=(1e3, 1e7))
+    npy.testing.assert_allclose(fit.params[0, :3], [R, L, C], rtol=1e-5)
+
+
+def test_series_rlc_noise():
+    rng = npy.random.RandomState(0)
+    f = npy.logspace(2, 8, 201)
+    z = series_rlc(f, C, R, L) * (1 + 0.01 * rng.standard_normal((20, len(f))))
+    fit = fit_series_rlc(f, z)
+    lower, upper = fit.interval('C').T
+    assert ((lower < C) & (C < upper)).mean() >= 0.8
+    assert len(fit.table()) == 20
+
+
+def test_parallel_rlc():
+    f = npy.logspace(2, 8.5, 401)
+    truth = [[(R, L, C), (3 * R, L / 2, C / 1000)],
+             [(2 * R, L, C / 10), (R, L / 4, C / 1e4)]]
+    z = npy.array([_parallel(f, branches) for branches in truth])
+    fit = fit_parallel_rlc(f, z)
+    assert fit.converged.all()
+    npy.testing.assert_allclose(fit.params, npy.reshape(truth, (2, 6)), rtol=1e-4)
+
+
+def test_parallel_rlc_one_branch(measured):
+    f, z = measured
+    fit = fit_parallel_rlc(f, z, branches=1)
+    npy.testing.assert_allclose(fit.params[0], [R, L, C], rtol=1e-5)
+
+
+def test_z_from_s11():
+    z = series_rlc(npy.logspace(2, 8, 11))
+    npy.testing.assert_allclose(z_from_s11((z - 50) / (z + 50)), z)
+
+
+def test_weighting():
+    with pytest.raises(ValueError):
+        fit_series_rlc([1, 2, 3, 4], [1, 2, 3, 4], weighting='none')
+
+
+def test_fitting_imported_on_use():
+    code = ('import sys, pdn; loaded = "pdn.fitting" in sys.modules; pdn.fit_series_rlc; '
+            'print(loaded, "pdn.fitting" in sys.modules)')
+    output = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+    expected = ['True', 'True'] if sys.version_info < (3, 7) else ['False', 'True']
+    assert output == expected
@@ -0,0 +1,185 @@
+'''
+HP4195 driver against the emulator.
+
+Single sweeps leave the analyzer in the sweep mode (and measurement
+function) it was in, whether they complete or time out.
+'''
+import numpy as npy
+import pytest
+
+from instruments import errors
+
+CONTINUOUS = 1
+
+
+def _time_out(vna, after=0):
+    # the sweep following the first `after` ones never ends
+    wait = vna._wait_sweep_end
+    calls = [0]
+
+    def wait_sweep_end(*args, **kwargs):
+        calls[0] += 1
+        if calls[0] > after:
+            raise errors.Timeout('sweep did not end')
+        return wait(*args, **kwargs)
+    vna._wait_sweep_end = wait_sweep_end
+
+
+def _state(vna, personality):
+    vna.idn # writes are not answered: wait for them with a query
+    return personality.sweep_mode, personality.function
+
+
+def test_single_sweep(vna, personality):
+    vna.set_trigger_continuous()
+    a, b = vna.single_sweep()
+    assert len(a) == len(b) == 51
+    assert _state(vna, personality)[0] == CONTINUOUS
+
+
+@pytest.mark.parametrize('sweep_mode', [2, 3])
+def test_single_sweep_front_panel_mode(vna, personality, sweep_mode):
+    # set on the front panel: not in the shadow
+    vna.idn
+    personality.sweep_mode = sweep_mode
+    vna.single_sweep()
+    assert _state(vna, personality)[0] == sweep_mode
+
+
+def test_single_sweep_timeout(vna, personality):
+    vna.set_trigger_continuous()
+    _time_out(vna)
+    with pytest.raises(errors.Timeout):
+        vna.single_sweep()
+    assert _state(vna, personality)[0] == CONTINUOUS
+
+
+def test_single_sweeps_closed_early(vna, personality):
+    vna.set_trigger_continuous()
+    sweeps = vna.single_sweeps(3)
+    next(sweeps)
+    sweeps.close()
+    assert _state(vna, personality)[0] == CONTINUOUS
+    assert len(list(vna.single_sweeps(2))) == 2
+    assert _state(vna, personality)[0] == CONTINUOUS
+
+
+def test_average_timeout(vna, personality):
+    vna.set_trigger_continuous()
+    _time_out(vna, after=1)
+    with pytest.raises(errors.Timeout):
+        vna.average(3)
+    assert _state(vna, personality)[0] == CONTINUOUS
+
+
+def test_measure_two_port_timeout(vna, personality):
+    vna.set_trigger_continuous()
+    vna.set_measurement_S11()
+    function = _state(vna, personality)[1]
+    _time_out(vna, after=1)
+    with pytest.raises(errors.Timeout):
+        vna.measure_two_port()
+    assert _state(vna, personality) == (CONTINUOUS, function)
+    assert vna.settings['function'] == function
+
+
+def test_measure_two_port(vna, personality):
+    vna.set_trigger_continuous()
+    assert vna.measure_two_port().s.shape == (51, 2, 2)
+    assert _state(vna, personality)[0] == CONTINUOUS
+
+
+def test_two_port_function_of_one_port_dut(tmp_path):
+    from instruments.emulator import HP4195Personality
+    from skrf.media import DefinedGammaZ0
+    from skrf.frequency import Frequency
+
+    media = DefinedGammaZ0(Frequency(1, 100, 11, 'mhz'))
+    path = str(tmp_path / 'dut')
+    media.short().write_touchstone(path)
+    personality = HP4195Personality(path + '.s1p', time_scale=0.001)
+    personality.write('FNC5')
+    assert personality.function != 5
+    personality.write('ERR?')
+    assert int(personality.read()) == 1
+
+
+def test_wideband(vna, personality):
+    vna.set_trigger_continuous()
+    ntwk = vna.wideband(1e3, 1e6, points_per_decade=20, att_r1=[10, 0, 0])
+    assert (npy.diff(ntwk.f) > 0).all()
+    assert ntwk.f[0] == pytest.approx(1e3, rel=1e-6)
+    assert ntwk.f[-1] == pytest.approx(1e6, rel=1e-6)
+    assert len(ntwk.f) == 3 * 20 + 1
+    assert _state(vna, personality)[0] == CONTINUOUS
+    assert personality.att_r1 == 0
+
+
+def test_wideband_unknown_setting(vna, personality):
+    vna.set_trigger_continuous()
+    with pytest.raises(ValueError):
+        vna.wideband(1e3, 1e6, att_r=0) # att_r1
+    assert _state(vna, personality)[0] == CONTINUOUS
+    assert personality.att_r1 == 20
+
+
+def _count_queries(vna):
+    queries = []
+    ask = vna.inst.ask
+
+    def counted(message):
+        queries.append(message)
+        return ask(message)
+    vna.inst.ask = counted
+    return queries
+
+
+def test_shadow_hits(vna):
+    queries = _count_queries(vna)
+    assert vna.numpoints == 51 # set by the fixture
+    assert vna.start_freq == vna.start_freq
+    assert vna.stop_freq == vna.stop_freq
+    # derived from start and stop
+    assert vna.center_freq == (vna.start_freq + vna.stop_freq) / 2
+    assert vna.span_freq == vna.stop_freq - vna.start_freq
+    assert queries == ['FMT1;START?', 'FMT1;STOP?']
+
+
+def test_shadow_invalidation(vna, personality):
+    sweep_time = vna.sweep_time
+    f = vna.frequency.f
+    queries = _count_queries(vna)
+    vna.stop_freq = 1e6
+    assert vna.frequency.f[-1] == 1e6
+    assert len(vna.frequency.f) == len(f)
+    vna.resbw = 10
+    assert vna.sweep_time != sweep_time
+    assert vna.sweep_time == pytest.approx(personality.sweep_time)
+    assert queries.count('FMT1;ST?') == 1
+
+
+def test_resync(vna, personality):
+    vna.idn
+    personality.nop = 101 # from the front panel
+    assert vna.numpoints == 51
+    vna.resync()
+    assert vna.numpoints == 101
+    assert len(vna.frequency.f) == 101
+    assert vna.settings['sweep_mode'] == personality.sweep_mode
+
+
+def test_batch_error(vna, personality):
+    stop = vna.stop_freq
+    assert len(vna.frequency.f) == 51
+    with pytest.raises(RuntimeError):
+        with vna.batch():
+            vna.numpoints = 21
+            vna.start_freq = 1e3
+            vna.idn # sends the queued commands
+            vna.stop_freq = 1e6
+            raise RuntimeError
+    assert vna.stop_freq == stop
+    assert vna.start_freq == 1e3
+    assert vna.numpoints == 21
+    assert len(vna.frequency.f) == 21
+    assert vna.frequency.f[-1] == stop
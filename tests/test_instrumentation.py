@@ -0,0 +1,61 @@
+'''
+Timing of the GPIB transactions, recorded against the emulator.
+'''
+import numpy as npy
+import pytest
+
+from instruments import errors, instrumentation
+from instruments.instrumentation import LatencyHistogram, Recorder
+
+
+@pytest.fixture
+def recorder():
+    recorder = instrumentation.enable(Recorder(keep=100))
+    yield recorder
+    instrumentation.disable(recorder)
+
+
+def test_query(vna, recorder):
+    response = vna.inst.ask('NOP?')
+    assert float(response) == 51
+    counters = recorder.counters['instrument.ask']
+    assert (counters['calls'], counters['errors']) == (1, 0)
+    assert (counters['bytes_out'], counters['bytes_in']) == (len('NOP?'), len(response))
+    assert recorder.counters['controller.write']['calls'] == 2 # the query and ++read eoi
+    assert recorder.counters['controller.write']['bytes_out'] == len('NOP?') + len('++read eoi')
+    # controller commands are accounted by name in their caller
+    assert set(recorder.phases['instrument.ask']) == {'instrument.write', 'instrument.read'}
+    assert {'++read', 'controller.readall'} <= set(recorder.phases['instrument.read'])
+    ask, = [event for event in recorder.events if event.name == 'instrument.ask']
+    assert sum(ask.phases.values()) <= ask.duration
+    assert 'instrument.ask' in recorder.summary()
+
+
+def test_error(vna, recorder):
+    with pytest.raises(errors.Timeout):
+        vna.plx.readall(timeout=0.2)
+    counters = recorder.counters['controller.readall']
+    assert (counters['calls'], counters['errors']) == (1, 1)
+    assert recorder.histograms['controller.readall'].min >= 0.2
+
+
+def test_disabled(vna, recorder):
+    instrumentation.disable(recorder)
+    vna.inst.ask('NOP?')
+    assert recorder.counters == {} and recorder.events == []
+
+
+def test_quantiles():
+    durations = npy.random.RandomState(0).lognormal(npy.log(1e-3), 1, 10000)
+    histogram = LatencyHistogram()
+    for duration in durations:
+        histogram.add(duration)
+    assert histogram.count == len(durations)
+    assert histogram.mean == pytest.approx(durations.mean())
+    assert (histogram.min, histogram.max) == (durations.min(), durations.max())
+    for q in (.5, .9, .99):
+        exact = npy.percentile(durations, 100 * q)
+        # upper bound of a bucket 2 ** (1 / 4) wide
+        assert exact <= histogram.quantile(q) <= exact * 2 ** 0.25
+    assert histogram.quantile(1) == durations.max()
+    assert LatencyHistogram().quantile(.5) is None
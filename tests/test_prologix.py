@@ -0,0 +1,143 @@
+'''
+Framed reads and service requests through the Prologix transports.
+'''
+import time
+
+import numpy as npy
+import pytest
+
+from instruments import errors
+from instruments.emulator import PrologixEmulator, HP4195Personality, STB_SWEEP_END, STB_RQS
+from instruments.prologix import PrologixUSB, single, big_endian
+from instruments.util import parse_binary
+
+
+def test_text_response(vna):
+    assert float(vna.inst.ask('NOP?')) == 51
+
+
+def test_binary_frames_in_small_chunks(vna):
+    # a 51 points double block spans many 7 bytes reads
+    vna.inst.write('FMT2;X?')
+    vna.plx.write('++read eoi')
+    block = vna.plx.readall(chunk_size=7)
+    assert block.startswith(b'#A')
+    assert len(block) == 4 + 8 * 51
+
+
+def test_several_frames_in_one_read(vna, personality):
+    a, b, x = vna.read_registers('A', 'B', 'X')
+    assert len(a) == len(b) == len(x) == 51
+    npy.testing.assert_allclose(x, npy.linspace(personality.start, personality.stop, 51), rtol=1e-6)
+
+
+def test_frames_read_one_at_a_time(vna, personality):
+    # what follows the first frame is kept for the next read
+    vna.inst.write('FMT2;A?;X?')
+    vna.plx.write('++read eoi')
+    first = vna.plx.readall()
+    second = vna.plx.readall()
+    assert len(first) == len(second) == 4 + 8 * 51
+    x = parse_binary(second, is_big_endian=True, header=b'#A')
+    assert x[-1] == personality.stop
+
+
+def test_timeout_without_response(vna):
+    with pytest.raises(errors.Timeout):
+        vna.plx.readall(timeout=0.2)
+    # the connection is still usable
+    assert vna.idn
+
+
+def test_short_binary_block(vna):
+    # 8 bytes announced, 2 received
+    vna.inst.read_raw = lambda frames=1: b'#A\x00\x08\x00\x00'
+    with pytest.raises(errors.InvalidBinaryFormat):
+        vna.inst.read_values(single | big_endian)
+
+
+def _wait(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_wait_for_srq_timeout(vna):
+    vna.set_trigger_single()
+    vna.set_service_request(STB_SWEEP_END)
+    vna.inst.stb
+    started = time.time()
+    with pytest.raises(errors.Timeout):
+        vna.inst.wait_for_srq(timeout=0.2)
+    assert time.time() - started >= 0.2
+
+
+def test_srq_after_sweep(vna, personality):
+    vna.set_trigger_single()
+    vna.set_service_request(STB_SWEEP_END)
+    vna.inst.stb
+    vna.send_trigger()
+    status = vna.inst.wait_for_srq(timeout=5)
+    assert status & STB_SWEEP_END and status & STB_RQS
+    # cleared by the serial poll
+    assert not personality.srq
+
+
+def test_stale_request_cleared(vna, personality):
+    vna.set_trigger_single()
+    vna.set_service_request(STB_SWEEP_END)
+    vna.send_trigger()
+    _wait(lambda: personality.srq) # left unread
+    personality.time_scale = 2 # a sweep of 0.3 s
+    started = time.time()
+    vna.trigger_and_wait_till_done(timeout=5)
+    assert time.time() - started >= personality.sweep_time
+
+
+def test_serial_poll_address():
+    # the request of the instrument at 18 is not taken for 17's
+    other = HP4195Personality(time_scale=0.001)
+    server = PrologixEmulator(('127.0.0.1', 0), {17: HP4195Personality(time_scale=0.001),
+                                                 18: other}).start()
+    try:
+        from instruments.hp4195 import HP4195
+
+        vna = HP4195('127.0.0.1', 17, port=server.port)
+        polls = []
+        ask = vna.plx.ask
+
+        def recording(command, *args, **kwargs):
+            if command.startswith('++spoll'):
+                polls.append(command)
+            return ask(command, *args, **kwargs)
+        vna.plx.ask = recording
+        other.rqs_mask = STB_SWEEP_END
+        _wait(lambda: other.srq)
+        with pytest.raises(errors.Timeout):
+            vna.inst.wait_for_srq(timeout=0.2)
+        assert polls and set(polls) == {'++spoll 17'}
+        assert other.srq # still pending
+        vna.plx.close()
+    finally:
+        server.stop()
+
+
+class _SerialPort(object):
+    def __init__(self, data):
+        self.data = data
+
+    def readall(self):
+        return self.data
+
+
+def _usb(data):
+    plx = PrologixUSB.__new__(PrologixUSB) # no serial port here
+    plx.bus = _SerialPort(data)
+    return plx
+
+
+def test_usb_readall_signature():
+    block = b'#A\x00\x04\x00\x00\x0a\x0d'
+    assert _usb(block).readall(chunk_size=4096, timeout=1, header=b'#A', frames=1) == block
+    assert _usb(b'HP4195A\r\n').readall() == b'HP4195A'
@@ -0,0 +1,76 @@
+'''
+Planning and stitching of wideband sweep segments.
+'''
+import numpy as npy
+import pytest
+
+from instruments.segments import (plan_segments, stitch_segments, RBW_VALUES,
+                                  MAX_POINTS)
+
+
+def _sweep(segment):
+    # the X register of a log sweep
+    return npy.logspace(npy.log10(segment.start), npy.log10(segment.stop), segment.nop)
+
+
+def test_rbw_selection():
+    segments = plan_segments(100, 500e6)
+    for segment in segments:
+        assert segment.rbw * 10 <= segment.lo
+        larger = [rbw for rbw in RBW_VALUES if rbw > segment.rbw]
+        assert not larger or larger[0] * 10 > segment.lo
+    assert segments[0].rbw == 10
+    assert segments[-1].rbw == RBW_VALUES[-1]
+
+
+def test_rbw_given():
+    segments = plan_segments(100, 1e6, edges=[1e4], rbw=[3, 300])
+    assert [segment.rbw for segment in segments] == [3, 300]
+    with pytest.raises(ValueError):
+        plan_segments(100, 1e6, edges=[1e4], rbw=[3])
+
+
+def test_edges():
+    segments = plan_segments(100, 1e6, edges=[10, 1e3, 1e5, 1e7], att_r1=[20, 10, 0])
+    assert [(segment.lo, segment.hi) for segment in segments] == [(100, 1e3), (1e3, 1e5), (1e5, 1e6)]
+    assert [segment.settings for segment in segments] == [{'att_r1': 20}, {'att_r1': 10}, {'att_r1': 0}]
+
+
+def test_split_at_max_points():
+    segments = plan_segments(100, 1e4, edges=[], points_per_decade=300)
+    assert len(segments) == 2
+    assert all(segment.nop <= MAX_POINTS for segment in segments)
+    assert segments[0].lo == 100
+    assert segments[0].hi == pytest.approx(segments[1].lo)
+    assert segments[1].hi == 1e4
+
+
+def test_invalid_band():
+    with pytest.raises(ValueError):
+        plan_segments(1e6, 100)
+    with pytest.raises(ValueError):
+        plan_segments(100, 1e9)
+
+
+def test_stitch():
+    segments = plan_segments(100, 1e6, edges=[1e4], points_per_decade=50, drop=2, overlap=3)
+    frequencies = [_sweep(segment) for segment in segments]
+    # each sweep starts drop + overlap points below its range
+    assert all((f < segment.lo * (1 - 1e-9)).sum() == 5 for segment, f in zip(segments, frequencies))
+    values = [f * 2 for f in frequencies]
+    f, data = stitch_segments(segments, frequencies, values)
+    assert (npy.diff(f) > 0).all()
+    assert f[0] == pytest.approx(100)
+    assert f[-1] == pytest.approx(1e6)
+    npy.testing.assert_array_equal(data, 2 * f)
+    # 50 points per decade, each decade boundary once
+    assert len(f) == 4 * 50 + 1
+
+
+def test_stitch_drops_leading_points():
+    segments = plan_segments(100, 1e4, edges=[1e3], points_per_decade=20, drop=2, overlap=0)
+    frequencies = [_sweep(segment) for segment in segments]
+    values = [npy.arange(len(f)) for f in frequencies]
+    f, data = stitch_segments(segments, frequencies, values)
+    assert data[0] == 2
+    assert f[0] == pytest.approx(100)
@@ -0,0 +1,109 @@
+'''
+Sweep store: round trip of synthetic sweeps, and the checks on appending.
+'''
+import os
+import threading
+
+import numpy as npy
+import pytest
+import skrf as rf
+
+from pdn.store import SweepStore, StoreWriter, AxisMismatch
+
+F = npy.linspace(0, 500e6, 51)
+
+
+def _network(f, value):
+    ntwk = rf.Network()
+    ntwk.s = npy.exp(1j * npy.linspace(0, 3, len(f))) * value
+    ntwk.frequency = rf.Frequency.from_f(npy.asarray(f, dtype=float), unit='hz')
+    return ntwk
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SweepStore.create(str(tmp_path / 'campaign.sweeps'), F)
+
+
+def test_round_trip(store):
+    sweeps = [_network(F, 0.5 + index) for index in range(3)]
+    settings = {'function': 4, 'nop': len(F), 'rbw': 3e3}
+    with StoreWriter(store) as writer:
+        for index, ntwk in enumerate(sweeps):
+            writer.add(ntwk, timestamp=index, dut='C1', settings=settings)
+    reopened = SweepStore(store.path)
+    assert len(reopened) == 3
+    npy.testing.assert_array_equal(reopened.frequency, sweeps[0].f)
+    for index, ntwk in enumerate(sweeps):
+        npy.testing.assert_allclose(reopened.network(index).s, ntwk.s, rtol=1e-6)
+        assert reopened.metadata[index]['timestamp'] == index
+        assert reopened.metadata[index]['dut'] == 'C1'
+        assert reopened.metadata[index]['settings'] == settings
+    assert reopened.network(0).name == 'C1'
+
+
+def test_other_frequency_axis(store):
+    store.append(_network(F, 1))
+    moved = _network(F / 2, 1) # same number of points
+    with pytest.raises(AxisMismatch):
+        store.append(moved)
+    with pytest.raises(AxisMismatch):
+        with StoreWriter(store) as writer:
+            writer.add(moved)
+    assert len(SweepStore(store.path)) == 1
+
+
+def test_other_size(store):
+    with pytest.raises(ValueError) as error:
+        store.append(npy.zeros(store.points + 1, complex))
+    assert not isinstance(error.value, AxisMismatch)
+    assert len(store) == 0
+
+
+def test_truncated_header(store):
+    with open(store.path, 'r+b') as f:
+        f.truncate(10)
+    with pytest.raises(ValueError) as error:
+        SweepStore(store.path)
+    assert not isinstance(error.value, AxisMismatch)
+
+
+def test_missing_sidecar(store):
+    os.remove(store.path + '.jsonl')
+    with pytest.raises(IOError):
+        SweepStore(store.path)
+
+
+def test_interrupted_write(store):
+    store.append(npy.ones(store.points, complex), dut='C1')
+    with open(store.path, 'ab') as f:
+        f.write(b'\0' * 10) # part of a record, without its metadata
+    reopened = SweepStore(store.path)
+    assert len(reopened) == 1
+    reopened.append(npy.zeros(store.points, complex))
+    assert len(SweepStore(store.path)) == 2
+    assert os.path.getsize(store.path) == reopened._offset + 2 * reopened._record_size
+
+
+def test_two_writers(store):
+    # a second SweepStore on the same files keeps the records of the first
+    other = SweepStore(store.path)
+    store.append(npy.full(store.points, 1, complex), writer=1)
+    other.append(npy.full(store.points, 2, complex), writer=2)
+    store.append(npy.full(store.points, 1, complex), writer=1)
+
+    def append(target, writer):
+        for _ in range(20):
+            target.append(npy.full(store.points, writer, complex), writer=writer)
+    threads = [threading.Thread(target=append, args=(target, writer))
+               for target, writer in ((store, 1), (other, 2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reopened = SweepStore(store.path)
+    assert len(reopened) == 43
+    writers = [meta['writer'] for meta in reopened.metadata]
+    assert writers.count(1) == 22
+    npy.testing.assert_array_equal(reopened.data[:, 0, 0, 0], writers)
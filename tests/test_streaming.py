@@ -0,0 +1,79 @@
+'''
+Sweeps streamed from a background thread, against the emulator.
+'''
+import time
+
+import pytest
+
+CONTINUOUS = 1
+
+
+def _wait(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_drop(vna):
+    stream = vna.stream(maxsize=2, policy='drop', count=10)
+    _wait(lambda: stream.acquired == 10)
+    sweeps = list(stream)
+    assert len(sweeps) + stream.dropped == 10
+    assert stream.dropped >= 7
+    timestamps = [timestamp for timestamp, ntwk in sweeps]
+    assert timestamps == sorted(timestamps)
+
+
+def test_block(vna):
+    stream = vna.stream(maxsize=1, policy='block', count=5)
+    # one sweep queued, the next one waiting for room
+    _wait(lambda: stream.acquired == 2)
+    time.sleep(0.2)
+    assert stream.acquired == 2
+    assert stream.pending == 1
+    assert len(list(stream)) == 5
+    assert stream.dropped == 0
+
+
+def test_error(vna, personality):
+    vna.set_trigger_continuous()
+    read_registers = vna.read_registers
+    calls = [0]
+
+    def failing(*registers):
+        calls[0] += 1
+        if calls[0] == 3:
+            raise RuntimeError('transfer failed')
+        return read_registers(*registers)
+    vna.frequency # read before the stream
+    vna.read_registers = failing
+    sweeps = []
+    with pytest.raises(RuntimeError):
+        with vna.stream() as stream:
+            for sweep in stream:
+                sweeps.append(sweep)
+    assert len(sweeps) == 2
+    vna.idn
+    assert personality.sweep_mode == CONTINUOUS
+
+
+def test_close(vna, personality):
+    vna.set_trigger_continuous()
+    stream = vna.stream()
+    sweeps = iter(stream)
+    next(sweeps)
+    next(sweeps)
+    # while the thread is sweeping
+    stream.close()
+    assert not stream._thread.is_alive()
+    vna.idn
+    assert personality.sweep_mode == CONTINUOUS
+    assert stream.acquired >= 2
+
+
+def test_policy():
+    from instruments.streaming import SweepStream
+
+    with pytest.raises(ValueError):
+        SweepStream(iter([]), policy='latest')
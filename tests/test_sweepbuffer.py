@@ -0,0 +1,97 @@
+'''
+Ring buffer of sweeps.
+'''
+import numpy as npy
+import pytest
+
+from instruments.sweepbuffer import SweepBuffer, dbdeg_to_complex
+
+POINTS = 5
+
+
+def _sweep(value):
+    return npy.full(POINTS, value, dtype=complex)
+
+
+def test_wrap_around():
+    buffer = SweepBuffer(3, npy.arange(POINTS) + 1.)
+    for index in range(5):
+        buffer.append(_sweep(index), timestamp=index)
+    assert (len(buffer), buffer.count) == (3, 5)
+    assert [buffer[index][0] for index in range(3)] == [2, 3, 4]
+    assert buffer.latest()[0] == buffer[-1][0] == 4
+    assert buffer.timestamp(0) == 2
+    timestamps, data = buffer.ordered()
+    npy.testing.assert_array_equal(timestamps, [2, 3, 4])
+    npy.testing.assert_array_equal(data[:, 0], [2, 3, 4])
+    with pytest.raises(IndexError):
+        buffer[3]
+    with pytest.raises(IndexError):
+        buffer[-4]
+
+
+def test_not_full():
+    buffer = SweepBuffer(4, npy.arange(POINTS) + 1.)
+    buffer.append(_sweep(7), timestamp=1)
+    assert len(buffer) == 1
+    timestamps, data = buffer.ordered()
+    npy.testing.assert_array_equal(timestamps, [1])
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.ordered()[1].shape == (0, POINTS)
+
+
+def test_settings_index():
+    buffer = SweepBuffer(2, npy.arange(POINTS) + 1.)
+    narrow = {'rbw': 10}
+    buffer.append(_sweep(0), 0, narrow)
+    buffer.append(_sweep(1), 1, dict(narrow))
+    buffer.append(_sweep(2), 2, {'rbw': 300})
+    buffer.append(_sweep(3), 3)
+    assert buffer.settings == [{'rbw': 10}, {'rbw': 300}] # each change once
+    assert buffer.settings_of(0) == {'rbw': 300}
+    assert buffer.settings_of(1) is None
+    narrow['rbw'] = 30 # copied
+    assert buffer.settings[0] == {'rbw': 10}
+
+
+def test_dbdeg_to_complex():
+    db = npy.linspace(-40, 10, POINTS)
+    deg = npy.linspace(-180, 180, POINTS)
+    expected = 10 ** (db / 20) * npy.exp(1j * npy.radians(deg))
+    npy.testing.assert_allclose(dbdeg_to_complex(db, deg, npy.empty(POINTS, complex)), expected)
+    # into a strided view
+    out = npy.zeros((POINTS, 2), complex)
+    dbdeg_to_complex(db, deg, out[:, 1])
+    npy.testing.assert_allclose(out[:, 1], expected)
+    assert not out[:, 0].any()
+
+
+def test_append_dbdeg():
+    buffer = SweepBuffer(2, npy.arange(POINTS) + 1.)
+    buffer.append_dbdeg(npy.zeros(POINTS), npy.full(POINTS, 90.), 0)
+    npy.testing.assert_allclose(buffer.latest(), 1j, atol=1e-12)
+    with pytest.raises(ValueError):
+        buffer.append_dbdeg(npy.zeros(POINTS + 1), npy.zeros(POINTS + 1), 1)
+    assert len(buffer) == 1
+
+
+def test_read_into(vna):
+    buffer = vna.sweep_buffer(4)
+    for _ in range(3):
+        vna.read_into(buffer)
+    assert len(buffer) == 3
+    assert buffer.settings_of(-1)['nop'] == 51
+    npy.testing.assert_allclose(buffer.network(-1).s[:, 0, 0], vna.one_port.s[:, 0, 0], rtol=1e-6)
+
+
+def test_read_into_other_axis(vna):
+    buffer = vna.sweep_buffer(4)
+    vna.read_into(buffer)
+    vna.stop_freq = 1e6 # same number of points
+    with pytest.raises(ValueError):
+        vna.read_into(buffer)
+    assert len(buffer) == 1
+    vna.stop_freq = buffer.f[-1]
+    vna.read_into(buffer)
+    assert len(buffer) == 2
@@ -0,0 +1,39 @@
+'''
+Value parsers: the bulk ASCII parser against the regular expression one.
+'''
+import numpy as npy
+import pytest
+
+from instruments.util import AsciiValuesParser, parse_ascii, _parse_ascii_re
+
+BLOCKS = [b'+1.000000E+00,-2.5E-03,3\r\n',
+          b'1;2;3\n4\t5',
+          b'.5,5.,-0,1e5,1E+05',
+          b'inf,1', b'-Infinity,2', b'nan,3', b'NAN',
+          b'1.5 dB,2.5 deg', b'A=1,B=2', b'1-2', b'1.2.3',
+          b'1_000,7',
+          b'', b'\r\n', b'no values']
+
+
+@pytest.mark.parametrize('data', BLOCKS)
+def test_same_as_regex(data):
+    assert list(parse_ascii(data)) == _parse_ascii_re(data)
+
+
+@pytest.mark.parametrize('data', BLOCKS)
+def test_chunks(data):
+    # every split of the block, values cut in two included
+    for cut in range(len(data) + 1):
+        parser = AsciiValuesParser(2)
+        parser.feed(data[:cut])
+        parser.feed(data[cut:])
+        assert list(parser.close()) == _parse_ascii_re(data)
+
+
+def test_many_chunks():
+    values = npy.linspace(-1, 1, 401)
+    data = ','.join('%+.6E' % value for value in values).encode('ascii') + b'\r\n'
+    parser = AsciiValuesParser()
+    for start in range(0, len(data), 7):
+        parser.feed(data[start:start + 7])
+    npy.testing.assert_allclose(parser.close(), values, rtol=1e-6)